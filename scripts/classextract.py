@@ -1,29 +1,692 @@
+import os
+import re
+import csv
+import sys
+import json
+import sqlite3
 import argparse
+import zipfile
+import itertools
+import posixpath
+import xml.etree.ElementTree as ElementTree
+from collections import deque, namedtuple
+from contextlib import contextmanager, nullcontext
+from functools import partial
+from urllib.parse import unquote
+from concurrent.futures import ProcessPoolExecutor
 from bs4 import BeautifulSoup
 
-def extract_class_text_from_files(class_name, file_list):
+try:
+    from lxml import etree
+except ImportError:  # lxml is optional; the BeautifulSoup backend always works
+    etree = None
+
+try:
+    from . import profiling
+    from .doccache import DEFAULT_MAX_BYTES, DocumentCache
+except ImportError:  # run directly as a script
+    import profiling
+    from doccache import DEFAULT_MAX_BYTES, DocumentCache
+
+PARSER_BACKENDS = ('bs4', 'lxml')
+
+# Files handed to each worker process at a time with --jobs.
+DEFAULT_CHUNK_SIZE = 8
+
+# Chunks in flight per worker with --jobs, bounding memory on huge inputs.
+CHUNKS_PER_WORKER = 2
+
+# Inputs with these extensions are read as EPUB/ZIP containers.
+ARCHIVE_EXTENSIONS = ('.epub', '.zip')
+
+# Archive members treated as XHTML when there is no OPF spine to follow.
+XHTML_EXTENSIONS = ('.xhtml', '.html', '.htm')
+
+XHTML_MEDIA_TYPES = ('application/xhtml+xml', 'text/html')
+
+EPUB_CONTAINER_PATH = 'META-INF/container.xml'
+
+# Bumped whenever the layout of cached document indexes changes.
+INDEX_VERSION = 2
+
+
+class ArchiveMember(namedtuple('ArchiveMember', ['archive_path', 'member'])):
+    """An XHTML document inside an EPUB/ZIP archive, shown as 'archive!/member'."""
+    __slots__ = ()
+
+    def __str__(self):
+        return f"{self.archive_path}!/{self.member}"
+
+
+class InputError(namedtuple('InputError', ['file_path', 'message'])):
+    """An input that could not be expanded, reported in place of its results."""
+    __slots__ = ()
+
+    def __str__(self):
+        return self.file_path
+
+
+# One extracted element: its source, its 1-based position among the source's
+# matches, the selector it matched, its text and its 1-based source line.
+Record = namedtuple('Record', ['file', 'index', 'selector', 'text', 'line'])
+
+
+class SelectorError(ValueError):
+    """Exception for a selector classextract cannot match."""
+
+
+# A simple selector: an optional tag name (None for any tag) and classes
+# that must all be present. text is the selector as the user wrote it.
+Selector = namedtuple('Selector', ['text', 'tag', 'classes'])
+
+SELECTOR_PATTERN = re.compile(r'^(?P<tag>[A-Za-z][\w-]*|\*)?(?P<classes>(?:\.[\w-]+)*)$')
+
+
+def class_selector(class_name):
+    """Return the selector for <p> tags with class_name."""
+    return Selector(class_name, 'p', (class_name,))
+
+
+def parse_selectors(spec):
+    """Parse comma-separated selectors such as 'p.x05-Head-A, h2.title'.
+
+    Each selector is a tag name and/or one or more '.class' parts, or '*'.
+    A bare name with no '.' is a class on <p> tags, as in earlier versions,
+    so 'x05-Head-A, x05-Body' selects paragraphs with either class.
+    """
+    selectors = []
+    for text in spec.split(','):
+        text = text.strip()
+        if not text:
+            continue
+        if '.' not in text and text != '*':
+            selectors.append(class_selector(text))
+            continue
+        match = SELECTOR_PATTERN.match(text)
+        if match is None:
+            raise SelectorError(f"Unsupported selector '{text}'")
+        tag = match.group('tag')
+        classes = tuple(c for c in match.group('classes').split('.') if c)
+        selectors.append(Selector(text, None if tag in (None, '*') else tag.lower(), classes))
+    if not selectors:
+        raise SelectorError(f"No selectors in '{spec}'")
+    return selectors
+
+
+def class_matches(class_attr, class_name):
+    """Match a class attribute the way BeautifulSoup's class_ filter does."""
+    return class_attr == class_name or class_name in class_attr.split()
+
+
+def match_selector(selectors, tag, class_attr):
+    """Return the first selector matching an element, or None."""
+    for selector in selectors:
+        if selector.tag is not None and selector.tag != tag:
+            continue
+        if selector.classes:
+            if class_attr is None:
+                continue
+            if len(selector.classes) == 1:
+                if not class_matches(class_attr, selector.classes[0]):
+                    continue
+            elif not set(selector.classes).issubset(class_attr.split()):
+                continue
+        return selector
+    return None
+
+
+def _selector_label(selectors):
+    """Return a label function tagging elements with their first matching selector."""
+    def label(tag, class_attr):
+        selector = match_selector(selectors, tag, class_attr)
+        return None if selector is None else selector.text
+    return label
+
+
+def _class_label(tag, class_attr):
+    """Label every element that has a class attribute with its (tag, class)."""
+    return None if class_attr is None else (tag, class_attr)
+
+
+def _find_bs4(content, label):
+    soup = BeautifulSoup(content, 'html.parser')
+    matches = []
+    for tag in soup.find_all(True):
+        class_attr = tag.get('class')
+        if isinstance(class_attr, list):
+            class_attr = ' '.join(class_attr)
+        name = label(tag.name, class_attr)
+        if name is not None:
+            matches.append((name, tag.get_text(strip=True), tag.sourceline))
+    return matches
+
+
+# bs4 gives text inside these elements its own string type, which
+# get_text() only returns when called on an element of the same kind.
+STRING_CONTAINERS = frozenset(('script', 'style', 'template'))
+
+CDATA_START = b'<![CDATA['
+
+
+class _CDataSniffer:
+    """Binary file wrapper noting whether a CDATA section has been read."""
+
+    def __init__(self, file):
+        self.file = file
+        self.seen = False
+        self._tail = b''
+
+    def read(self, size=-1):
+        data = self.file.read(size)
+        if not self.seen:
+            self.seen = CDATA_START in self._tail + data
+            self._tail = data[-(len(CDATA_START) - 1):]
+        return data
+
+
+def _local_name(tag):
+    return tag.rpartition('}')[2].lower()
+
+
+def _string_kind(elem):
+    """Return the STRING_CONTAINERS name bs4 would type elem's own text as, or None."""
+    for node in itertools.chain((elem,), elem.iterancestors()):
+        name = _local_name(node.tag)
+        if name in STRING_CONTAINERS:
+            return name
+    return None
+
+
+def _element_text(elem):
+    """Join elem's stripped strings as bs4's get_text(strip=True) does.
+
+    Comments and processing instructions are skipped, and so is text of a
+    different STRING_CONTAINERS kind than elem, such as a <script> inside
+    a <p>.
+    """
+    own = _local_name(elem.tag)
+    wanted = own if own in STRING_CONTAINERS else None
+    parts = []
+
+    def walk(node, kind):
+        keep = kind == wanted
+        if keep and node.text:
+            parts.append(node.text.strip())
+        for child in node:
+            if isinstance(child.tag, str):
+                name = _local_name(child.tag)
+                walk(child, name if name in STRING_CONTAINERS else kind)
+            if keep and child.tail:
+                parts.append(child.tail.strip())
+
+    walk(elem, _string_kind(elem))
+    return ''.join(parts)
+
+
+def _element_text_bs4(elem):
+    """Return get_text(strip=True) of elem, serialized and reparsed with bs4.
+
+    Used for documents with CDATA sections, whose boundaries lxml does not
+    keep but bs4 strips around.
+    """
+    soup = BeautifulSoup(etree.tostring(elem, encoding='unicode', with_tail=False),
+                         'html.parser')
+    tag = soup.find(True)
+    return '' if tag is None else tag.get_text(strip=True)
+
+
+def _find_lxml(source, label):
+    if isinstance(source, (str, os.PathLike)):
+        with open(source, 'rb') as file:
+            return _find_lxml(file, label)
+    source = _CDataSniffer(source)
+    matches = []
+    open_matches = []
+    for event, elem in etree.iterparse(source, events=('start', 'end'), strip_cdata=False):
+        if event == 'start':
+            tag = elem.tag
+            if isinstance(tag, str):
+                name = label(_local_name(tag), elem.get('class'))
+                if name is not None:
+                    # Reserve the slot now so nested matches keep document order.
+                    open_matches.append((elem, len(matches)))
+                    matches.append((name, None, elem.sourceline))
+            continue
+        if open_matches and open_matches[-1][0] is elem:
+            slot = open_matches.pop()[1]
+            name, _, line = matches[slot]
+            # A CDATA section inside elem has been read by now if there is one.
+            text = _element_text_bs4(elem) if source.seen else _element_text(elem)
+            matches[slot] = (name, text, line)
+        if not open_matches:
+            elem.clear(keep_tail=True)
+            while elem.getprevious() is not None:
+                del elem.getparent()[0]
+    return matches
+
+
+def find_matches_bs4(content, selectors):
+    """Return (selector_text, text, line) for each element matching any selector.
+
+    Uses BeautifulSoup's html.parser and a single pass over the document.
+    Elements are listed once, in document order, tagged with the first
+    selector they match.
+    """
+    return _find_bs4(content, _selector_label(selectors))
+
+
+def find_matches_lxml(source, selectors):
+    """Return (selector_text, text, line) for each element matching any selector.
+
+    Uses a streaming lxml iterparse over source, a path or binary file
+    object holding well-formed XHTML. Elements are matched as their start
+    tags are seen and every other subtree is freed once parsed, so memory
+    stays small however large the file is. Text is joined exactly as
+    get_text(strip=True) does, skipping script, style and template text
+    and stripping around CDATA sections, so the result is identical to
+    find_matches_bs4. Raises etree.XMLSyntaxError if the document is not
+    well-formed.
+    """
+    return _find_lxml(source, _selector_label(selectors))
+
+
+def is_archive(file_path):
+    return file_path.lower().endswith(ARCHIVE_EXTENSIONS)
+
+
+def spine_members(zipf):
+    """Return the names of an archive's XHTML documents in reading order.
+
+    EPUBs are read in spine order from the OPF package document named by
+    META-INF/container.xml. Other archives yield their XHTML members sorted
+    by name.
+    """
+    try:
+        container = ElementTree.fromstring(zipf.read(EPUB_CONTAINER_PATH))
+    except KeyError:
+        return sorted(name for name in zipf.namelist()
+                      if name.lower().endswith(XHTML_EXTENSIONS))
+
+    opf_path = container.find('.//{*}rootfile').get('full-path')
+    package = ElementTree.fromstring(zipf.read(opf_path))
+    opf_dir = posixpath.dirname(opf_path)
+    manifest = {}
+    for item in package.iterfind('{*}manifest/{*}item'):
+        if item.get('media-type') in XHTML_MEDIA_TYPES:
+            href = unquote(item.get('href'))
+            manifest[item.get('id')] = posixpath.normpath(posixpath.join(opf_dir, href))
+    return [manifest[itemref.get('idref')]
+            for itemref in package.iterfind('{*}spine/{*}itemref')
+            if itemref.get('idref') in manifest]
+
+
+def expand_inputs(file_list):
+    """Yield a source for each XHTML document named by file_list.
+
+    Plain paths are yielded unchanged. EPUB/ZIP archives are expanded into
+    an ArchiveMember per document, in spine order, without extracting
+    anything; archives that cannot be read yield an InputError instead.
+    """
     for file_path in file_list:
+        if not is_archive(file_path):
+            yield file_path
+            continue
         try:
-            with open(file_path, 'r', encoding='utf-8') as file:
-                content = file.read()
-            
-            # Parse XHTML content
-            soup = BeautifulSoup(content, 'html.parser')
-            
-            # Find all <p> tags with the specified class
-            paragraphs = soup.find_all('p', class_=class_name)
-            
-            print(f"\nFile: {file_path}")
-            if paragraphs:
-                for i, p in enumerate(paragraphs, start=1):
-                    print(f"  Paragraph {i}: {p.get_text(strip=True)}")
-            else:
-                print("  No matching paragraphs found.")
-        
+            with zipfile.ZipFile(file_path, 'r') as zipf:
+                members = spine_members(zipf)
         except FileNotFoundError:
-            print(f"Error: File not found - {file_path}")
+            yield InputError(file_path, f"Error: File not found - {file_path}")
         except Exception as e:
-            print(f"Error processing {file_path}: {e}")
+            yield InputError(file_path, f"Error processing {file_path}: {e}")
+        else:
+            for member in members:
+                yield ArchiveMember(file_path, member)
+
+
+class ArchiveReader:
+    """Open archives for ArchiveMembers, keeping the most recent one open.
+
+    Consecutive members of one archive then share a single ZipFile. Use
+    one reader per thread and close it, or use it as a context manager,
+    when done.
+    """
+
+    def __init__(self):
+        self._path = None
+        self._zipf = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.close()
+
+    def get(self, archive_path):
+        """Return an open ZipFile for archive_path."""
+        if archive_path != self._path:
+            self.close()
+            self._zipf = zipfile.ZipFile(archive_path, 'r')
+            self._path = archive_path
+        return self._zipf
+
+    def close(self):
+        if self._zipf is not None:
+            self._zipf.close()
+        self._path = self._zipf = None
+
+
+@contextmanager
+def _archive(archive_path, archives=None):
+    """Yield an open ZipFile for archive_path, from archives if given."""
+    if archives is not None:
+        yield archives.get(archive_path)
+        return
+    with zipfile.ZipFile(archive_path, 'r') as zipf:
+        yield zipf
+
+
+def _parse(source, label, parser='bs4', archives=None):
+    """Run the chosen parser backend over source with a label function."""
+    with profiling.stage('parse'):
+        return _run_parser(source, label, parser, archives)
+
+
+def _run_parser(source, label, parser, archives):
+    member = isinstance(source, ArchiveMember)
+    if parser == 'lxml' and etree is not None:
+        try:
+            if member:
+                with _archive(source.archive_path, archives) as zipf, \
+                        zipf.open(source.member) as file:
+                    return _find_lxml(file, label)
+            with open(source, 'rb') as file:
+                return _find_lxml(file, label)
+        except etree.XMLSyntaxError:
+            pass  # not well-formed XML; html.parser is more forgiving
+
+    if member:
+        with _archive(source.archive_path, archives) as zipf:
+            content = zipf.read(source.member).decode('utf-8')
+    else:
+        with open(source, 'r', encoding='utf-8') as file:
+            content = file.read()
+    return _find_bs4(content, label)
+
+
+def document_key(source, archives=None):
+    """Return a cache key identifying the content of a source.
+
+    Files are keyed by real path, size and mtime; archive members by the
+    archive's real path, the member name, and the member's size and stored
+    CRC-32, so no extra hashing is needed. Keys also carry INDEX_VERSION.
+    archives is an optional ArchiveReader to open archives with.
+    """
+    if isinstance(source, ArchiveMember):
+        with _archive(source.archive_path, archives) as zipf:
+            info = zipf.getinfo(source.member)
+        return (f"v{INDEX_VERSION}:{os.path.realpath(source.archive_path)}!/{source.member}"
+                f":{info.file_size}:{info.CRC:08x}")
+    st = os.stat(source)
+    return f"v{INDEX_VERSION}:{os.path.realpath(source)}:{st.st_size}:{st.st_mtime_ns}"
+
+
+def build_class_index(source, parser='bs4', archives=None):
+    """Return [tag, class, text, line] for every element with a class, in document order."""
+    return [[tag, class_attr, text, line]
+            for (tag, class_attr), text, line in _parse(source, _class_label, parser, archives)]
+
+
+def find_matches(source, selectors, parser='bs4', cache=None, archives=None):
+    """Return (selector_text, text, line) for each element in an XHTML
+    document matching any of selectors, in one pass. line is the element's
+    1-based source line, or None if the backend could not tell.
+
+    source is a file path or an ArchiveMember, which is streamed straight
+    out of its archive, opened through archives, an ArchiveReader, if
+    given. parser selects the backend: 'bs4' (BeautifulSoup
+    with html.parser) or 'lxml' (streaming iterparse). The lxml backend
+    falls back to BeautifulSoup when lxml is not installed or the document
+    is not well-formed XML.
+
+    With a DocumentCache, the document is parsed once into an index of all
+    classed elements (see build_class_index) and later queries for any
+    classes are answered from the index without parsing. Selectors without
+    a class always parse the document.
+    """
+    if cache is None or not all(selector.classes for selector in selectors):
+        return _parse(source, _selector_label(selectors), parser, archives)
+
+    key = document_key(source, archives)
+    index = cache.get(key)
+    if index is None:
+        index = build_class_index(source, parser, archives)
+        cache.put(key, index)
+    label = _selector_label(selectors)
+    matches = []
+    for tag, class_attr, text, line in index:
+        name = label(tag, class_attr)
+        if name is not None:
+            matches.append((name, text, line))
+    return matches
+
+
+def find_class_paragraphs(source, class_name, parser='bs4'):
+    """Return the text of each <p> with class_name in an XHTML document."""
+    return [text for _, text, _ in find_matches(source, [class_selector(class_name)], parser)]
+
+
+def _open_cache(cache_path, cache_size):
+    """Return the DocumentCache at cache_path, or an empty context when there is none."""
+    if cache_path is None:
+        return nullcontext()
+    return DocumentCache(cache_path, cache_size)
+
+
+def process_file(file_path, selectors, parser='bs4', cache=None, archives=None):
+    """Extract one source's matches, returning (file_path, matches, error).
+
+    file_path is a source from expand_inputs and matches is as returned by
+    find_matches, using cache and archives if given. error is the message to report
+    instead of the matches, or None. This runs in worker processes, so it
+    never raises.
+    """
+    if isinstance(file_path, InputError):
+        return file_path, None, file_path.message
+    try:
+        return file_path, find_matches(file_path, selectors, parser, cache, archives), None
+    except FileNotFoundError:
+        return file_path, None, f"Error: File not found - {file_path}"
+    except Exception as e:
+        return file_path, None, f"Error processing {file_path}: {e}"
+
+
+def process_chunk(sources, selectors, parser='bs4', cache_path=None,
+                  cache_size=DEFAULT_MAX_BYTES):
+    """Return process_file results for a list of sources.
+
+    The DocumentCache at cache_path, if given, and any archive read are
+    closed once the chunk is done; closing the cache writes the last_used
+    times of its hits.
+    """
+    with _open_cache(cache_path, cache_size) as cache, ArchiveReader() as archives:
+        return [process_file(source, selectors, parser, cache, archives) for source in sources]
+
+
+def _chunks(iterable, size):
+    chunk = []
+    for item in iterable:
+        chunk.append(item)
+        if len(chunk) >= size:
+            yield chunk
+            chunk = []
+    if chunk:
+        yield chunk
+
+
+def iter_file_results(selectors, file_list, parser='bs4', jobs=1, chunk_size=DEFAULT_CHUNK_SIZE,
+                      cache_path=None, cache_size=DEFAULT_MAX_BYTES):
+    """Yield process_file results for each file, in the order of file_list.
+
+    EPUB/ZIP archives in file_list are expanded into their XHTML documents
+    (see expand_inputs). With jobs > 1 the documents are parsed in a pool of
+    that many processes, handed out chunk_size at a time; results are still
+    yielded in argument order as soon as each one (and all before it) is
+    ready. Only CHUNKS_PER_WORKER chunks per worker are in flight at once,
+    so memory stays bounded however many files there are. cache_path names
+    an optional DocumentCache file shared by all workers.
+    """
+    sources = expand_inputs(file_list)
+    if jobs <= 1:
+        with _open_cache(cache_path, cache_size) as cache, ArchiveReader() as archives:
+            for source in sources:
+                yield process_file(source, selectors, parser, cache, archives)
+        return
+    process = partial(process_chunk, selectors=selectors, parser=parser,
+                      cache_path=cache_path, cache_size=cache_size)
+    with ProcessPoolExecutor(max_workers=jobs) as pool:
+        pending = deque()
+        for chunk in _chunks(sources, chunk_size):
+            pending.append(pool.submit(process, chunk))
+            if len(pending) >= jobs * CHUNKS_PER_WORKER:
+                yield from pending.popleft().result()
+        while pending:
+            yield from pending.popleft().result()
+
+
+def _iter_records(file_path, matches):
+    for i, (selector, text, line) in enumerate(matches, start=1):
+        yield Record(str(file_path), i, selector, text, line)
+
+
+def iter_records(class_name, file_list, parser='bs4', jobs=1, chunk_size=DEFAULT_CHUNK_SIZE,
+                 cache_path=None, cache_size=DEFAULT_MAX_BYTES, on_error=None):
+    """Yield a Record for each matching element of each file, in order.
+
+    Takes the same arguments as extract_class_text_from_files. Sources that
+    fail are skipped after calling on_error(file_path, message), which
+    defaults to printing the message to stderr. Records are produced as
+    each document is parsed, so any number of files can be streamed.
+    """
+    selectors = parse_selectors(class_name)
+    for file_path, matches, error in iter_file_results(selectors, file_list, parser, jobs,
+                                                       chunk_size, cache_path, cache_size):
+        if error is not None:
+            if on_error is None:
+                print(error, file=sys.stderr)
+            else:
+                on_error(file_path, error)
+            continue
+        yield from _iter_records(file_path, matches)
+
+
+class TextWriter:
+    """Write results as a human-readable listing, one block per file.
+
+    With tagged, each paragraph is labelled with the selector it matched.
+    """
+
+    def __init__(self, stream=None, tagged=False):
+        self.stream = sys.stdout if stream is None else stream
+        self.tagged = tagged
+
+    def write_file(self, file_path, records):
+        print(f"\nFile: {file_path}", file=self.stream)
+        empty = True
+        for record in records:
+            empty = False
+            if self.tagged:
+                print(f"  Paragraph {record.index} [{record.selector}]: {record.text}",
+                      file=self.stream)
+            else:
+                print(f"  Paragraph {record.index}: {record.text}", file=self.stream)
+        if empty:
+            print("  No matching paragraphs found.", file=self.stream)
+
+    def write_error(self, file_path, message):
+        print(message, file=self.stream)
+
+    def close(self):
+        self.stream.flush()
+
+
+class JSONLWriter:
+    """Write one JSON object per record, flushing after each file.
+
+    Errors go to stderr so the output stays a clean record stream.
+    """
+
+    def __init__(self, stream=None, tagged=False):
+        self.stream = sys.stdout if stream is None else stream
+
+    def write_file(self, file_path, records):
+        for record in records:
+            self.stream.write(json.dumps(record._asdict(), ensure_ascii=False) + '\n')
+        self.stream.flush()
+
+    def write_error(self, file_path, message):
+        print(message, file=sys.stderr)
+
+    def close(self):
+        self.stream.flush()
+
+
+class CSVWriter:
+    """Write records as CSV rows under a header row, flushing after each file.
+
+    Errors go to stderr so the output stays a clean record stream.
+    """
+
+    def __init__(self, stream=None, tagged=False):
+        self.stream = sys.stdout if stream is None else stream
+        self._writer = csv.writer(self.stream, lineterminator='\n')
+        self._writer.writerow(Record._fields)
+
+    def write_file(self, file_path, records):
+        self._writer.writerows(records)
+        self.stream.flush()
+
+    def write_error(self, file_path, message):
+        print(message, file=sys.stderr)
+
+    def close(self):
+        self.stream.flush()
+
+
+WRITERS = {'text': TextWriter, 'jsonl': JSONLWriter, 'csv': CSVWriter}
+
+
+def extract_class_text_from_files(class_name, file_list, parser='bs4', jobs=1,
+                                  chunk_size=DEFAULT_CHUNK_SIZE, cache_path=None,
+                                  cache_size=DEFAULT_MAX_BYTES, output_format='text',
+                                  stream=None, writer=None):
+    """Write the matching text of each file, by default to stdout.
+
+    class_name is a class name or comma-separated selectors (see
+    parse_selectors). With several selectors, each paragraph is tagged with
+    the selector it matched. cache_path enables a DocumentCache bounded to
+    cache_size bytes.
+
+    output_format picks one of WRITERS ('text', 'jsonl' or 'csv') writing
+    to stream. Any other object with write_file(file_path, records),
+    write_error(file_path, message) and close() methods can be passed as
+    writer instead. Use iter_records to consume the records directly.
+    """
+    selectors = parse_selectors(class_name)
+    if writer is None:
+        writer = WRITERS[output_format](stream, tagged=len(selectors) > 1)
+    results = iter_file_results(selectors, file_list, parser, jobs, chunk_size, cache_path,
+                                cache_size)
+    try:
+        for file_path, matches, error in profiling.timed('documents', results):
+            if error is not None:
+                profiling.count('errors')
+                writer.write_error(file_path, error)
+            else:
+                profiling.count('records', len(matches))
+                with profiling.stage('write'):
+                    writer.write_file(file_path, _iter_records(file_path, matches))
+    finally:
+        writer.close()
 
 def main():
     parser = argparse.ArgumentParser(
@@ -32,19 +695,68 @@ def main():
     parser.add_argument(
         'class_name',
         type=str,
-        help='The CSS class to search for in <p> tags.'
+        help="The CSS class to search for in <p> tags, or comma-separated selectors such as 'p.x05-Head-A, h2.title'."
     )
     parser.add_argument(
         'files',
         metavar='file',
         type=str,
         nargs='+',
-        help='One or more XHTML files to process.'
+        help='One or more XHTML files, or EPUB/ZIP archives of them, to process.'
+    )
+    parser.add_argument(
+        '--parser',
+        choices=PARSER_BACKENDS,
+        default='bs4',
+        help='Parser backend: bs4 (default) or lxml (streaming, falls back to bs4).'
+    )
+    parser.add_argument(
+        '--jobs', '-j',
+        type=int,
+        default=1,
+        help='Number of worker processes parsing files in parallel (default: 1).'
+    )
+    parser.add_argument(
+        '--chunk-size',
+        type=int,
+        default=DEFAULT_CHUNK_SIZE,
+        help=f'Files sent to a worker at a time with --jobs (default: {DEFAULT_CHUNK_SIZE}).'
+    )
+    
+    parser.add_argument(
+        '--cache',
+        metavar='PATH',
+        help='SQLite file caching parsed documents, so repeat queries on unchanged files skip parsing.'
+    )
+    parser.add_argument(
+        '--cache-size',
+        type=int,
+        default=DEFAULT_MAX_BYTES // (1024 * 1024),
+        metavar='MB',
+        help=f'Maximum size of the cache before least recently used documents are evicted (default: {DEFAULT_MAX_BYTES // (1024 * 1024)}).'
+    )
+    parser.add_argument(
+        '--format',
+        choices=sorted(WRITERS),
+        default='text',
+        help='Output format: text (default), or jsonl/csv records of file, index, selector, text and line.'
     )
+    profiling.add_profile_argument(parser)
     
     args = parser.parse_args()
+
+    try:
+        parse_selectors(args.class_name)
+    except SelectorError as e:
+        parser.error(str(e))
     
-    extract_class_text_from_files(args.class_name, args.files)
+    with profiling.profiled(args.profile):
+        try:
+            extract_class_text_from_files(args.class_name, args.files, args.parser,
+                                          args.jobs, args.chunk_size, args.cache,
+                                          args.cache_size * 1024 * 1024, args.format)
+        except sqlite3.Error as e:
+            sys.exit(f"Error: cannot use cache {args.cache}: {e}")
 
 if __name__ == '__main__':
     main()
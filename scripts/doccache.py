@@ -0,0 +1,130 @@
+import json
+import time
+import zlib
+import sqlite3
+
+# Default bound on the total size of stored indexes.
+DEFAULT_MAX_BYTES = 256 * 1024 * 1024
+
+# Cache hits are recorded in last_used in batches of this many, or after
+# this many seconds, rather than in a transaction per hit.
+TOUCH_BATCH_SIZE = 256
+TOUCH_FLUSH_SECONDS = 5
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS documents (
+    key TEXT PRIMARY KEY,
+    data BLOB NOT NULL,
+    size INTEGER NOT NULL,
+    last_used INTEGER NOT NULL
+);
+CREATE INDEX IF NOT EXISTS documents_last_used ON documents (last_used);
+-- Running total of documents.size, kept by triggers so that every process
+-- sharing the file sees it without summing the table.
+CREATE TABLE IF NOT EXISTS stats (
+    id INTEGER PRIMARY KEY CHECK (id = 0),
+    total_bytes INTEGER NOT NULL
+);
+INSERT OR IGNORE INTO stats SELECT 0, COALESCE(SUM(size), 0) FROM documents;
+CREATE TRIGGER IF NOT EXISTS documents_insert AFTER INSERT ON documents BEGIN
+    UPDATE stats SET total_bytes = total_bytes + NEW.size;
+END;
+CREATE TRIGGER IF NOT EXISTS documents_update AFTER UPDATE OF size ON documents BEGIN
+    UPDATE stats SET total_bytes = total_bytes + NEW.size - OLD.size;
+END;
+CREATE TRIGGER IF NOT EXISTS documents_delete AFTER DELETE ON documents BEGIN
+    UPDATE stats SET total_bytes = total_bytes - OLD.size;
+END;
+"""
+
+
+class DocumentCache:
+    """SQLite-backed, size-bounded LRU cache of parsed document indexes.
+
+    Keys identify a document's content (see classextract.document_key) and
+    values are JSON-serializable indexes, stored zlib-compressed. Once the
+    stored indexes exceed max_bytes, the least recently used are evicted.
+    Several processes may share one cache file.
+
+    The total size is kept in a stats row, so a put does not scan the
+    table. Hits update last_used in batches (see TOUCH_BATCH_SIZE), so a
+    get does not commit; close() writes any still pending.
+    """
+
+    def __init__(self, path, max_bytes=DEFAULT_MAX_BYTES):
+        self.path = path
+        self.max_bytes = max_bytes
+        self._conn = sqlite3.connect(path, timeout=60)
+        # WAL lets several worker processes read and write the same cache file.
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.executescript(SCHEMA)
+        # key -> last_used of hits not yet written, and when the first was.
+        self._touched = {}
+        self._touched_since = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.close()
+
+    def close(self):
+        self.flush()
+        self._conn.close()
+
+    def flush(self):
+        """Write the last_used times of pending cache hits."""
+        if not self._touched:
+            return
+        with self._conn:
+            self._write_touched()
+
+    def _write_touched(self):
+        self._conn.executemany("UPDATE documents SET last_used = ? WHERE key = ?",
+                               [(used, key) for key, used in self._touched.items()])
+        self._touched.clear()
+        self._touched_since = None
+
+    def get(self, key):
+        """Return the index stored under key, or None, marking it recently used."""
+        row = self._conn.execute("SELECT data FROM documents WHERE key = ?", (key,)).fetchone()
+        if row is None:
+            return None
+        now = time.time_ns()
+        self._touched[key] = now
+        if self._touched_since is None:
+            self._touched_since = now
+        if (len(self._touched) >= TOUCH_BATCH_SIZE
+                or now - self._touched_since >= TOUCH_FLUSH_SECONDS * 10 ** 9):
+            self.flush()
+        return json.loads(zlib.decompress(row[0]))
+
+    def put(self, key, index):
+        """Store an index under key, then evict old entries past max_bytes."""
+        data = zlib.compress(json.dumps(index, separators=(',', ':')).encode('utf-8'))
+        with self._conn:
+            if self._touched:
+                # Eviction must see the latest hits.
+                self._write_touched()
+            self._conn.execute(
+                "INSERT INTO documents VALUES (?, ?, ?, ?) ON CONFLICT (key) DO UPDATE SET "
+                "data = excluded.data, size = excluded.size, last_used = excluded.last_used",
+                (key, data, len(data), time.time_ns()))
+            self._evict()
+
+    def total_bytes(self):
+        return self._conn.execute("SELECT total_bytes FROM stats").fetchone()[0]
+
+    def _evict(self):
+        excess = self.total_bytes() - self.max_bytes
+        if excess <= 0:
+            return
+        stale = []
+        for key, size in self._conn.execute(
+                "SELECT key, size FROM documents ORDER BY last_used"):
+            stale.append((key,))
+            excess -= size
+            if excess <= 0:
+                break
+        self._conn.executemany("DELETE FROM documents WHERE key = ?", stale)
@@ -0,0 +1,145 @@
+import os
+import sqlite3
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS file_digests (
+    root TEXT NOT NULL,
+    path TEXT NOT NULL,
+    algorithm TEXT NOT NULL,
+    size INTEGER NOT NULL,
+    mtime_ns INTEGER NOT NULL,
+    inode INTEGER NOT NULL,
+    digest TEXT NOT NULL,
+    PRIMARY KEY (root, path, algorithm)
+);
+CREATE TABLE IF NOT EXISTS zip_archives (
+    path TEXT PRIMARY KEY,
+    size INTEGER NOT NULL,
+    mtime_ns INTEGER NOT NULL
+);
+CREATE TABLE IF NOT EXISTS zip_entries (
+    archive TEXT NOT NULL,
+    name TEXT NOT NULL,
+    size INTEGER NOT NULL,
+    crc INTEGER NOT NULL,
+    PRIMARY KEY (archive, name)
+) WITHOUT ROWID;
+-- Listings used to be stored as one JSON object per archive.
+DROP TABLE IF EXISTS zip_listings;
+"""
+
+# ZIP listing entries inserted per statement while a listing is recorded.
+LISTING_BATCH_SIZE = 1000
+
+
+def stat_key(path_or_stat):
+    """Return the (size, mtime_ns, inode) tuple used to validate cache entries.
+
+    Accepts a path or an os.stat_result.
+    """
+    st = os.stat(path_or_stat) if isinstance(path_or_stat, (str, bytes, os.PathLike)) else path_or_stat
+    return (st.st_size, st.st_mtime_ns, st.st_ino)
+
+
+class HashCache:
+    """SQLite-backed cache of file digests and ZIP central-directory listings.
+
+    File digests are keyed by directory root, relative path and algorithm and
+    are only returned while the file's size, mtime_ns and inode are unchanged.
+    ZIP listings are stored an entry per row, keyed by archive path, and
+    returned while the archive's size and mtime_ns are unchanged. Roots and archive paths should be
+    absolute so the same cache can serve runs from any working directory.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self._conn = sqlite3.connect(path, timeout=60)
+        # WAL lets several processes read and write the same cache file.
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.executescript(SCHEMA)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.close()
+
+    def commit(self):
+        self._conn.commit()
+
+    def close(self):
+        self._conn.commit()
+        self._conn.close()
+
+    def get_digest(self, root, rel_path, algorithm, key):
+        """Return the cached digest for a file, or None if missing or stale."""
+        row = self._conn.execute(
+            "SELECT size, mtime_ns, inode, digest FROM file_digests"
+            " WHERE root = ? AND path = ? AND algorithm = ?",
+            (root, rel_path, algorithm)
+        ).fetchone()
+        if row is None or tuple(row[:3]) != tuple(key):
+            return None
+        return row[3]
+
+    def put_digest(self, root, rel_path, algorithm, key, digest):
+        """Store a file digest; call commit() to persist a batch of puts."""
+        size, mtime_ns, inode = key
+        self._conn.execute(
+            "INSERT OR REPLACE INTO file_digests VALUES (?, ?, ?, ?, ?, ?, ?)",
+            (root, rel_path, algorithm, size, mtime_ns, inode, digest)
+        )
+
+    def iter_zip_listing(self, zip_path, key):
+        """Return an iterator of cached (name, size, crc) entries in name order.
+
+        Returns None if the listing is missing or stale. Entries are read
+        from the database as the iterator is consumed, so a listing of any
+        size is never held in memory.
+        """
+        row = self._conn.execute(
+            "SELECT size, mtime_ns FROM zip_archives WHERE path = ?", (zip_path,)
+        ).fetchone()
+        if row is None or tuple(row) != tuple(key[:2]):
+            return None
+        return self._conn.execute(
+            "SELECT name, size, crc FROM zip_entries WHERE archive = ? ORDER BY name",
+            (zip_path,)
+        )
+
+    def record_zip_listing(self, zip_path, key, entries):
+        """Yield (name, size, crc) entries, storing them as an archive's listing.
+
+        The listing is stored in batches as it streams by and only becomes
+        visible to iter_zip_listing once entries is exhausted.
+        """
+        self._conn.execute("DELETE FROM zip_archives WHERE path = ?", (zip_path,))
+        self._conn.execute("DELETE FROM zip_entries WHERE archive = ?", (zip_path,))
+        batch = []
+        for name, size, crc in entries:
+            batch.append((zip_path, name, size, crc))
+            if len(batch) >= LISTING_BATCH_SIZE:
+                self._insert_zip_entries(batch)
+            yield name, size, crc
+        self._insert_zip_entries(batch)
+        self._conn.execute("INSERT INTO zip_archives VALUES (?, ?, ?)",
+                           (zip_path, key[0], key[1]))
+        self._conn.commit()
+
+    def _insert_zip_entries(self, batch):
+        self._conn.executemany("INSERT OR REPLACE INTO zip_entries VALUES (?, ?, ?, ?)", batch)
+        batch.clear()
+
+    def get_zip_listing(self, zip_path, key):
+        """Return the cached {name: (size, crc)} listing, or None if missing or stale."""
+        entries = self.iter_zip_listing(zip_path, key)
+        if entries is None:
+            return None
+        return {name: (size, crc) for name, size, crc in entries}
+
+    def put_zip_listing(self, zip_path, key, listing):
+        """Store a {name: (size, crc)} listing for an archive."""
+        entries = ((name, size, crc) for name, (size, crc) in listing.items())
+        for _ in self.record_zip_listing(zip_path, key, entries):
+            pass
@@ -0,0 +1,113 @@
+import sqlite3
+from datetime import datetime, timezone
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS mailboxes (
+    name TEXT PRIMARY KEY,
+    uidvalidity INTEGER NOT NULL,
+    last_uid INTEGER NOT NULL
+);
+CREATE TABLE IF NOT EXISTS messages (
+    mailbox TEXT NOT NULL,
+    uid INTEGER NOT NULL,
+    internal_date INTEGER NOT NULL,
+    raw BLOB NOT NULL,
+    PRIMARY KEY (mailbox, uid)
+);
+CREATE INDEX IF NOT EXISTS messages_internal_date ON messages (internal_date);
+"""
+
+
+class MessageStore:
+    """SQLite store of raw messages synced from IMAP mailboxes.
+
+    For each mailbox it records the UIDVALIDITY and the highest UID seen,
+    so a sync only needs to fetch UIDs above it. Messages are kept as raw
+    RFC822 bytes with their INTERNALDATE, so they can be parsed offline.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self._conn = sqlite3.connect(path)
+        self._conn.executescript(SCHEMA)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.close()
+
+    def close(self):
+        self._conn.commit()
+        self._conn.close()
+
+    def commit(self):
+        self._conn.commit()
+
+    def sync_state(self, mailbox):
+        """Return (uidvalidity, last_uid) for mailbox, or None if never synced."""
+        return self._conn.execute(
+            "SELECT uidvalidity, last_uid FROM mailboxes WHERE name = ?", (mailbox,)
+        ).fetchone()
+
+    def reset(self, mailbox, uidvalidity, last_uid=0):
+        """Forget mailbox's messages and start again under a new UIDVALIDITY.
+
+        last_uid is the UID to sync from, such as the mailbox's highest UID
+        when it was selected, so messages before it are never fetched.
+        """
+        with self._conn:
+            self._conn.execute("DELETE FROM messages WHERE mailbox = ?", (mailbox,))
+            self._conn.execute("INSERT OR REPLACE INTO mailboxes VALUES (?, ?, ?)",
+                               (mailbox, uidvalidity, last_uid))
+
+    def forget(self, mailbox):
+        """Drop mailbox's messages and sync state, so sync_state returns None."""
+        with self._conn:
+            self._conn.execute("DELETE FROM messages WHERE mailbox = ?", (mailbox,))
+            self._conn.execute("DELETE FROM mailboxes WHERE name = ?", (mailbox,))
+
+    def put_messages(self, mailbox, messages, sync_state=None):
+        """Store (uid, internal_date, raw) messages and advance the mailbox's last UID.
+
+        The mailbox must have been reset() under its current UIDVALIDITY
+        first, unless sync_state, a (uidvalidity, last_uid) pair, is given:
+        it is then recorded in the same transaction as the messages, e.g.
+        once the last batch of a first sync is stored.
+        """
+        rows = [(mailbox, uid, int(internal_date.timestamp()), raw)
+                for uid, internal_date, raw in messages]
+        if not rows and sync_state is None:
+            return
+        last_uid = max((row[1] for row in rows), default=0)
+        with self._conn:
+            self._conn.executemany("INSERT OR REPLACE INTO messages VALUES (?, ?, ?, ?)", rows)
+            if sync_state is not None:
+                uidvalidity, state_uid = sync_state
+                self._conn.execute("INSERT OR REPLACE INTO mailboxes VALUES (?, ?, ?)",
+                                   (mailbox, uidvalidity, max(state_uid, last_uid)))
+            else:
+                self._conn.execute(
+                    "UPDATE mailboxes SET last_uid = MAX(last_uid, ?) WHERE name = ?",
+                    (last_uid, mailbox))
+
+    def iter_messages(self, mailbox=None, since=None, limit=None):
+        """Yield (mailbox, uid, internal_date, raw), newest first.
+
+        Optionally only messages of one mailbox, received at or after the
+        datetime since, and at most limit of them.
+        """
+        query = "SELECT mailbox, uid, internal_date, raw FROM messages WHERE 1"
+        params = []
+        if mailbox is not None:
+            query += " AND mailbox = ?"
+            params.append(mailbox)
+        if since is not None:
+            query += " AND internal_date >= ?"
+            params.append(int(since.timestamp()))
+        query += " ORDER BY internal_date DESC, uid DESC"
+        if limit is not None:
+            query += " LIMIT ?"
+            params.append(limit)
+        for mailbox_name, uid, internal_date, raw in self._conn.execute(query, params):
+            yield mailbox_name, uid, datetime.fromtimestamp(internal_date, timezone.utc), raw
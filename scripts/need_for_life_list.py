@@ -0,0 +1,178 @@
+import time
+import queue
+import asyncio
+import argparse
+import threading
+from collections import defaultdict, namedtuple
+
+try:
+    from . import profiling
+    from .need_for_life_list_fetch import (DEFAULT_CONCURRENCY, DEFAULT_TIMEOUT, LABEL_NAME,
+                                           env_mailboxes, iter_mailbox_emails, read_accounts)
+    from .need_for_life_list_parse import (DEFAULT_COUNTIES, apply_filters, county_predicate,
+                                           iter_sightings, min_count_predicate, print_sighting,
+                                           reported_since_predicate)
+except ImportError:  # run directly as a script
+    import profiling
+    from need_for_life_list_fetch import (DEFAULT_CONCURRENCY, DEFAULT_TIMEOUT, LABEL_NAME,
+                                          env_mailboxes, iter_mailbox_emails, read_accounts)
+    from need_for_life_list_parse import (DEFAULT_COUNTIES, apply_filters, county_predicate,
+                                          iter_sightings, min_count_predicate, print_sighting,
+                                          reported_since_predicate)
+
+# Decoded emails buffered between the fetcher and the parser, in each of the
+# fetcher's queue and the handoff queue. A full queue pauses fetching until
+# the parser catches up.
+DEFAULT_QUEUE_SIZE = 16
+
+STAGES = ("fetch", "wait", "parse", "filter", "total")
+
+# matches is empty when an on_match callback was given; counts[i] is the
+# number of sightings passing the first i + 1 predicates; timings maps each
+# of STAGES to seconds.
+PipelineResult = namedtuple("PipelineResult", ["matches", "emails", "total", "counts", "timings"])
+
+_DONE = object()
+
+def _produce(mailboxes, buffer, timings, errors, options):
+    """
+    Fetcher thread: puts each DecodedEmail on the buffer, then _DONE.
+    """
+    async def fill():
+        async for message in iter_mailbox_emails(mailboxes, queue_size=buffer.maxsize,
+                                                 **options):
+            await asyncio.to_thread(buffer.put, message)
+
+    start = time.perf_counter()
+    try:
+        asyncio.run(fill())
+    except Exception as e:
+        errors.append(e)
+    finally:
+        timings["fetch"] = time.perf_counter() - start
+        buffer.put(_DONE)
+
+def run_pipeline(mailboxes, predicates, queue_size=DEFAULT_QUEUE_SIZE, on_match=None, **options):
+    """
+    Fetches the emails of each Mailbox and parses and filters their
+    sightings in process, returning a PipelineResult.
+
+    Fetching runs in its own thread and hands decoded emails to the parser
+    through a queue of at most queue_size emails, so parsing one email
+    overlaps the network wait for the next. The fetcher's own queue is
+    bounded by queue_size too (see iter_mailbox_emails), so a slow parser
+    pauses fetching rather than letting fetched emails pile up. The
+    plain-text bodies are parsed directly, without printing and re-reading
+    them. predicates are applied as by apply_filters. If on_match is given
+    it is called with each matching Sighting as soon as it is found, and
+    matches is left empty. options are passed to iter_mailbox_emails.
+    """
+    timings = defaultdict(float)
+    errors = []
+    buffer = queue.Queue(queue_size)
+    counts = [0] * len(predicates)
+    matches = []
+    emails = total = 0
+
+    start = time.perf_counter()
+    fetcher = threading.Thread(target=_produce, args=(mailboxes, buffer, timings, errors, options),
+                               daemon=True)
+    fetcher.start()
+    while True:
+        stage_start = time.perf_counter()
+        message = buffer.get()
+        parse_start = time.perf_counter()
+        timings["wait"] += parse_start - stage_start
+        if message is _DONE:
+            break
+        emails += 1
+        sightings = list(iter_sightings(message.text.splitlines()))
+        filter_start = time.perf_counter()
+        timings["parse"] += filter_start - parse_start
+        total += len(sightings)
+        found = list(apply_filters(sightings, predicates, counts))
+        timings["filter"] += time.perf_counter() - filter_start
+        if on_match is None:
+            matches.extend(found)
+        else:
+            for rec in found:
+                on_match(rec)
+    fetcher.join()
+    timings["total"] = time.perf_counter() - start
+    for stage in ("wait", "parse", "filter"):
+        profiling.record(stage, timings[stage], emails)
+    profiling.count("emails", emails)
+    profiling.count("sightings", total)
+    if errors:
+        raise errors[0]
+    return PipelineResult(matches, emails, total, counts, {stage: timings[stage] for stage in STAGES})
+
+def print_timings(timings):
+    print("Stage timings:")
+    for stage in STAGES:
+        print(f"  {stage}: {timings[stage]:.3f}s")
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Fetch BirdAlert emails and filter their eBird sightings in one process.")
+    parser.add_argument("--label", action="append",
+                        help=f"Label (mailbox) to fetch from; repeat for several (default: {LABEL_NAME}).")
+    parser.add_argument("--accounts", metavar="PATH",
+                        help="JSON file of accounts and labels to fetch.")
+    parser.add_argument("--days", type=int, default=10, help="How many days of email to fetch.")
+    parser.add_argument("--limit", type=int, default=10, help="Latest emails fetched per label.")
+    parser.add_argument("--concurrency", type=int, default=DEFAULT_CONCURRENCY,
+                        help=f"Mailboxes fetched at the same time (default: {DEFAULT_CONCURRENCY}).")
+    parser.add_argument("--partial", action="store_true",
+                        help="Download only the headers and plain-text part of each email.")
+    parser.add_argument("--timeout", type=float, default=DEFAULT_TIMEOUT,
+                        help=f"Seconds before a mailbox fetch is abandoned (default: {DEFAULT_TIMEOUT}).")
+    parser.add_argument("--queue-size", type=int, default=DEFAULT_QUEUE_SIZE,
+                        help=f"Emails buffered between fetching and parsing (default: {DEFAULT_QUEUE_SIZE}).")
+    parser.add_argument("--threshold", type=int, default=5, help="Minimum count of species to include in the output.")
+    parser.add_argument("--counties", nargs='*', default=DEFAULT_COUNTIES, help="List of county names to filter by.")
+    parser.add_argument("--days-ago", type=int, default=50, help="Only sightings reported this many days back.")
+    parser.add_argument("--stream", action="store_true",
+                        help="Print matching records as they are found, unsorted, with the totals at the end.")
+    profiling.add_profile_argument(parser)
+
+    args = parser.parse_args()
+    with profiling.profiled(args.profile):
+        _run(args)
+
+def _run(args):
+    """
+    Runs the pipeline as asked by main's parsed arguments.
+    """
+    try:
+        if args.accounts:
+            mailboxes = read_accounts(args.accounts)
+        else:
+            mailboxes = env_mailboxes(args.label or [LABEL_NAME])
+    except (OSError, ValueError, KeyError) as e:
+        print(f"ERROR: {e}")
+        return
+
+    predicates = [
+        county_predicate(args.counties),
+        min_count_predicate(args.threshold),
+        reported_since_predicate(args.days_ago),
+    ]
+    result = run_pipeline(mailboxes, predicates, queue_size=args.queue_size,
+                          on_match=print_sighting if args.stream else None,
+                          days=args.days, limit=args.limit, concurrency=args.concurrency,
+                          timeout=args.timeout, partial=args.partial)
+
+    print(f"Emails fetched: {result.emails}")
+    print(f"Total records parsed: {result.total}")
+    print(f"Filtered by counties: {result.counts[0]} records.")
+    print(f"Filtered by species count (>={args.threshold} sightings): {result.counts[1]} records.\n")
+    print(f"Filtered by date: {result.counts[2]} records.\n")
+
+    for rec in sorted(result.matches, key=lambda rec: rec.species):
+        print_sighting(rec)
+
+    print_timings(result.timings)
+
+if __name__ == "__main__":
+    main()
@@ -1,11 +1,25 @@
 #!/usr/bin/env python3
 
 import os
-import imaplib
+import re
+import sys
+import json
 import email
+import asyncio
+import imaplib
+import itertools
+import argparse
+from collections import defaultdict, namedtuple
 from email.header import decode_header
 from datetime import datetime, timedelta
 
+try:
+    from . import profiling
+    from .messagestore import MessageStore
+except ImportError:  # run directly as a script
+    import profiling
+    from messagestore import MessageStore
+
 # Gmail IMAP details (usually don't change)
 IMAP_SERVER = "imap.gmail.com"
 IMAP_PORT = 993
@@ -13,6 +27,22 @@ IMAP_PORT = 993
 # Hard-coded label name we want to fetch
 LABEL_NAME = "BirdAlert"
 
+# Limits for fetching many mailboxes at once: mailboxes fetched at the same
+# time, connections open per account, and seconds before an IMAP call
+# is abandoned.
+DEFAULT_CONCURRENCY = 4
+DEFAULT_CONNECTIONS_PER_ACCOUNT = 2
+DEFAULT_TIMEOUT = 60
+
+# An IMAP login, and one label of it to fetch.
+Account = namedtuple("Account", ["user", "password", "server", "port", "ssl"],
+                     defaults=(IMAP_SERVER, IMAP_PORT, True))
+Mailbox = namedtuple("Mailbox", ["account", "label"])
+
+# A fetched email decoded for display, tagged with where it came from.
+DecodedEmail = namedtuple("DecodedEmail", ["user", "label", "msg_id", "created_at",
+                                           "from_", "subject", "text"])
+
 def get_plain_text_body(msg):
     """
     Extracts and returns the plain-text body from an email.message.Message object.
@@ -38,35 +68,667 @@ def get_plain_text_body(msg):
         else:
             return ""
 
-def fetch_birdalert_emails():
+# Matches the "<seq> (" that opens each untagged FETCH response.
+FETCH_RESPONSE_PATTERN = re.compile(rb'^(\d+) \(')
+INTERNALDATE_PATTERN = re.compile(rb'INTERNALDATE "([^"]+)"')
+UID_PATTERN = re.compile(rb'UID (\d+)')
+
+# UIDs fetched per UID FETCH command during a first full sync.
+SYNC_BATCH_SIZE = 500
+
+# The only headers a partial fetch downloads.
+PARTIAL_HEADER_FIELDS = ("FROM", "SUBJECT", "DATE")
+PARTIAL_HEADER_ITEM = f"BODY.PEEK[HEADER.FIELDS ({' '.join(PARTIAL_HEADER_FIELDS)})]"
+
+# Tokens of a FETCH response: parentheses, NIL, quoted strings, the {n}
+# that announces a literal, and atoms such as BODY[HEADER.FIELDS (FROM)].
+FETCH_TOKEN_PATTERN = re.compile(
+    rb'\s*(?:(?P<open>\()|(?P<close>\))|"(?P<quoted>(?:[^"\\]|\\.)*)"'
+    rb'|\{(?P<literal>\d+)\}\s*$|(?P<atom>[^\s()"{\[]+(?:\[[^\]]*\])?(?:<\d+>)?))')
+
+# Where a message's plain-text body lives, from its BODYSTRUCTURE.
+TextPart = namedtuple("TextPart", ["section", "charset", "encoding"])
+
+def message_set(msg_ids):
     """
-    Main function to fetch emails from LABEL_NAME using IMAP.
-    Prints From, Subject, and plain-text content.
+    Returns an IMAP message set naming all of msg_ids in one command,
+    collapsing consecutive IDs into ranges, e.g. [1, 2, 3, 5] -> "1:3,5".
+    """
+    numbers = sorted({int(msg_id) for msg_id in msg_ids})
+    ranges = []
+    for number in numbers:
+        if ranges and number == ranges[-1][1] + 1:
+            ranges[-1][1] = number
+        else:
+            ranges.append([number, number])
+    return ",".join(str(low) if low == high else f"{low}:{high}" for low, high in ranges)
+
+def iter_fetch_responses(response):
+    """
+    Yields (msg_id, header, literal) for each message in an imaplib FETCH
+    response. header is the response line as bytes; literal is the message
+    data that followed it, or None.
+    """
+    for item in response:
+        if isinstance(item, tuple):
+            header, literal = item
+        else:
+            header, literal = item, None
+        match = FETCH_RESPONSE_PATTERN.match(header or b"")
+        if match:
+            yield match.group(1), header, literal
+
+def _parse_fetch_items(parts):
+    """
+    Parses one FETCH response, given as its text with any literals spliced
+    in between, into (msg_id, {ITEM NAME: value}). Lists become Python
+    lists, strings and literals bytes, and NIL None.
+    """
+    stack = [[]]
+    for i, part in enumerate(parts):
+        if i % 2:
+            stack[-1].append(part)
+            continue
+        pos = 0
+        while pos < len(part):
+            match = FETCH_TOKEN_PATTERN.match(part, pos)
+            if match is None or match.end() == pos:
+                break
+            pos = match.end()
+            if match.group("open"):
+                stack.append([])
+            elif match.group("close"):
+                value = stack.pop()
+                stack[-1].append(value)
+            elif match.group("quoted") is not None:
+                stack[-1].append(re.sub(rb'\\(.)', rb'\1', match.group("quoted")))
+            elif match.group("atom"):
+                atom = match.group("atom")
+                stack[-1].append(None if atom.upper() == b"NIL" else atom)
+    msg_id, items = stack[0][0], stack[0][1]
+    return msg_id, {items[i].upper(): items[i + 1] for i in range(0, len(items) - 1, 2)}
+
+def iter_fetch_items(response):
+    """
+    Yields (msg_id, {ITEM NAME: value}) for each message in an imaplib
+    FETCH response, however many literals each message's items hold.
+    """
+    parts = []
+    continuing = False
+    for item in response:
+        if isinstance(item, tuple):
+            header, literal = item
+        else:
+            header, literal = item, None
+        if not continuing:
+            if parts:
+                yield _parse_fetch_items(parts)
+            parts = []
+            if not FETCH_RESPONSE_PATTERN.match(header or b""):
+                continue
+        # After a literal, the next item continues the same message.
+        parts.append(header)
+        continuing = literal is not None
+        if continuing:
+            parts.append(literal)
+    if parts:
+        yield _parse_fetch_items(parts)
+
+def _pairs(values):
+    """
+    Returns an IMAP ("KEY" "value" ...) parameter list as a dict.
+    """
+    if not isinstance(values, list):
+        return {}
+    return {values[i].upper(): values[i + 1] for i in range(0, len(values) - 1, 2)}
+
+def find_text_part(structure, section=""):
+    """
+    Returns the TextPart of the first text/plain part of a BODYSTRUCTURE
+    that is not an attachment, as get_plain_text_body would choose, or None.
+    """
+    if structure and isinstance(structure[0], list):
+        # A multipart body lists its parts, then its subtype and extension data.
+        children = itertools.takewhile(lambda item: isinstance(item, list), structure)
+        for n, part in enumerate(children, start=1):
+            found = find_text_part(part, f"{section}.{n}" if section else str(n))
+            if found is not None:
+                return found
+        return None
+    if len(structure) < 7 or [(value or b"").upper() for value in structure[:2]] != [b"TEXT", b"PLAIN"]:
+        return None
+    params = _pairs(structure[2])
+    disposition = structure[9] if len(structure) > 9 and isinstance(structure[9], list) else []
+    if b"NAME" in params or b"FILENAME" in _pairs(disposition[1:2] and disposition[1]):
+        return None
+    charset = params.get(b"CHARSET")
+    return TextPart(section or "1", charset.decode() if charset else None,
+                    (structure[5] or b"7BIT").decode().upper())
+
+def partial_message(header, text_part, body):
+    """
+    Returns raw RFC822 bytes holding just the fetched header fields and the
+    plain-text part, encoded as on the server, so get_plain_text_body and
+    everything downstream decode it exactly as they would the full message.
+    """
+    header = (header or b"").rstrip(b"\r\n") + b"\r\n"
+    if text_part is None:
+        return header + b"\r\n"
+    content_type = b"Content-Type: text/plain"
+    if text_part.charset:
+        content_type += b'; charset="' + text_part.charset.encode() + b'"'
+    return (header + content_type + b"\r\nContent-Transfer-Encoding: "
+            + text_part.encoding.encode() + b"\r\n\r\n" + (body or b""))
+
+def fetch_partial_bodies(mail, structures, uid=False):
+    """
+    Returns {msg_id: raw} for the {msg_id: BODYSTRUCTURE} given, downloading
+    only PARTIAL_HEADER_FIELDS and each message's plain-text part. Messages
+    whose text is in the same section (usually all of them) share one
+    FETCH. With uid, msg_ids are UIDs.
+    """
+    text_parts = {msg_id: find_text_part(structure) for msg_id, structure in structures.items()}
+    by_section = defaultdict(list)
+    for msg_id, text_part in text_parts.items():
+        by_section[text_part.section if text_part else None].append(msg_id)
+
+    raw_emails = {}
+    for section, msg_ids in by_section.items():
+        items = PARTIAL_HEADER_ITEM + (f" BODY.PEEK[{section}]" if section else "")
+        if uid:
+            status, response = mail.uid("FETCH", message_set(msg_ids), f"(UID {items})")
+        else:
+            status, response = mail.fetch(message_set(msg_ids), f"({items})")
+        if status != "OK":
+            continue
+        body_key = f"BODY[{section}]".encode()
+        for seq, fetched in iter_fetch_items(response):
+            msg_id = int(fetched[b"UID"]) if uid else seq
+            if msg_id not in text_parts:
+                continue
+            header = next((value for key, value in fetched.items()
+                           if key.startswith(b"BODY[HEADER")), None)
+            raw_emails[msg_id] = partial_message(header, text_parts[msg_id],
+                                                 fetched.get(body_key))
+    return raw_emails
+
+def parse_internal_date(header):
+    """
+    Returns the INTERNALDATE in a FETCH response line as a datetime, or None.
+    """
+    match = INTERNALDATE_PATTERN.search(header)
+    if not match:
+        return None
+    return datetime.strptime(match.group(1).decode(), "%d-%b-%Y %H:%M:%S %z")
+
+def fetch_internal_dates(mail, msg_ids):
+    """
+    Returns [(msg_id, datetime)] for msg_ids using a single FETCH command.
+    """
+    if not msg_ids:
+        return []
+    with profiling.stage("fetch_dates"):
+        status, response = mail.fetch(message_set(msg_ids), "(INTERNALDATE)")
+    if status != "OK":
+        return []
+    dates = []
+    for msg_id, header, _ in iter_fetch_responses(response):
+        internal_date = parse_internal_date(header)
+        if internal_date is not None:
+            dates.append((msg_id, internal_date))
+    return dates
+
+def fetch_raw_messages(mail, msg_ids, partial=False):
+    """
+    Returns {msg_id: raw RFC822 bytes} for msg_ids using a single FETCH command.
+
+    With partial, BODYSTRUCTURE is fetched first and then only the From,
+    Subject and Date headers and the plain-text part (see
+    fetch_partial_bodies), skipping HTML alternatives and attachments.
     """
-    EMAIL_ACCOUNT = os.getenv("EMAIL_ACCOUNT")
-    EMAIL_PASSWORD = os.getenv("EMAIL_PASSWORD")
+    if not msg_ids:
+        return {}
+    with profiling.stage("fetch_bodies"):
+        raw_emails = _fetch_raw_messages(mail, msg_ids, partial)
+    profiling.count("fetched_emails", len(raw_emails))
+    profiling.count("fetched_bytes", sum(map(len, raw_emails.values())))
+    return raw_emails
 
-    if not EMAIL_ACCOUNT or not EMAIL_PASSWORD:
-        print("ERROR: EMAIL_ACCOUNT and/or EMAIL_PASSWORD environment variables not set.")
-        return
+def _fetch_raw_messages(mail, msg_ids, partial):
+    if partial:
+        status, response = mail.fetch(message_set(msg_ids), "(BODYSTRUCTURE)")
+        if status != "OK":
+            return {}
+        return fetch_partial_bodies(mail, {msg_id: items[b"BODYSTRUCTURE"]
+                                           for msg_id, items in iter_fetch_items(response)})
+    status, response = mail.fetch(message_set(msg_ids), "(RFC822)")
+    if status != "OK":
+        return {}
+    return {msg_id: literal for msg_id, _, literal in iter_fetch_responses(response)
+            if literal is not None}
+
+def decode_subject(msg_obj):
+    """
+    Returns the decoded Subject header of an email.message.Message object.
+    """
+    subject = ""
+    for part, enc in decode_header(msg_obj.get("Subject", "")):
+        if isinstance(part, bytes):
+            subject += part.decode(enc if enc else "utf-8")
+        else:
+            subject += part
+    return subject
 
+def decode_email(raw_email):
+    """
+    Returns (from, subject, plain-text content) of a raw email.
+    """
+    with profiling.stage("decode"):
+        msg_obj = email.message_from_bytes(raw_email)
+        return msg_obj.get("From"), decode_subject(msg_obj), get_plain_text_body(msg_obj)
+
+def print_email(msg_id, created_at, raw_email):
+    """
+    Prints the From, Subject, and plain-text content of a raw email.
+    """
+    _print_email(msg_id, created_at, *decode_email(raw_email))
+
+def _print_email(msg_id, created_at, from_, subject, text_content, mailbox=None):
+    print("\n------------------------------------------------------------")
+    print(f"Email {msg_id} - Created at: {created_at}")
+    if mailbox:
+        print(f"Mailbox: {mailbox}")
+    print(f"From: {from_}")
+    print(f"Subject: {subject}")
+    print(f"Text Content:\n{text_content}")
+
+def fetch_new_messages(mail, message_set_spec, partial=False):
+    """
+    Returns [(uid, internal_date, raw)] for a UID message set, in one UID
+    FETCH, or with partial, in one for BODYSTRUCTURE and one per distinct
+    text section (see fetch_raw_messages).
+    """
+    with profiling.stage("fetch_bodies"):
+        messages = _fetch_new_messages(mail, message_set_spec, partial)
+    profiling.count("fetched_emails", len(messages))
+    profiling.count("fetched_bytes", sum(len(raw) for _, _, raw in messages))
+    return messages
+
+def _fetch_new_messages(mail, message_set_spec, partial):
+    if partial:
+        status, response = mail.uid("FETCH", message_set_spec, "(UID INTERNALDATE BODYSTRUCTURE)")
+        if status != "OK":
+            raise imaplib.IMAP4.error(f"UID FETCH {message_set_spec} failed: {status}")
+        found = {int(items[b"UID"]): items for _, items in iter_fetch_items(response)}
+        raw_emails = fetch_partial_bodies(
+            mail, {uid: items[b"BODYSTRUCTURE"] for uid, items in found.items()}, uid=True)
+        return [(uid, datetime.strptime(items[b"INTERNALDATE"].decode(), "%d-%b-%Y %H:%M:%S %z"),
+                 raw_emails[uid])
+                for uid, items in found.items() if uid in raw_emails]
+    status, response = mail.uid("FETCH", message_set_spec, "(UID INTERNALDATE RFC822)")
+    if status != "OK":
+        raise imaplib.IMAP4.error(f"UID FETCH {message_set_spec} failed: {status}")
+    messages = []
+    for _, header, literal in iter_fetch_responses(response):
+        uid = UID_PATTERN.search(header)
+        internal_date = parse_internal_date(header)
+        if uid and internal_date is not None and literal is not None:
+            messages.append((int(uid.group(1)), internal_date, literal))
+    return messages
+
+def highest_uid(mail):
+    """
+    Returns the highest UID the selected mailbox has handed out: UIDNEXT - 1
+    from the SELECT response, or the largest UID from UID SEARCH ALL on
+    servers that do not send UIDNEXT. Returns 0 for an empty mailbox.
+    """
+    _, data = mail.response("UIDNEXT")
+    if data and data[-1] is not None:
+        return int(data[-1]) - 1
+    with profiling.stage("search"):
+        status, data = mail.uid("SEARCH", None, "ALL")
+    if status != "OK":
+        raise imaplib.IMAP4.error("Failed to search for messages in label.")
+    return max(map(int, data[0].split()), default=0)
+
+def sync_label(mail, store, label=LABEL_NAME, days=10, partial=False):
+    """
+    Copies messages new since the last sync of a label into a MessageStore
+    and returns how many were added.
+
+    The label's UIDVALIDITY and highest stored UID are kept in the store,
+    so a later sync is a single UID FETCH of "last_uid+1:*". The first sync,
+    or one after UIDVALIDITY changes, fetches the last `days` days of mail
+    in batches of SYNC_BATCH_SIZE. Only once every batch is stored does it
+    record the label's highest UID, even if that window is empty, so later
+    syncs never refetch older mail, and an interrupted first sync starts
+    over. partial stores only the From, Subject and Date headers and
+    plain-text part of each message (see fetch_raw_messages).
+    """
+    status, _ = mail.select(label, readonly=True)
+    if status != "OK":
+        raise imaplib.IMAP4.error(f"Could not select label '{label}'. Status: {status}")
+    uidvalidity = int(mail.response("UIDVALIDITY")[1][0])
+
+    state = store.sync_state(label)
+    if state is not None and state[0] == uidvalidity:
+        last_uid = state[1]
+        # "n:*" always includes the highest UID, even if it is below n.
+        messages = fetch_new_messages(mail, f"{last_uid + 1}:*", partial)
+        messages = [message for message in messages if message[0] > last_uid]
+        store.put_messages(label, messages)
+        return len(messages)
+
+    highest = highest_uid(mail)
+    store.forget(label)
+    date_since = (datetime.utcnow() - timedelta(days=days)).strftime("%d-%b-%Y")
+    with profiling.stage("search"):
+        status, data = mail.uid("SEARCH", None, f"SINCE {date_since}")
+    if status != "OK":
+        raise imaplib.IMAP4.error("Failed to search for messages in label.")
+    uids = data[0].split()
+    added = 0
+    for start in range(0, max(len(uids), 1), SYNC_BATCH_SIZE):
+        batch = uids[start:start + SYNC_BATCH_SIZE]
+        messages = fetch_new_messages(mail, message_set(batch), partial) if batch else []
+        last = start + SYNC_BATCH_SIZE >= len(uids)
+        store.put_messages(label, messages, (uidvalidity, highest) if last else None)
+        added += len(messages)
+    return added
+
+def sync_birdalert_emails(store_path, mail=None, label=LABEL_NAME, days=10, limit=10,
+                          partial=False):
+    """
+    Incremental mode: syncs new messages from a label into the MessageStore
+    at store_path, then prints the latest `limit` messages of the last
+    `days` days from the store.
+    """
     try:
-        # Connect via SSL
-        mail = imaplib.IMAP4_SSL(IMAP_SERVER, IMAP_PORT)
-        mail.login(EMAIL_ACCOUNT, EMAIL_PASSWORD)
+        if mail is None:
+            EMAIL_ACCOUNT = os.getenv("EMAIL_ACCOUNT")
+            EMAIL_PASSWORD = os.getenv("EMAIL_PASSWORD")
+
+            if not EMAIL_ACCOUNT or not EMAIL_PASSWORD:
+                print("ERROR: EMAIL_ACCOUNT and/or EMAIL_PASSWORD environment variables not set.")
+                return
+
+            mail = connect(EMAIL_ACCOUNT, EMAIL_PASSWORD)
+
+        with MessageStore(store_path) as store:
+            added = sync_label(mail, store, label, days, partial)
+            print(f"Fetched {added} new messages from '{label}' into {store_path}")
+
+            since = datetime.utcnow() - timedelta(days=days)
+            for _, uid, created_at, raw_email in store.iter_messages(label, since, limit):
+                print_email(uid, created_at, raw_email)
+
+        mail.close()
+        mail.logout()
+
+    except imaplib.IMAP4.error as e:
+        print("IMAP Authentication/Connection Error:", e)
+    except Exception as e:
+        print("An unexpected error occurred:", e)
+
+def connect(account, password, server=IMAP_SERVER, port=IMAP_PORT, ssl=True, timeout=None):
+    """
+    Returns an imaplib connection logged in to the server. timeout, in
+    seconds, applies to every socket operation.
+    """
+    with profiling.stage("connect"):
+        if ssl:
+            mail = imaplib.IMAP4_SSL(server, port, timeout=timeout)
+        else:
+            mail = imaplib.IMAP4(server, port, timeout=timeout)
+        mail.login(account, password)
+    return mail
+
+def fetch_label_messages(mail, label=LABEL_NAME, days=10, limit=10, partial=False):
+    """
+    Returns [(msg_id, internal_date, raw)] for the latest `limit` messages
+    of the last `days` days in a label, newest first, in three commands:
+    one SEARCH and two batched FETCHes (one more with partial, see
+    fetch_raw_messages). Raises imaplib.IMAP4.error if the label cannot be
+    selected or searched.
+    """
+    status, _ = mail.select(label, readonly=True)
+    if status != "OK":
+        raise imaplib.IMAP4.error(f"Could not select label '{label}'. Status: {status}")
+    date_since = (datetime.utcnow() - timedelta(days=days)).strftime("%d-%b-%Y")
+    with profiling.stage("search"):
+        status, msg_ids_data = mail.search(None, f'SINCE {date_since}')
+    if status != "OK":
+        raise imaplib.IMAP4.error(f"Failed to search for messages in label '{label}'.")
+    emails_with_dates = fetch_internal_dates(mail, msg_ids_data[0].split())
+    emails_with_dates.sort(key=lambda x: x[1], reverse=True)
+    latest_emails = emails_with_dates[:limit]
+    raw_emails = fetch_raw_messages(mail, [msg_id for msg_id, _ in latest_emails], partial)
+    return [(msg_id, created_at, raw_emails[msg_id])
+            for msg_id, created_at in latest_emails if msg_id in raw_emails]
+
+def _logout(mail):
+    try:
+        mail.logout()
+    except (imaplib.IMAP4.error, OSError):
+        pass
+
+class ConnectionPool:
+    """
+    Hands out logged-in IMAP connections for asyncio tasks, reusing each
+    account's connections across its mailboxes and opening at most
+    `per_account` of them per account. Blocking imaplib calls run in
+    worker threads.
+    """
+
+    def __init__(self, per_account=DEFAULT_CONNECTIONS_PER_ACCOUNT, timeout=DEFAULT_TIMEOUT):
+        self.per_account = per_account
+        self.timeout = timeout
+        self._idle = defaultdict(list)
+        self._limits = {}
+
+    async def acquire(self, account):
+        limit = self._limits.setdefault(account, asyncio.Semaphore(self.per_account))
+        await limit.acquire()
+        if self._idle[account]:
+            return self._idle[account].pop()
+        try:
+            return await asyncio.wait_for(
+                asyncio.to_thread(connect, account.user, account.password, account.server,
+                                  account.port, account.ssl, self.timeout),
+                self.timeout)
+        except BaseException:
+            limit.release()
+            raise
+
+    def release(self, account, mail, reuse=True):
+        """
+        Returns a connection to the pool. Connections in an unknown state,
+        e.g. after a timeout, should not be reused.
+        """
+        if reuse:
+            self._idle[account].append(mail)
+        else:
+            try:
+                mail.shutdown()
+            except OSError:
+                pass
+        self._limits[account].release()
+
+    async def close(self):
+        idle = [mail for connections in self._idle.values() for mail in connections]
+        self._idle.clear()
+        await asyncio.gather(*(asyncio.to_thread(_logout, mail) for mail in idle))
+
+async def iter_mailbox_emails(mailboxes, days=10, limit=10, concurrency=DEFAULT_CONCURRENCY,
+                              connections_per_account=DEFAULT_CONNECTIONS_PER_ACCOUNT,
+                              timeout=DEFAULT_TIMEOUT, on_error=None, partial=False,
+                              queue_size=0):
+    """
+    Asynchronously yields a DecodedEmail for the latest `limit` messages of
+    the last `days` days in each Mailbox, fetching up to `concurrency`
+    mailboxes at once, so the total time is close to that of the slowest
+    mailbox rather than the sum of all of them.
+
+    Each mailbox's messages are yielded together, newest first, as soon as
+    it has been fetched and decoded. A mailbox that fails, including one
+    whose messages cannot be decoded, or takes longer than `timeout`
+    seconds is skipped after calling on_error(mailbox, message),
+    which defaults to printing the message to stderr. partial is passed to
+    fetch_raw_messages. With queue_size, at most that many decoded emails
+    wait to be consumed, and fetching pauses while the queue is full, so
+    no more than `concurrency` mailboxes' messages are held besides them.
+    """
+    pool = ConnectionPool(connections_per_account, timeout)
+    slots = asyncio.Semaphore(concurrency)
+    queue = asyncio.Queue(queue_size)
+    done = object()
+
+    def report(mailbox, error):
+        message = (f"Error fetching '{mailbox.label}' for {mailbox.account.user}: "
+                   f"{error or type(error).__name__}")
+        if on_error is None:
+            print(message, file=sys.stderr)
+        else:
+            on_error(mailbox, message)
+
+    async def fetch(mailbox):
+        async with slots:
+            try:
+                mail = await pool.acquire(mailbox.account)
+            except Exception as e:
+                report(mailbox, e)
+                return
+            try:
+                messages = await asyncio.wait_for(
+                    asyncio.to_thread(fetch_label_messages, mail, mailbox.label, days, limit,
+                                      partial),
+                    timeout)
+            except Exception as e:
+                pool.release(mailbox.account, mail, reuse=False)
+                report(mailbox, e)
+                return
+            pool.release(mailbox.account, mail)
+            try:
+                # Decode everything first so a bad message skips the whole mailbox.
+                decoded = [DecodedEmail(mailbox.account.user, mailbox.label, msg_id.decode(),
+                                        created_at, *decode_email(raw_email))
+                           for msg_id, created_at, raw_email in messages]
+            except Exception as e:
+                report(mailbox, e)
+                return
+            # Keep the slot until the queue takes the messages, so no more
+            # than `concurrency` fetched mailboxes wait on a full queue.
+            for message in decoded:
+                await queue.put(message)
+
+    async def run():
+        cancelled = False
+        try:
+            await asyncio.gather(*(fetch(mailbox) for mailbox in mailboxes))
+        except asyncio.CancelledError:
+            # The consumer has stopped reading, so a full queue would never
+            # take done.
+            cancelled = True
+            raise
+        finally:
+            if not cancelled:
+                await queue.put(done)
+
+    runner = asyncio.create_task(run())
+    try:
+        while True:
+            item = await queue.get()
+            if item is done:
+                break
+            yield item
+    finally:
+        runner.cancel()
+        await asyncio.gather(runner, return_exceptions=True)
+        await pool.close()
+
+def fetch_mailboxes(mailboxes, **options):
+    """
+    Returns a list of DecodedEmail from all mailboxes, fetched concurrently.
+    options are passed to iter_mailbox_emails.
+    """
+    async def collect():
+        return [message async for message in iter_mailbox_emails(mailboxes, **options)]
+    return asyncio.run(collect())
+
+def read_accounts(path):
+    """
+    Returns the Mailboxes listed in a JSON accounts file: a list of objects
+    with "account" and "labels", and optionally "password_env" (default
+    EMAIL_PASSWORD), "server" and "port".
+    """
+    with open(path, "r", encoding="utf-8") as f:
+        entries = json.load(f)
+    mailboxes = []
+    for entry in entries:
+        password = os.getenv(entry.get("password_env", "EMAIL_PASSWORD"))
+        if not password:
+            raise ValueError(f"No password set for {entry['account']}.")
+        account = Account(entry["account"], password, entry.get("server", IMAP_SERVER),
+                          entry.get("port", IMAP_PORT), entry.get("ssl", True))
+        mailboxes.extend(Mailbox(account, label) for label in entry.get("labels", [LABEL_NAME]))
+    return mailboxes
+
+def env_mailboxes(labels):
+    """
+    Returns a Mailbox for each label of the account named by the
+    EMAIL_ACCOUNT and EMAIL_PASSWORD environment variables.
+    """
+    account = Account(os.getenv("EMAIL_ACCOUNT"), os.getenv("EMAIL_PASSWORD"))
+    if not account.user or not account.password:
+        raise ValueError("EMAIL_ACCOUNT and/or EMAIL_PASSWORD environment variables not set.")
+    return [Mailbox(account, label) for label in labels]
+
+async def print_mailbox_emails(mailboxes, **options):
+    """
+    Prints each email from all mailboxes as soon as its mailbox is fetched.
+    """
+    async for message in iter_mailbox_emails(mailboxes, **options):
+        _print_email(message.msg_id, message.created_at, message.from_, message.subject,
+                     message.text, f"{message.user}/{message.label}")
+
+def fetch_birdalert_emails(mail=None, label=LABEL_NAME, days=10, limit=10, partial=False):
+    """
+    Main function to fetch emails from a label using IMAP.
+    Prints From, Subject, and plain-text content.
+
+    INTERNALDATE for every candidate message comes back in one FETCH, and
+    the bodies of the latest `limit` messages in one more, so the number of
+    round trips does not grow with the size of the label. With partial,
+    only the headers shown and the plain-text part of each message are
+    downloaded (see fetch_raw_messages). `mail` is an
+    already logged-in imaplib connection; by default one is opened using
+    the EMAIL_ACCOUNT and EMAIL_PASSWORD environment variables.
+    """
+    try:
+        if mail is None:
+            EMAIL_ACCOUNT = os.getenv("EMAIL_ACCOUNT")
+            EMAIL_PASSWORD = os.getenv("EMAIL_PASSWORD")
+
+            if not EMAIL_ACCOUNT or not EMAIL_PASSWORD:
+                print("ERROR: EMAIL_ACCOUNT and/or EMAIL_PASSWORD environment variables not set.")
+                return
+
+            # Connect via SSL
+            mail = connect(EMAIL_ACCOUNT, EMAIL_PASSWORD)
 
         # Select the label/mailbox (read-only mode so we don't mark emails as read)
-        status, _ = mail.select(LABEL_NAME, readonly=True)
+        status, _ = mail.select(label, readonly=True)
         if status != "OK":
-            print(f"Could not select label '{LABEL_NAME}'. Status: {status}")
+            print(f"Could not select label '{label}'. Status: {status}")
             mail.logout()
             return
 
-        # Get today's date and calculate 10 days ago
-        date_since = (datetime.utcnow() - timedelta(days=10)).strftime("%d-%b-%Y")
+        # Get today's date and calculate the start of the window
+        date_since = (datetime.utcnow() - timedelta(days=days)).strftime("%d-%b-%Y")
 
-        # Search for messages from the last 10 days
-        status, msg_ids_data = mail.search(None, f'SINCE {date_since}')
+        # Search for messages in the window
+        with profiling.stage("search"):
+            status, msg_ids_data = mail.search(None, f'SINCE {date_since}')
         if status != "OK":
             print("Failed to search for messages in label.")
             mail.logout()
@@ -77,61 +739,29 @@ def fetch_birdalert_emails():
 
         # If there are no messages, exit gracefully
         if not msg_ids:
-            print(f"No recent messages found in '{LABEL_NAME}' from the last 10 days.")
+            print(f"No recent messages found in '{label}' from the last {days} days.")
             mail.logout()
             return
 
-        print(f"Total messages in '{LABEL_NAME}' (last 10 days): {len(msg_ids)}")
-
-        # Function to get INTERNALDATE for each message
-        def get_internal_date(msg_id):
-            status, response = mail.fetch(msg_id, "(INTERNALDATE)")
-            if status != "OK":
-                return None
-            response_str = response[0].decode()
-            date_start = response_str.find('"') + 1
-            date_end = response_str.rfind('"')
-            internal_date_str = response_str[date_start:date_end]
-            return (msg_id, datetime.strptime(internal_date_str, "%d-%b-%Y %H:%M:%S %z"))
+        print(f"Total messages in '{label}' (last {days} days): {len(msg_ids)}")
 
-        # Fetch dates for each message
-        emails_with_dates = [get_internal_date(msg_id) for msg_id in msg_ids]
-        emails_with_dates = [item for item in emails_with_dates if item is not None]
+        # Fetch dates for all messages in one command
+        emails_with_dates = fetch_internal_dates(mail, msg_ids)
 
         # Sort emails by date (newest first)
         emails_with_dates.sort(key=lambda x: x[1], reverse=True)
 
-        # Get up to the latest 10 messages
-        latest_emails = emails_with_dates[:10]
+        # Get up to the latest messages
+        latest_emails = emails_with_dates[:limit]
         print(f"looking at {len(latest_emails)} emails")
-        # Process only the latest 10 messages
+
+        # Fetch their bodies in one command
+        raw_emails = fetch_raw_messages(mail, [msg_id for msg_id, _ in latest_emails], partial)
+
         for msg_id, created_at in latest_emails:
-            # Fetch the email
-            status, msg_data = mail.fetch(msg_id, "(RFC822)")
-            if status == "OK":
-                raw_email = msg_data[0][1]
-                msg_obj = email.message_from_bytes(raw_email)
-
-                # Decode subject
-                subject_parts = decode_header(msg_obj.get("Subject"))
-                subject = ""
-                for part, enc in subject_parts:
-                    if isinstance(part, bytes):
-                        subject += part.decode(enc if enc else "utf-8")
-                    else:
-                        subject += part
-
-                from_ = msg_obj.get("From")
-
-                # Get plain text content
-                text_content = get_plain_text_body(msg_obj)
-
-                # Print info
-                print("\n------------------------------------------------------------")
-                print(f"Email {msg_id.decode()} - Created at: {created_at}")
-                print(f"From: {from_}")
-                print(f"Subject: {subject}")
-                print(f"Text Content:\n{text_content}")
+            raw_email = raw_emails.get(msg_id)
+            if raw_email is not None:
+                print_email(msg_id.decode(), created_at, raw_email)
 
         # Close the mailbox and logout
         mail.close()
@@ -142,6 +772,54 @@ def fetch_birdalert_emails():
     except Exception as e:
         print("An unexpected error occurred:", e)
 
-if __name__ == "__main__":
-    fetch_birdalert_emails()
+def main():
+    parser = argparse.ArgumentParser(description="Fetch BirdAlert emails over IMAP and print their text.")
+    parser.add_argument("--label", action="append",
+                        help=f"Label (mailbox) to fetch from; repeat to fetch several concurrently (default: {LABEL_NAME}).")
+    parser.add_argument("--days", type=int, default=10, help="How many days back to look.")
+    parser.add_argument("--limit", type=int, default=10, help="Print at most this many of the latest messages.")
+    parser.add_argument("--store", metavar="PATH",
+                        help="SQLite message store; only messages new since the last run are fetched.")
+    parser.add_argument("--accounts", metavar="PATH",
+                        help="JSON file of accounts and labels to fetch concurrently.")
+    parser.add_argument("--concurrency", type=int, default=DEFAULT_CONCURRENCY,
+                        help=f"Mailboxes fetched at the same time (default: {DEFAULT_CONCURRENCY}).")
+    parser.add_argument("--partial", action="store_true",
+                        help="Download only the From/Subject/Date headers and plain-text part of each email.")
+    parser.add_argument("--timeout", type=float, default=DEFAULT_TIMEOUT,
+                        help=f"Seconds before a mailbox fetch is abandoned (default: {DEFAULT_TIMEOUT}).")
+    profiling.add_profile_argument(parser)
+
+    args = parser.parse_args()
+    with profiling.profiled(args.profile):
+        _run(parser, args)
+
+def _run(parser, args):
+    """
+    Fetches and prints emails as asked by main's parsed arguments.
+    """
+    labels = args.label or [LABEL_NAME]
 
+    if args.accounts or len(labels) > 1:
+        if args.store:
+            parser.error("--store syncs a single label of a single account")
+        try:
+            if args.accounts:
+                mailboxes = read_accounts(args.accounts)
+            else:
+                mailboxes = env_mailboxes(labels)
+        except (OSError, ValueError, KeyError) as e:
+            print(f"ERROR: {e}")
+            return
+        asyncio.run(print_mailbox_emails(mailboxes, days=args.days, limit=args.limit,
+                                         concurrency=args.concurrency, timeout=args.timeout,
+                                         partial=args.partial))
+    elif args.store:
+        sync_birdalert_emails(args.store, label=labels[0], days=args.days, limit=args.limit,
+                              partial=args.partial)
+    else:
+        fetch_birdalert_emails(label=labels[0], days=args.days, limit=args.limit,
+                               partial=args.partial)
+
+if __name__ == "__main__":
+    main()
@@ -1,64 +1,282 @@
 import re
 import sys
+import email
 import argparse
+import itertools
+from array import array
+from collections import Counter, namedtuple
 from datetime import datetime, timedelta, date
 
-def parse_ebird_alert_text(alert_text):
+try:
+    from . import profiling
+    from .messagestore import MessageStore
+    from .need_for_life_list_fetch import get_plain_text_body
+    from .sightingstore import SightingStore
+except ImportError:  # run directly as a script
+    import profiling
+    from messagestore import MessageStore
+    from need_for_life_list_fetch import get_plain_text_body
+    from sightingstore import SightingStore
+
+# "Snow Goose (Anser caerulescens) (40)" starts a species record.
+SPECIES_PATTERN = re.compile(r'^([A-Z].*?)\s*\(([^)]+)\)\s*\((\d+)\)')
+REPORTED_DATE_PATTERN = re.compile(r"- Reported ((\w{3}) (\d{1,2}), (\d{4}) (\d{2}):(\d{2}))")
+OBSERVER_PATTERN = re.compile(r"\s+by\s+(.+?)\s*$")
+# "- Fossil Creek Reservoir, Larimer, Colorado": the county is the part before the state.
+LOCATION_PATTERN = re.compile(r"^-?\s*(?:(.*?),\s*)?([^,]+?)(?:\s+County)?,\s*Colorado\b")
+CHECKLIST_PREFIX = "- Checklist:"
+
+# eBird always writes English month abbreviations, whatever the locale.
+MONTHS = {name: number for number, name in enumerate(
+    ["Jan", "Feb", "Mar", "Apr", "May", "Jun", "Jul", "Aug", "Sep", "Oct", "Nov", "Dec"], start=1)}
+
+DEFAULT_COUNTIES = ["Larimer", "Boulder", "Arapahoe", "Weld", "Denver", "Jefferson", "Douglas", "Adams"]
+
+class Sighting(namedtuple('Sighting', ['species', 'scientific_name', 'count', 'reported',
+                                       'observer', 'location', 'county', 'checklist', 'lines'])):
     """
-    Parses the eBird alert email text into structured records.
+    One species record of an alert, with the fields the filters need
+    extracted once at parse time. reported is a datetime and location,
+    county, observer and checklist are strings; any of them may be None if
+    the alert did not say. lines holds the record's raw lines for display.
+
+    Records can still be indexed like the dicts earlier versions returned,
+    e.g. record['species'].
+    """
+    __slots__ = ()
+
+    def __getitem__(self, key):
+        if isinstance(key, str):
+            return getattr(self, key)
+        return tuple.__getitem__(self, key)
+
+def _reported_date(line):
+    """
+    Returns (datetime, observer) from a "- Reported ... by ..." line; either
+    may be None.
+    """
+    match = REPORTED_DATE_PATTERN.search(line)
+    if not match:
+        return None, None
+    _, month, day, year, hour, minute = match.groups()
+    try:
+        reported = datetime(int(year), MONTHS[month.title()], int(day), int(hour), int(minute))
+    except (KeyError, ValueError):
+        reported = None
+    observer = OBSERVER_PATTERN.match(line, match.end())
+    return reported, observer.group(1) if observer else None
+
+def make_sighting(species, scientific_name, count, lines):
+    """
+    Returns a Sighting, extracting the reported date and observer from the
+    first line, the location and county from the second, and the checklist
+    URL from a "- Checklist:" line.
+    """
+    reported, observer = _reported_date(lines[0]) if lines else (None, None)
+    location = county = None
+    if len(lines) >= 2:
+        match = LOCATION_PATTERN.match(lines[1])
+        if match:
+            location, county = match.groups()
+            county = sys.intern(county)
+    checklist = next((line[len(CHECKLIST_PREFIX):].strip() for line in lines
+                      if line.startswith(CHECKLIST_PREFIX)), None)
+    return Sighting(sys.intern(species), sys.intern(scientific_name), count, reported,
+                    observer, location, county, checklist, tuple(lines))
+
+def iter_sightings(lines):
+    """
+    Yields a Sighting for each species record in an iterable of alert text
+    lines, such as an open file or sys.stdin, as soon as the record's block
+    ends. Only the current record is held in memory.
     """
-    species_pattern = re.compile(
-        r'^([A-Z].*?)\s*\(([^)]+)\)\s*\((\d+)\)'
-    )
-    all_lines = alert_text.splitlines()
-    records = []
     current_record = None
 
-    for line in all_lines:
+    for line in lines:
         line = line.strip()
-        match = species_pattern.match(line)
+        match = SPECIES_PATTERN.match(line)
         if match:
             if current_record:
-                records.append(current_record)
+                yield make_sighting(*current_record)
             species_name = match.group(1).strip()
             scientific_name = match.group(2).strip()
-            count = match.group(3).strip()
-            current_record = {
-                'species': species_name,
-                'scientific_name': scientific_name,
-                'count': int(count),  # Convert count to integer
-                'lines': []
-            }
+            count = int(match.group(3))
+            current_record = (species_name, scientific_name, count, [])
         else:
             if current_record:
                 if line:
-                    current_record['lines'].append(line)
+                    current_record[3].append(line)
     if current_record:
-        records.append(current_record)
+        yield make_sighting(*current_record)
+
+def parse_ebird_alert_text(alert_text):
+    """
+    Parses the eBird alert email text into structured records.
+    """
+    return list(iter_sightings(alert_text.splitlines()))
 
-    return records
+def county_predicate(counties_of_interest):
+    """
+    Returns a predicate matching records in one of the counties, as named
+    in their location line ("<location>, <county>, Colorado"). The county
+    was extracted at parse time, so this is a set lookup.
 
-def filter_records_by_county(records, counties_of_interest):
+    The whole county field must equal a name: "East Adams, Colorado" does
+    not match "Adams", and a county named only in the location does not
+    count. A trailing " County" is ignored and the space after the comma is
+    optional, so "Larimer County, Colorado" and "Larimer,Colorado" match
+    "Larimer". Records without a Colorado location line never match.
     """
-    Filters records based on the county appearing in the second line.
+    counties = frozenset(counties_of_interest)
+    return lambda record: record.county in counties
+
+def min_count_predicate(min_count=10):
+    """
+    Returns a predicate matching records with sightings >= min_count.
+    """
+    return lambda record: record.count >= min_count
+
+def reported_since_predicate(days_ago=50, now=None):
     """
+    Returns a predicate matching records reported within days_ago days of
+    now (default: the current time). The cutoff is computed once.
+    """
+    cutoff_date = (now or datetime.now()) - timedelta(days=days_ago)
+
+    def predicate(record):
+        return record.reported is not None and record.reported >= cutoff_date
+    return predicate
 
-    filtered = []
+def apply_filters(records, predicates, counts=None):
+    """
+    Yields the records passing every predicate, in one pass. Predicates are
+    tried in order and stop at the first that fails, so put the cheapest
+    and most selective first. If counts is a list of len(predicates), each
+    counts[i] is incremented for every record passing predicates[:i + 1].
+    """
     for record in records:
-        if len(record['lines']) < 2:
-            continue  # Ensure we have at least 2 lines
-        location_line = record['lines'][1]  # Second line is often the location
-        for county in counties_of_interest:
-            if f"{county}, Colorado" in location_line:
-                filtered.append(record)
+        for i, predicate in enumerate(predicates):
+            if not predicate(record):
                 break
-    return filtered
+            if counts is not None:
+                counts[i] += 1
+        else:
+            yield record
+
+# Timestamps in a SightingBatch count seconds from this naive datetime.
+BATCH_EPOCH = datetime(1970, 1, 1)
+
+class SightingBatch:
+    """
+    Column-oriented form of many Sightings for bulk filtering and
+    aggregation. Counts and reported times are packed in arrays, and
+    counties dictionary-encoded as small integers, so each filter is one
+    pass over a compact column and produces a mask (a bytearray of 0/1 per
+    sighting) that can be combined with others.
+    """
+    __slots__ = ('sightings', 'species', 'counts', 'reported', 'county_ids', 'county_names')
+
+    def __init__(self, sightings):
+        self.sightings = list(sightings)
+        self.species = [sighting.species for sighting in self.sightings]
+        self.counts = array('q', (sighting.count for sighting in self.sightings))
+        # NaN never compares true, so undated sightings fail every date filter.
+        self.reported = array('d', (
+            (sighting.reported - BATCH_EPOCH).total_seconds() if sighting.reported else float('nan')
+            for sighting in self.sightings))
+        self.county_names = []
+        codes = {}
+        ids = []
+        for sighting in self.sightings:
+            if sighting.county not in codes:
+                codes[sighting.county] = len(self.county_names)
+                self.county_names.append(sighting.county)
+            ids.append(codes[sighting.county])
+        self.county_ids = array('l', ids)
+
+    def __len__(self):
+        return len(self.sightings)
+
+    def county_mask(self, counties_of_interest):
+        counties = set(counties_of_interest)
+        wanted = {i for i, name in enumerate(self.county_names) if name in counties}
+        return bytearray(county_id in wanted for county_id in self.county_ids)
+
+    def min_count_mask(self, min_count):
+        return bytearray(count >= min_count for count in self.counts)
+
+    def since_mask(self, cutoff_date):
+        cutoff = (cutoff_date - BATCH_EPOCH).total_seconds()
+        return bytearray(reported >= cutoff for reported in self.reported)
+
+    @staticmethod
+    def combine(*masks):
+        """
+        Returns the mask selecting sightings selected by every mask.
+        """
+        # AND whole masks at once as big integers rather than byte by byte.
+        result = int.from_bytes(masks[0], 'big')
+        for mask in masks[1:]:
+            result &= int.from_bytes(mask, 'big')
+        return bytearray(result.to_bytes(len(masks[0]), 'big'))
+
+    def select(self, mask):
+        """
+        Returns the Sightings a mask selects, in order.
+        """
+        return list(itertools.compress(self.sightings, mask))
+
+    def total_by_species(self, mask=None):
+        """
+        Returns {species: total count} over the sightings a mask selects (default: all).
+        """
+        totals = Counter()
+        for species, count, keep in zip(self.species, self.counts,
+                                        mask if mask is not None else itertools.repeat(1)):
+            if keep:
+                totals[species] += count
+        return dict(totals)
+
+    def sightings_by_county(self, mask=None):
+        """
+        Returns {county: number of sightings} over the sightings a mask selects (default: all).
+        """
+        selected = self.county_ids if mask is None else itertools.compress(self.county_ids, mask)
+        return {self.county_names[county_id]: number
+                for county_id, number in Counter(selected).items()}
+
+    def filter(self, counties_of_interest=None, min_count=None, days_ago=None, now=None):
+        """
+        Returns the mask for the same filters main applies; None skips one.
+        """
+        masks = [bytearray(b'\x01') * len(self)]
+        if counties_of_interest is not None:
+            masks.append(self.county_mask(counties_of_interest))
+        if min_count is not None:
+            masks.append(self.min_count_mask(min_count))
+        if days_ago is not None:
+            masks.append(self.since_mask((now or datetime.now()) - timedelta(days=days_ago)))
+        return self.combine(*masks)
+
+def counting(records, counter):
+    """
+    Yields records unchanged, adding one to counter[0] for each.
+    """
+    for record in records:
+        counter[0] += 1
+        yield record
+
+def filter_records_by_county(records, counties_of_interest):
+    """
+    Filters records based on the county appearing in the second line.
+    """
+    return list(filter(county_predicate(counties_of_interest), records))
 
 def filter_records_by_species_count(records, min_count=10):
     """
     Filters records to only include species with sightings >= min_count.
     """
-    return [record for record in records if record['count'] >= min_count]
+    return list(filter(min_count_predicate(min_count), records))
 
 def parse_reported_date(date_string):
     """
@@ -71,16 +289,12 @@ def parse_reported_date(date_string):
     Returns:
         A datetime object representing the parsed date and time, or None if parsing fails.
     """
-    match = re.search(r"- Reported (\w{3} \d{1,2}, \d{4} \d{2}:\d{2})", date_string)
+    match = REPORTED_DATE_PATTERN.search(date_string)
     if match:
-        date_time_str = match.group(1)
-        try:
-            # Parse the date and time string
-            date_time_obj = datetime.strptime(date_time_str, "%b %d, %Y %H:%M")
-            return date_time_obj
-        except ValueError:
-            print(f"Error: Could not parse date/time string: {date_time_str}")
-            return None
+        reported, _ = _reported_date(date_string)
+        if reported is None:
+            print(f"Error: Could not parse date/time string: {match.group(1)}")
+        return reported
     else:
         print(f"Error: Could not find date/time pattern in string: {date_string}")
         return None
@@ -89,58 +303,129 @@ def filter_records_by_after_days_ago(records, days_ago=50):
     """
     Filters records based on the reported date.
     """
-    filtered_records = []
-    for record in records:
-        if not record['lines']:
-            continue # skip if there are no lines
-        first_line = record['lines'][0]
-        reported_date = parse_reported_date(first_line)
+    return list(filter(reported_since_predicate(days_ago), records))
 
-        if reported_date:
-             # Calculate the date that is 'days_ago' days ago from today
-            cutoff_date = datetime.now() - timedelta(days=days_ago)
+def iter_message_lines(raw_emails):
+    """
+    Yields the plain-text body lines of each raw email in turn, e.g. from
+    MessageStore.iter_messages or the fetcher, decoding one at a time.
+    """
+    for raw in raw_emails:
+        yield from get_plain_text_body(email.message_from_bytes(raw)).splitlines()
 
-            # check the date is more recent than "days_ago"
-            if reported_date >= cutoff_date:
-                filtered_records.append(record)
-    return filtered_records
+def iter_store_lines(store_path, mailbox=None):
+    """
+    Yields the plain-text body lines of every message in a MessageStore,
+    newest first.
+    """
+    with MessageStore(store_path) as store:
+        yield from iter_message_lines(raw for _, _, _, raw in store.iter_messages(mailbox))
 
-def main():
-    import sys
-    import argparse
-    # detect if there is any data in stdin
-    raw_text = sys.stdin.read()
+def read_store_text(store_path, mailbox=None):
+    """
+    Returns the plain-text bodies of every message in a MessageStore, newest
+    first, joined into one alert text.
+    """
+    return "\n".join(iter_store_lines(store_path, mailbox))
 
+def ingest_sightings(db_path, lines):
+    """
+    Parses alert text lines into the SightingStore at db_path. Returns
+    (parsed, added): sightings seen and sightings not already stored.
+    """
+    parsed = [0]
+    with SightingStore(db_path) as store:
+        added = store.add(counting(iter_sightings(lines), parsed))
+    return parsed[0], added
+
+def query_sightings(db_path, counties_of_interest=None, min_count=None, days_ago=None, now=None):
+    """
+    Returns the Sightings in the SightingStore at db_path matching the same
+    filters main applies, sorted by species; None skips a filter.
+    """
+    since = None if days_ago is None else (now or datetime.now()) - timedelta(days=days_ago)
+    with SightingStore(db_path) as store:
+        return [Sighting._make(fields)
+                for fields in store.query(counties_of_interest, min_count, since)]
+
+def print_sighting(rec):
+    print(f"{rec.species} ({rec.scientific_name}) x{rec.count}")
+    for line in rec.lines:
+        print("  " + line)
+    print("-" * 60)
+
+def main():
     parser = argparse.ArgumentParser(description="Parse eBird alert emails and filter by count threshold.")
     parser.add_argument("--threshold", type=int, default=5, help="Minimum count of species to include in the output.")
-    parser.add_argument("--counties", nargs='*', default=["Larimer", "Boulder", "Arapahoe", "Weld", "Denver", "Jefferson", "Douglas", "Adams"], help="List of county names to filter by.")
+    parser.add_argument("--counties", nargs='*', default=DEFAULT_COUNTIES, help="List of county names to filter by.")
     parser.add_argument("--days-ago", type=int, default=50, help="days back")
-                        
+    parser.add_argument("--store", metavar="PATH", help="Read alerts from this message store instead of stdin.")
+    parser.add_argument("--stream", action="store_true",
+                        help="Print matching records as they are read, unsorted, with the totals at the end.")
+    parser.add_argument("--db", metavar="PATH",
+                        help="Sightings database: answer the query from it instead of parsing input.")
+    parser.add_argument("--ingest", action="store_true",
+                        help="With --db, add the parsed input to the database, skipping duplicates.")
+    profiling.add_profile_argument(parser)
+
     args = parser.parse_args()
+    with profiling.profiled(args.profile):
+        _run(parser, args)
 
-    # Parse into records
-    records = parse_ebird_alert_text(raw_text)
-    print(f"Total records parsed: {len(records)}")
+def _run(parser, args):
+    """
+    Parses and filters alerts as asked by main's parsed arguments.
+    """
+    # Read lines lazily, so input of any size streams through in constant memory
+    lines = iter_store_lines(args.store) if args.store else sys.stdin
+    # Stage times nest: each includes reading the lines it consumed
+    lines = profiling.timed("input_lines", lines)
 
-    # Filter for certain counties
-    filtered_by_county = filter_records_by_county(records, args.counties)
-    print(f"Filtered by counties: {len(filtered_by_county)} records.")
+    if args.ingest:
+        if not args.db:
+            parser.error("--ingest needs --db")
+        with profiling.stage("ingest"):
+            parsed, added = ingest_sightings(args.db, lines)
+        print(f"Total records parsed: {parsed}")
+        print(f"New sightings stored: {added} ({parsed - added} duplicates).")
+        return
 
-    filtered_by_count = filter_records_by_species_count(filtered_by_county, min_count=args.threshold)
-    print(f"Filtered by species count (>=5 sightings): {len(filtered_by_count)} records.\n")
+    if args.db:
+        with profiling.stage("query"):
+            matches = query_sightings(args.db, args.counties, args.threshold, args.days_ago)
+        print(f"Matching sightings in {args.db}: {len(matches)} records.\n")
+        for rec in matches:
+            print_sighting(rec)
+        return
 
-    filtered_by_date = filter_records_by_after_days_ago(filtered_by_count, days_ago=args.days_ago)
-    print(f"Filtered by date: {len(filtered_by_date)} records.\n")
+    total = [0]
+    # Parse and filter by county, count and date in one pass
+    predicates = [
+        county_predicate(args.counties),
+        min_count_predicate(args.threshold),
+        reported_since_predicate(args.days_ago),
+    ]
+    counts = [0] * len(predicates)
+    sightings = profiling.timed("sightings", counting(iter_sightings(lines), total))
+    matches = profiling.timed("matches", apply_filters(sightings, predicates, counts))
+
+    if args.stream:
+        for rec in matches:
+            print_sighting(rec)
+        matches = []
+    else:
+        # Sorting needs every match, but only the matches are held
+        with profiling.stage("sort"):
+            matches = sorted(matches, key=lambda rec: rec.species)
 
-    # Sort records by species name
-    sorted_records = sorted(filtered_by_date, key=lambda rec: rec['species'])
+    print(f"Total records parsed: {total[0]}")
+    print(f"Filtered by counties: {counts[0]} records.")
+    print(f"Filtered by species count (>={args.threshold} sightings): {counts[1]} records.\n")
+    print(f"Filtered by date: {counts[2]} records.\n")
 
     # Print the filtered records
-    for rec in sorted_records:
-        print(f"{rec['species']} ({rec['scientific_name']}) x{rec['count']}")
-        for line in rec['lines']:
-            print("  " + line)
-        print("-" * 60)
+    for rec in matches:
+        print_sighting(rec)
 
 if __name__ == "__main__":
     main()
\ No newline at end of file
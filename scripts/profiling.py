@@ -0,0 +1,204 @@
+import sys
+import json
+import time
+import cProfile
+import threading
+from contextlib import contextmanager, nullcontext
+
+try:
+    import resource
+except ImportError:  # not available on Windows
+    resource = None
+
+# Bumped whenever the layout of the JSON report changes.
+REPORT_VERSION = 1
+
+# --profile paths with these suffixes get a cProfile dump instead of a report.
+CPROFILE_SUFFIXES = ('.prof', '.pstats')
+
+# The profiler in use, or None. Instrumented code calls the module-level
+# stage, count and timed functions, which do almost nothing while it is None.
+_profiler = None
+
+_NULL_STAGE = nullcontext()
+
+
+def peak_rss_bytes():
+    """Return the peak resident set size of this process, or None if unknown."""
+    if resource is None:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # ru_maxrss is in bytes on macOS and kilobytes elsewhere.
+    return peak if sys.platform == 'darwin' else peak * 1024
+
+
+class _Stage:
+    __slots__ = ('profiler', 'name', 'start')
+
+    def __init__(self, profiler, name):
+        self.profiler = profiler
+        self.name = name
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.profiler.record(self.name, time.perf_counter() - self.start)
+
+
+class Profiler:
+    """Per-stage timers, named counters and peak memory for one run.
+
+    A stage accumulates the calls and wall-clock seconds spent in it, and
+    the process's peak RSS when it last finished. Stage times are
+    inclusive, so a stage nested in another is counted in both, and
+    stages entered from several threads add up their threads' time.
+    """
+
+    def __init__(self):
+        self.start = time.perf_counter()
+        self.stages = {}
+        self.counters = {}
+        self._lock = threading.Lock()
+
+    def stage(self, name):
+        """Return a context manager timing its block as the stage name."""
+        return _Stage(self, name)
+
+    def record(self, name, seconds, calls=1):
+        """Add seconds and calls to the stage name."""
+        peak = peak_rss_bytes()
+        with self._lock:
+            stage = self.stages.get(name)
+            if stage is None:
+                stage = self.stages[name] = {'calls': 0, 'seconds': 0.0, 'peak_rss_bytes': None}
+            stage['calls'] += calls
+            stage['seconds'] += seconds
+            stage['peak_rss_bytes'] = peak
+
+    def count(self, name, n=1):
+        """Add n to the counter name."""
+        with self._lock:
+            self.counters[name] = self.counters.get(name, 0) + n
+
+    def timed(self, name, iterable):
+        """Yield from iterable, timing each step as the stage name.
+
+        Every item is counted under the counter of the same name.
+        """
+        iterator = iter(iterable)
+        items = 0
+        seconds = 0.0
+        try:
+            while True:
+                start = time.perf_counter()
+                try:
+                    item = next(iterator)
+                except StopIteration:
+                    seconds += time.perf_counter() - start
+                    break
+                seconds += time.perf_counter() - start
+                items += 1
+                yield item
+        finally:
+            self.record(name, seconds)
+            self.count(name, items)
+
+    def report(self):
+        """Return the stages, counters and peak RSS so far as a JSON-ready dict."""
+        with self._lock:
+            stages = {name: dict(stage, seconds=round(stage['seconds'], 6))
+                      for name, stage in self.stages.items()}
+            counters = dict(self.counters)
+        return {
+            'version': REPORT_VERSION,
+            'argv': sys.argv,
+            'seconds': round(time.perf_counter() - self.start, 6),
+            'peak_rss_bytes': peak_rss_bytes(),
+            'stages': stages,
+            'counters': counters,
+        }
+
+
+def active():
+    """Return the Profiler in use, or None when profiling is off."""
+    return _profiler
+
+
+def stage(name):
+    """Return a context manager timing its block as a stage when profiling."""
+    if _profiler is None:
+        return _NULL_STAGE
+    return _profiler.stage(name)
+
+
+def record(name, seconds, calls=1):
+    """Add an externally measured time to a stage when profiling."""
+    if _profiler is not None:
+        _profiler.record(name, seconds, calls)
+
+
+def count(name, n=1):
+    """Add n to a counter when profiling."""
+    if _profiler is not None:
+        _profiler.count(name, n)
+
+
+def timed(name, iterable):
+    """Return iterable, timed and counted as a stage when profiling.
+
+    When profiling is off, iterable itself is returned, so wrapping a hot
+    loop's source costs nothing per item.
+    """
+    if _profiler is None:
+        return iterable
+    return _profiler.timed(name, iterable)
+
+
+def write_report(report, path):
+    """Write a report dict as JSON to path, or to stderr when path is '-'."""
+    if path == '-':
+        json.dump(report, sys.stderr, indent=2)
+        print(file=sys.stderr)
+        return
+    with open(path, 'w', encoding='utf-8') as f:
+        json.dump(report, f, indent=2)
+
+
+@contextmanager
+def profiled(path):
+    """Profile the block and write the result to path; do nothing if path is None.
+
+    Paths ending in one of CPROFILE_SUFFIXES get a cProfile dump of the
+    calling thread, readable with pstats or snakeviz. Any other path gets a
+    JSON report of stages, counters and peak RSS (see Profiler.report),
+    and '-' writes that report to stderr. The output is written even if the
+    block exits early, e.g. through sys.exit.
+    """
+    global _profiler
+    if path is None:
+        yield None
+        return
+    if path.endswith(CPROFILE_SUFFIXES):
+        profile = cProfile.Profile()
+        profile.enable()
+        try:
+            yield profile
+        finally:
+            profile.disable()
+            profile.dump_stats(path)
+        return
+    previous, _profiler = _profiler, Profiler()
+    try:
+        yield _profiler
+    finally:
+        profiler, _profiler = _profiler, previous
+        write_report(profiler.report(), path)
+
+
+def add_profile_argument(parser):
+    """Add the shared --profile option to an argparse parser."""
+    parser.add_argument('--profile', metavar='PATH',
+                        help='Write a JSON timing report here (- for stderr), '
+                             'or a cProfile dump if PATH ends in .prof')
@@ -0,0 +1,125 @@
+import os
+import re
+import fnmatch
+from collections import namedtuple
+
+# Symlink policies for scan_tree.
+SYMLINKS_FOLLOW = 'follow'  # follow links to files and descend into linked directories
+SYMLINKS_FILES = 'files'    # follow links to files only (matches os.walk's default)
+SYMLINKS_SKIP = 'skip'      # ignore symlinks entirely
+SYMLINK_POLICIES = (SYMLINKS_FOLLOW, SYMLINKS_FILES, SYMLINKS_SKIP)
+
+ScanEntry = namedtuple('ScanEntry', ['rel_path', 'path', 'stat'])
+
+
+class ScannerError(Exception):
+    """Exception for invalid scanner arguments."""
+
+
+def _compile_patterns(patterns):
+    """Compile a list of glob patterns into a single regex, or None if empty."""
+    if not patterns:
+        return None
+    return re.compile('|'.join(fnmatch.translate(p) for p in patterns))
+
+
+def is_excluded(exclude_re, rel_path):
+    """Return whether rel_path or any directory above it matches exclude_re.
+
+    This is the rule scan_tree applies by not descending into excluded
+    directories, for paths that come from a flat listing such as a ZIP.
+    """
+    if exclude_re.match(rel_path):
+        return True
+    end = rel_path.find('/')
+    while end != -1:
+        if exclude_re.match(rel_path[:end]):
+            return True
+        end = rel_path.find('/', end + 1)
+    return False
+
+
+def compile_filter(include=None, exclude=None):
+    """Build a predicate selecting '/'-separated relative paths by glob.
+
+    A path is selected if it matches any include pattern (or there are none)
+    and neither it nor any directory above it matches an exclude pattern,
+    as in scan_tree. Note that '*' also matches '/', so '*.txt' selects
+    text files at any depth. Returns None when there is nothing to filter,
+    so callers can skip the check entirely.
+    """
+    include_re = _compile_patterns(include)
+    exclude_re = _compile_patterns(exclude)
+    if include_re is None and exclude_re is None:
+        return None
+
+    def selected(rel_path):
+        if include_re is not None and not include_re.match(rel_path):
+            return False
+        return exclude_re is None or not is_excluded(exclude_re, rel_path)
+    return selected
+
+
+def scan_tree(root, include=None, exclude=None, symlinks=SYMLINKS_FILES, onerror=None):
+    """Yield a ScanEntry for every regular file under root.
+
+    The tree is walked with os.scandir and an explicit directory stack, and
+    results are generated lazily, so memory stays flat however large the
+    tree is. Each file is stat'ed at most once, through its DirEntry, and
+    rel_path is built by concatenation with '/' separators. Directories
+    matching an exclude pattern are not descended into. Errors reading a
+    directory or stat'ing a file are passed to onerror if given and are
+    otherwise skipped, as with os.walk.
+    """
+    if symlinks not in SYMLINK_POLICIES:
+        raise ScannerError(f"Unknown symlink policy '{symlinks}'")
+    include_re = _compile_patterns(include)
+    exclude_re = _compile_patterns(exclude)
+    follow_dirs = symlinks == SYMLINKS_FOLLOW
+    follow_files = symlinks != SYMLINKS_SKIP
+
+    visited = set()
+    if follow_dirs:
+        st = os.stat(root)
+        visited.add((st.st_dev, st.st_ino))
+
+    stack = [(os.fspath(root), '')]
+    while stack:
+        dir_path, prefix = stack.pop()
+        try:
+            it = os.scandir(dir_path)
+        except OSError as e:
+            if onerror is not None:
+                onerror(e)
+            continue
+        with it:
+            for entry in it:
+                rel_path = prefix + entry.name
+                try:
+                    is_link = entry.is_symlink()
+                    if is_link and symlinks == SYMLINKS_SKIP:
+                        continue
+                    if entry.is_dir(follow_symlinks=follow_dirs):
+                        if exclude_re is not None and exclude_re.match(rel_path):
+                            continue
+                        if follow_dirs:
+                            # Remember every directory so linked cycles end.
+                            st = entry.stat()
+                            dir_key = (st.st_dev, st.st_ino)
+                            if dir_key in visited:
+                                continue
+                            visited.add(dir_key)
+                        stack.append((entry.path, rel_path + '/'))
+                        continue
+                    if not entry.is_file(follow_symlinks=follow_files):
+                        continue
+                    if include_re is not None and not include_re.match(rel_path):
+                        continue
+                    if exclude_re is not None and exclude_re.match(rel_path):
+                        continue
+                    st = entry.stat(follow_symlinks=follow_files)
+                except OSError as e:
+                    if onerror is not None:
+                        onerror(e)
+                    continue
+                yield ScanEntry(rel_path, entry.path, st)
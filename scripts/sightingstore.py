@@ -0,0 +1,128 @@
+import sqlite3
+from datetime import datetime
+
+# Reported times are stored as sortable text; '' when unknown.
+REPORTED_FORMAT = "%Y-%m-%d %H:%M"
+
+# Rows inserted per executemany call while ingesting a stream of sightings.
+INSERT_BATCH_SIZE = 1000
+
+# The identity columns are NOT NULL with '' for unknown values, because
+# SQLite treats NULLs as distinct and would let duplicates through.
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS sightings (
+    id INTEGER PRIMARY KEY,
+    species TEXT NOT NULL,
+    scientific_name TEXT NOT NULL,
+    count INTEGER NOT NULL,
+    reported TEXT NOT NULL,
+    observer TEXT,
+    location TEXT NOT NULL,
+    county TEXT,
+    checklist TEXT NOT NULL,
+    lines TEXT NOT NULL
+);
+CREATE UNIQUE INDEX IF NOT EXISTS sightings_identity
+    ON sightings (species, location, reported, checklist);
+CREATE INDEX IF NOT EXISTS sightings_county ON sightings (county);
+CREATE INDEX IF NOT EXISTS sightings_species ON sightings (species);
+CREATE INDEX IF NOT EXISTS sightings_reported ON sightings (reported);
+CREATE INDEX IF NOT EXISTS sightings_count ON sightings (count);
+"""
+
+COLUMNS = ("species, scientific_name, count, reported, observer, location, county, "
+           "checklist, lines")
+
+
+class SightingStore:
+    """SQLite database of parsed eBird sightings.
+
+    The same sighting repeats across many daily alert emails, so sightings
+    are deduplicated by species, location, reported time and checklist.
+    Indexes on county, species, reported time and count keep queries fast
+    over years of history.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self._conn = sqlite3.connect(path)
+        self._conn.executescript(SCHEMA)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.close()
+
+    def close(self):
+        self._conn.commit()
+        self._conn.close()
+
+    def commit(self):
+        self._conn.commit()
+
+    def add(self, sightings):
+        """Store sightings, skipping ones already stored; return how many were new.
+
+        sightings is any iterable of Sighting records, consumed in batches.
+        """
+        added = 0
+        batch = []
+        for sighting in sightings:
+            batch.append(_row(sighting))
+            if len(batch) >= INSERT_BATCH_SIZE:
+                added += self._insert(batch)
+                batch = []
+        if batch:
+            added += self._insert(batch)
+        return added
+
+    def _insert(self, rows):
+        before = self._conn.total_changes
+        with self._conn:
+            self._conn.executemany(
+                f"INSERT OR IGNORE INTO sightings ({COLUMNS}) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                rows)
+        return self._conn.total_changes - before
+
+    def __len__(self):
+        return self._conn.execute("SELECT COUNT(*) FROM sightings").fetchone()[0]
+
+    def query(self, counties=None, min_count=None, since=None):
+        """Yield sightings matching every given filter, sorted by species.
+
+        counties is a list of county names, min_count the smallest count
+        and since a datetime the sighting must be reported at or after;
+        None skips a filter. Sightings are yielded as tuples in Sighting
+        field order.
+        """
+        conditions = []
+        params = []
+        if counties is not None:
+            conditions.append(f"county IN ({', '.join('?' * len(counties))})")
+            params.extend(counties)
+        if min_count is not None:
+            conditions.append("count >= ?")
+            params.append(min_count)
+        if since is not None:
+            conditions.append("reported >= ?")
+            params.append(since.strftime(REPORTED_FORMAT))
+        where = f" WHERE {' AND '.join(conditions)}" if conditions else ""
+        for row in self._conn.execute(
+                f"SELECT {COLUMNS} FROM sightings{where} ORDER BY species, id", params):
+            yield _sighting_fields(row)
+
+
+def _row(sighting):
+    reported = sighting.reported.strftime(REPORTED_FORMAT) if sighting.reported else ""
+    return (sighting.species, sighting.scientific_name, sighting.count, reported,
+            sighting.observer, sighting.location or "", sighting.county,
+            sighting.checklist or "", "\n".join(sighting.lines))
+
+
+def _sighting_fields(row):
+    species, scientific_name, count, reported, observer, location, county, checklist, lines = row
+    return (species, scientific_name, count,
+            datetime.strptime(reported, REPORTED_FORMAT) if reported else None,
+            observer, location or None, county, checklist or None,
+            tuple(lines.split("\n")) if lines else ())
@@ -0,0 +1,179 @@
+import os
+import csv
+import sqlite3
+import sys
+import json
+import time
+import zipfile
+import argparse
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+try:
+    from . import profiling
+    from .hashcache import HashCache
+    from .zipcompare import (EXIT_DIFFERENCES, EXIT_ERROR, EXIT_MATCH, ZipCompareError,
+                             compare_zip_and_directory)
+except ImportError:  # run directly as a script
+    import profiling
+    from hashcache import HashCache
+    from zipcompare import (EXIT_DIFFERENCES, EXIT_ERROR, EXIT_MATCH, ZipCompareError,
+                            compare_zip_and_directory)
+
+
+class ManifestError(ZipCompareError):
+    """Exception for an unreadable or malformed manifest."""
+
+
+def read_manifest(manifest_path):
+    """Read (zip_path, dir_path) pairs from a CSV or JSONL manifest.
+
+    CSV manifests need a header row with 'zip' and 'dir' columns; JSONL
+    manifests (.jsonl/.ndjson) hold one {"zip": ..., "dir": ...} object per
+    line. Relative paths are resolved against the manifest's directory. An
+    entry missing either path is kept with None in its place, so that
+    compare_pair reports it as an error without stopping the batch.
+    """
+    if not os.path.isfile(manifest_path):
+        raise ManifestError(f"Manifest '{manifest_path}' does not exist.")
+
+    base_dir = os.path.dirname(os.path.abspath(manifest_path))
+    with open(manifest_path, 'r', encoding='utf-8', newline='') as f:
+        if manifest_path.endswith(('.jsonl', '.ndjson')):
+            rows = [json.loads(line) for line in f if line.strip()]
+        else:
+            reader = csv.DictReader(f)
+            if not {'zip', 'dir'} <= set(reader.fieldnames or ()):
+                raise ManifestError(f"Manifest '{manifest_path}' needs 'zip' and 'dir' columns.")
+            rows = list(reader)
+
+    pairs = []
+    for row in rows:
+        paths = (row.get('zip'), row.get('dir')) if isinstance(row, dict) else (None, None)
+        pairs.append(tuple(os.path.join(base_dir, path) if path and isinstance(path, str)
+                           else None for path in paths))
+    return pairs
+
+
+def compare_pair(zip_path, dir_path, cache_path=None, **options):
+    """Compare one pair and return its report entry.
+
+    Runs in a worker process, so it opens its own connection to the shared
+    cache file. options are passed through to compare_zip_and_directory.
+    """
+    entry = {'zip': zip_path, 'dir': dir_path}
+    start = time.perf_counter()
+    try:
+        if zip_path is None or dir_path is None:
+            raise ManifestError("Manifest entry needs 'zip' and 'dir' paths.")
+        cache = HashCache(cache_path) if cache_path else None
+        try:
+            result = compare_zip_and_directory(zip_path, dir_path, cache=cache, **options)
+        finally:
+            if cache is not None:
+                cache.close()
+    except (ZipCompareError, zipfile.BadZipFile, OSError, ValueError, sqlite3.Error) as e:
+        entry['status'] = 'error'
+        entry['error'] = str(e)
+    else:
+        differences = {}
+        for kind, items in result.items():
+            if isinstance(items, dict):
+                differences[kind] = {path: list(items[path]) for path in sorted(items)}
+            else:
+                differences[kind] = sorted(items)
+        entry['status'] = 'differ' if any(differences.values()) else 'match'
+        entry['counts'] = {kind: len(items) for kind, items in differences.items()}
+        entry['differences'] = differences
+    entry['seconds'] = round(time.perf_counter() - start, 6)
+    return entry
+
+
+def run_batch(pairs, jobs=None, cache_path=None, **options):
+    """Compare many (zip_path, dir_path) pairs across a process pool.
+
+    Returns a report dict with one entry per pair, in manifest order, plus
+    a summary of statuses and the total wall time. With jobs=1 the pairs
+    are compared in this process.
+    """
+    start = time.perf_counter()
+    if jobs == 1:
+        entries = [compare_pair(zip_path, dir_path, cache_path, **options)
+                   for zip_path, dir_path in pairs]
+    else:
+        entries = [None] * len(pairs)
+        with ProcessPoolExecutor(max_workers=jobs) as pool:
+            futures = {pool.submit(compare_pair, zip_path, dir_path, cache_path, **options): i
+                       for i, (zip_path, dir_path) in enumerate(pairs)}
+            for future in as_completed(futures):
+                entries[futures[future]] = future.result()
+
+    summary = {'pairs': len(entries), 'match': 0, 'differ': 0, 'error': 0}
+    for entry in entries:
+        summary[entry['status']] += 1
+        # Pairs compared in worker processes are profiled by their own timing.
+        profiling.record('compare_pair', entry['seconds'])
+        profiling.count(f"pairs_{entry['status']}")
+    summary['seconds'] = round(time.perf_counter() - start, 6)
+    return {'summary': summary, 'pairs': entries}
+
+
+def main(argv=None):
+    """Run zipbatch from the command line and return the exit code.
+
+    Exits with EXIT_ERROR if the manifest cannot be read or any pair
+    failed, EXIT_DIFFERENCES if any pair differs, and EXIT_MATCH otherwise.
+    """
+    parser = argparse.ArgumentParser(
+        description='Compare many ZIP/directory pairs listed in a CSV or JSONL manifest.'
+    )
+    parser.add_argument('manifest', help="CSV (with 'zip' and 'dir' columns) or JSONL manifest")
+    parser.add_argument('--jobs', type=int, default=None,
+                        help='Number of pairs compared in parallel (default: CPU count)')
+    parser.add_argument('--output', '-o', metavar='PATH',
+                        help='Write the JSON report here instead of stdout')
+    parser.add_argument('--verify', action='store_true',
+                        help='Also compare contents using the CRC-32 stored in each ZIP')
+    parser.add_argument('--hash', dest='hash_algorithm', metavar='ALGORITHM',
+                        help='Compare contents by fully hashing both sides; implies --verify')
+    parser.add_argument('--include', action='append', metavar='GLOB',
+                        help='Only compare paths matching this glob (repeatable)')
+    parser.add_argument('--exclude', action='append', metavar='GLOB',
+                        help='Skip paths matching this glob (repeatable)')
+    parser.add_argument('--cache', metavar='PATH',
+                        help='SQLite cache file shared by all pairs and runs')
+    parser.add_argument('--workers', type=int, default=None,
+                        help='Hashing threads per pair')
+    profiling.add_profile_argument(parser)
+
+    args = parser.parse_args(argv)
+    with profiling.profiled(args.profile):
+        return _run(args)
+
+
+def _run(args):
+    """Run the batch for main's parsed arguments and return the exit code."""
+    try:
+        pairs = read_manifest(args.manifest)
+    except (ManifestError, ValueError) as e:
+        print(f"Error: {e}", file=sys.stderr)
+        return EXIT_ERROR
+
+    report = run_batch(pairs, jobs=args.jobs, cache_path=args.cache,
+                       verify=args.verify, hash_algorithm=args.hash_algorithm,
+                       workers=args.workers, include=args.include, exclude=args.exclude)
+
+    if args.output:
+        with open(args.output, 'w', encoding='utf-8') as f:
+            json.dump(report, f, indent=2)
+    else:
+        json.dump(report, sys.stdout, indent=2)
+        print()
+
+    summary = report['summary']
+    if summary['error']:
+        return EXIT_ERROR
+    return EXIT_DIFFERENCES if summary['differ'] else EXIT_MATCH
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,254 @@
+import os
+import sys
+import json
+import math
+import time
+import random
+import zipfile
+import platform
+import argparse
+import tempfile
+import tracemalloc
+
+try:
+    from . import profiling
+    from .profiling import peak_rss_bytes
+    from .scanner import scan_tree
+    from .zipcompare import compare_zip_and_directory, get_directory_file_info, get_zip_file_info
+except ImportError:  # run directly as a script
+    import profiling
+    from profiling import peak_rss_bytes
+    from scanner import scan_tree
+    from zipcompare import compare_zip_and_directory, get_directory_file_info, get_zip_file_info
+
+# Bumped whenever the layout of the results file changes.
+RESULTS_VERSION = 2
+
+COMPRESSION_METHODS = {
+    'stored': zipfile.ZIP_STORED,
+    'deflated': zipfile.ZIP_DEFLATED,
+    'bzip2': zipfile.ZIP_BZIP2,
+    'lzma': zipfile.ZIP_LZMA,
+}
+
+SIZE_DISTRIBUTIONS = ('fixed', 'uniform', 'lognormal')
+
+# Fraction of each generated file that is repetitive text rather than
+# random bytes, so that the compression methods differ in cost and ratio.
+DEFAULT_COMPRESSIBLE = 0.5
+
+_FILLER = b'the quick brown fox jumps over the lazy dog; pack my box with five dozen jugs. '
+
+# A stage is reported as a regression when it is this much slower than the baseline.
+DEFAULT_TOLERANCE = 0.10
+
+
+def file_sizes(count, distribution='lognormal', mean_size=4096, seed=0):
+    """Return count file sizes drawn from the named distribution with the given mean."""
+    rng = random.Random(seed)
+    if distribution == 'fixed':
+        return [mean_size] * count
+    if distribution == 'uniform':
+        return [rng.randint(0, 2 * mean_size) for _ in range(count)]
+    if distribution == 'lognormal':
+        # sigma=1 gives a long tail of large files; mu is chosen so the mean is mean_size.
+        mu = max(0.0, math.log(mean_size) - 0.5)
+        return [int(rng.lognormvariate(mu, 1.0)) for _ in range(count)]
+    raise ValueError(f"Unknown size distribution '{distribution}'")
+
+
+def file_payload(rng, size, compressible=DEFAULT_COMPRESSIBLE):
+    """Return size bytes: random bytes followed by repeated text making up compressible of it."""
+    text_size = int(size * compressible)
+    offset = rng.randrange(len(_FILLER))
+    repeats = (offset + text_size) // len(_FILLER) + 1
+    return rng.randbytes(size - text_size) + (_FILLER * repeats)[offset:offset + text_size]
+
+
+def generate_tree(root, files=1000, distribution='lognormal', mean_size=4096, depth=3,
+                  fanout=8, seed=0, compressible=DEFAULT_COMPRESSIBLE):
+    """Create a synthetic directory tree of generated files under root.
+
+    Files are spread over directories up to depth levels deep with fanout
+    subdirectories each; see file_payload for their contents. Returns
+    (file_count, total_bytes).
+    """
+    rng = random.Random(seed)
+    sizes = file_sizes(files, distribution, mean_size, seed)
+    total_bytes = 0
+    for i, size in enumerate(sizes):
+        parts = [f"d{rng.randrange(fanout)}" for _ in range(rng.randint(0, depth))]
+        dir_path = os.path.join(root, *parts)
+        os.makedirs(dir_path, exist_ok=True)
+        with open(os.path.join(dir_path, f"f{i}.bin"), 'wb') as f:
+            f.write(file_payload(rng, size, compressible))
+        total_bytes += size
+    return len(sizes), total_bytes
+
+
+def generate_archive(root, zip_path, compression='deflated'):
+    """Write every file under root into a new ZIP archive at zip_path."""
+    with zipfile.ZipFile(zip_path, 'w', COMPRESSION_METHODS[compression]) as zipf:
+        for entry in scan_tree(root):
+            zipf.write(entry.path, entry.rel_path)
+
+
+def peak_alloc_bytes(function):
+    """Run function under tracemalloc and return the most memory its allocations held at once."""
+    tracemalloc.start()
+    try:
+        function()
+        return tracemalloc.get_traced_memory()[1]
+    finally:
+        tracemalloc.stop()
+
+
+def time_stage(function, repeat, file_count, total_bytes):
+    """Run function repeat times and return its best timing as a result dict.
+
+    One more run, untimed since tracing slows it down, measures the
+    stage's own peak_alloc_bytes. process_peak_rss_bytes is the peak RSS
+    of the whole process so far, so it never drops from stage to stage.
+    """
+    best = None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        function()
+        elapsed = time.perf_counter() - start
+        best = elapsed if best is None else min(best, elapsed)
+    return {
+        'seconds': round(best, 6),
+        'files_per_sec': round(file_count / best, 1) if best else None,
+        'bytes_per_sec': round(total_bytes / best, 1) if best else None,
+        'peak_alloc_bytes': peak_alloc_bytes(function),
+        'process_peak_rss_bytes': peak_rss_bytes(),
+    }
+
+
+def run_benchmark(workdir, files=1000, distribution='lognormal', mean_size=4096, depth=3,
+                  compression='deflated', repeat=3, verify=True, seed=0,
+                  compressible=DEFAULT_COMPRESSIBLE):
+    """Generate a synthetic tree and archive in workdir and time zipcompare on them.
+
+    The data goes in a new subdirectory of workdir, so files left there by
+    earlier runs never end up in the dataset. Returns a results dict
+    holding the configuration, the environment and per-stage timings with
+    files/sec, bytes/sec and memory use (see time_stage).
+    """
+    config = {'files': files, 'distribution': distribution, 'mean_size': mean_size,
+              'depth': depth, 'compression': compression, 'repeat': repeat,
+              'verify': verify, 'seed': seed, 'compressible': compressible}
+    rundir = tempfile.mkdtemp(prefix='zipbench-', dir=workdir)
+    dir_path = os.path.join(rundir, 'tree')
+    zip_path = os.path.join(rundir, 'tree.zip')
+    with profiling.stage('generate'):
+        file_count, total_bytes = generate_tree(dir_path, files, distribution, mean_size, depth,
+                                                seed=seed, compressible=compressible)
+        generate_archive(dir_path, zip_path, compression)
+
+    stages = {
+        'get_zip_file_info': lambda: get_zip_file_info(zip_path),
+        'get_directory_file_info': lambda: get_directory_file_info(dir_path),
+        'compare_zip_and_directory': lambda: compare_zip_and_directory(zip_path, dir_path,
+                                                                       verify=verify),
+    }
+    results = {}
+    for name, function in stages.items():
+        with profiling.stage(name):
+            results[name] = time_stage(function, repeat, file_count, total_bytes)
+    return {
+        'version': RESULTS_VERSION,
+        'config': config,
+        'environment': {
+            'python': platform.python_version(),
+            'platform': platform.platform(),
+            'cpu_count': os.cpu_count(),
+        },
+        'dataset': {'files': file_count, 'bytes': total_bytes,
+                    'archive_bytes': os.path.getsize(zip_path)},
+        'results': results,
+    }
+
+
+def compare_results(baseline, current, tolerance=DEFAULT_TOLERANCE):
+    """Compare two results dicts stage by stage.
+
+    Returns a list of (stage, baseline_seconds, current_seconds, ratio,
+    regressed) tuples, where regressed means current is slower than the
+    baseline by more than tolerance.
+    """
+    comparison = []
+    for stage, result in current['results'].items():
+        if stage not in baseline['results']:
+            continue
+        before = baseline['results'][stage]['seconds']
+        after = result['seconds']
+        ratio = after / before if before else float('inf')
+        comparison.append((stage, before, after, ratio, ratio > 1 + tolerance))
+    return comparison
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark zipcompare on a synthetic tree and archive.')
+    parser.add_argument('--files', type=int, default=1000, help='Number of files to generate')
+    parser.add_argument('--distribution', choices=SIZE_DISTRIBUTIONS, default='lognormal',
+                        help='File size distribution')
+    parser.add_argument('--mean-size', type=int, default=4096, help='Mean file size in bytes')
+    parser.add_argument('--depth', type=int, default=3, help='Maximum directory depth')
+    parser.add_argument('--compression', choices=sorted(COMPRESSION_METHODS), default='deflated',
+                        help='Compression method of the generated archive')
+    parser.add_argument('--repeat', type=int, default=3, help='Runs per stage; the best is kept')
+    parser.add_argument('--no-verify', dest='verify', action='store_false',
+                        help='Benchmark the size-only comparison')
+    parser.add_argument('--compressible', type=float, default=DEFAULT_COMPRESSIBLE,
+                        help='Fraction of each file that is compressible text '
+                             f'(default: {DEFAULT_COMPRESSIBLE})')
+    parser.add_argument('--seed', type=int, default=0, help='Random seed for the dataset')
+    parser.add_argument('--workdir',
+                        help='Directory to generate the data in, under a new subdirectory '
+                             'that is kept (default: a temp dir)')
+    parser.add_argument('--output', '-o', metavar='PATH', help='Write results JSON here')
+    parser.add_argument('--baseline', metavar='PATH',
+                        help='Compare against an earlier results file; exit 1 on regressions')
+    parser.add_argument('--tolerance', type=float, default=DEFAULT_TOLERANCE,
+                        help='Allowed slowdown against the baseline (default: 0.10)')
+    profiling.add_profile_argument(parser)
+
+    args = parser.parse_args()
+    with profiling.profiled(args.profile):
+        _run(args)
+
+
+def _run(args):
+    """Run the benchmark for main's parsed arguments."""
+
+    options = dict(files=args.files, distribution=args.distribution, mean_size=args.mean_size,
+                   depth=args.depth, compression=args.compression, repeat=args.repeat,
+                   verify=args.verify, seed=args.seed, compressible=args.compressible)
+    if args.workdir:
+        os.makedirs(args.workdir, exist_ok=True)
+        results = run_benchmark(args.workdir, **options)
+    else:
+        with tempfile.TemporaryDirectory() as workdir:
+            results = run_benchmark(workdir, **options)
+
+    if args.output:
+        with open(args.output, 'w', encoding='utf-8') as f:
+            json.dump(results, f, indent=2)
+    else:
+        json.dump(results, sys.stdout, indent=2)
+        print()
+
+    if args.baseline:
+        with open(args.baseline, 'r', encoding='utf-8') as f:
+            baseline = json.load(f)
+        regressed = False
+        for stage, before, after, ratio, slower in compare_results(baseline, results, args.tolerance):
+            flag = '  REGRESSION' if slower else ''
+            print(f"{stage}: {before:.4f}s -> {after:.4f}s ({ratio:.2f}x){flag}", file=sys.stderr)
+            regressed = regressed or slower
+        sys.exit(1 if regressed else 0)
+
+
+if __name__ == '__main__':
+    main()
@@ -1,6 +1,67 @@
+import io
+import sys
+import json
 import zipfile
 import os
+import argparse
+import struct
+import zlib
+import heapq
+import pickle
 import hashlib
+import sqlite3
+import tempfile
+import threading
+from collections import deque
+from concurrent.futures import Future, ThreadPoolExecutor
+
+try:
+    from . import profiling
+    from .hashcache import HashCache, stat_key
+    from .scanner import SYMLINKS_FILES, SYMLINK_POLICIES, compile_filter, scan_tree
+except ImportError:  # run directly as a script
+    import profiling
+    from hashcache import HashCache, stat_key
+    from scanner import SYMLINKS_FILES, SYMLINK_POLICIES, compile_filter, scan_tree
+
+# Read size used when streaming file contents for CRC/hash checks.
+CHUNK_SIZE = 1024 * 1024
+
+# zlib.crc32 and hashlib release the GIL on large buffers, so a thread pool
+# keeps both the disks and the cores busy while hashing directory trees.
+DEFAULT_WORKERS = min(32, (os.cpu_count() or 1) + 4)
+
+# Maximum number of files queued in the hashing pool at any one time.
+HASH_BATCH_SIZE = 1024
+
+# Records held in memory per side before sorted runs are spilled to disk.
+SORT_BUFFER_SIZE = 500000
+
+# Records pickled together when writing a sorted run to disk.
+SPILL_BLOCK_SIZE = 4096
+
+# Kinds of difference reported by iter_differences.
+ONLY_IN_ZIP = 'only_in_zip'
+ONLY_IN_DIR = 'only_in_dir'
+SIZE_MISMATCH = 'size_mismatch'
+CONTENT_MISMATCH = 'content_mismatch'
+ONLY_IN_FIRST = 'only_in_first'
+ONLY_IN_SECOND = 'only_in_second'
+
+# Exit codes for main().
+EXIT_MATCH = 0
+EXIT_DIFFERENCES = 1
+EXIT_ERROR = 2
+
+# Members with these extensions are descended into when comparing nested archives.
+NESTED_ARCHIVE_EXTENSIONS = ('.zip', '.jar', '.war', '.ear', '.apk')
+
+# Joins an archive member's name to the paths inside it, e.g. 'lib/a.jar!/x.class'.
+NESTED_SEPARATOR = '!/'
+
+# Field positions of the filename and extra field lengths in a local file header.
+_FH_FILENAME_LENGTH = 10
+_FH_EXTRA_FIELD_LENGTH = 11
 
 class ZipCompareError(Exception):
     """Base exception for zipcompare errors."""
@@ -14,95 +75,617 @@ class DirectoryNotFoundError(ZipCompareError):
     """Exception for missing directory."""
 
 
-def get_zip_file_info(zip_path):
-    """Get file information from a ZIP archive."""
+class _MemberWindow(io.RawIOBase):
+    """Read-only, seekable view of a byte range of another seekable stream."""
+
+    def __init__(self, fileobj, start, size):
+        self._fileobj = fileobj
+        self._start = start
+        self._size = size
+        self._pos = 0
+
+    def readable(self):
+        return True
+
+    def seekable(self):
+        return True
+
+    def tell(self):
+        return self._pos
+
+    def seek(self, offset, whence=io.SEEK_SET):
+        if whence == io.SEEK_CUR:
+            offset += self._pos
+        elif whence == io.SEEK_END:
+            offset += self._size
+        self._pos = max(0, offset)
+        return self._pos
+
+    def readinto(self, b):
+        n = max(0, min(len(b), self._size - self._pos))
+        if not n:
+            return 0
+        self._fileobj.seek(self._start + self._pos)
+        n = self._fileobj.readinto(memoryview(b)[:n])
+        self._pos += n
+        return n
+
+
+def _open_member_stream(zipf, zip_entry):
+    """Open a ZIP member as a seekable stream without extracting it to disk.
+
+    Stored (uncompressed) members are read in place through a window on the
+    outer archive, so opening a nested archive costs only its header reads.
+    Compressed members have to be inflated, and are held in memory.
+    """
+    if zip_entry.compress_type == zipfile.ZIP_STORED and not zip_entry.flag_bits & 0x1:
+        zipf.fp.seek(zip_entry.header_offset)
+        header = struct.unpack(zipfile.structFileHeader, zipf.fp.read(zipfile.sizeFileHeader))
+        start = (zip_entry.header_offset + zipfile.sizeFileHeader
+                 + header[_FH_FILENAME_LENGTH] + header[_FH_EXTRA_FIELD_LENGTH])
+        return _MemberWindow(zipf.fp, start, zip_entry.file_size)
+    return io.BytesIO(zipf.read(zip_entry))
+
+
+def _iter_archive(zipf, prefix='', nested=False):
+    """Yield (name, size, crc) for each file in an open ZipFile.
+
+    With nested set, members that are themselves archives are listed too,
+    with their entries named '<member>!/<entry>'.
+    """
+    for zip_entry in zipf.infolist():
+        if zip_entry.is_dir():
+            continue
+        name = prefix + zip_entry.filename
+        yield name, zip_entry.file_size, zip_entry.CRC
+        if nested and zip_entry.filename.lower().endswith(NESTED_ARCHIVE_EXTENSIONS):
+            try:
+                with zipfile.ZipFile(_open_member_stream(zipf, zip_entry), 'r') as inner:
+                    yield from _iter_archive(inner, name + NESTED_SEPARATOR, nested)
+            except (zipfile.BadZipFile, NotImplementedError, RuntimeError):
+                # Not a readable archive after all; compare it as a plain file.
+                pass
+
+
+def get_zip_file_info(zip_path, include_crc=False, cache=None, nested=False):
+    """Get file information from a ZIP archive.
+
+    Values are file sizes, or (size, crc) tuples when include_crc is set.
+    Only the central directory is read; nothing is decompressed. With a
+    HashCache the listing is reused while the archive's size and mtime are
+    unchanged. With nested set, archives inside the archive are listed too
+    (see _iter_archive). Use iter_zip_entries to stream the listing instead.
+    """
     if not os.path.isfile(zip_path):
         raise ZipFileNotFoundError(f"ZIP file '{zip_path}' does not exist.")
     
-    zip_info = {}
-    with zipfile.ZipFile(zip_path, 'r') as zipf:
-        for zip_entry in zipf.infolist():
-            if not zip_entry.is_dir():
-                zip_info[zip_entry.filename] = zip_entry.file_size
-    return zip_info
+    with profiling.stage('zip_listing'):
+        entries = iter_zip_entries(zip_path, cache, nested)
+        if include_crc:
+            return {name: (size, crc) for name, size, crc in entries}
+        return {name: size for name, size, _ in entries}
+
 
+def get_directory_file_info(dir_path, include=None, exclude=None, symlinks=SYMLINKS_FILES):
+    """Get file information from a directory.
 
-def get_directory_file_info(dir_path):
-    """Get file information from a directory."""
+    Keys are '/'-separated paths relative to dir_path and values are file
+    sizes. include/exclude glob patterns and the symlink policy are passed
+    to scanner.scan_tree.
+    """
     if not os.path.isdir(dir_path):
         raise DirectoryNotFoundError(f"Directory '{dir_path}' does not exist")
     
     dir_info = {}
-    for root, _, files in os.walk(dir_path):
-        for file in files:
-            file_path = os.path.relpath(os.path.join(root, file), dir_path)
-            file_size = os.path.getsize(os.path.join(root, file))
-            # Normalize path separator for comparison
-            dir_info[file_path.replace(os.sep, '/')] = file_size
+    with profiling.stage('dir_listing'):
+        for entry in scan_tree(dir_path, include, exclude, symlinks):
+            dir_info[entry.rel_path] = entry.stat.st_size
     return dir_info
 
 
-def compare_zip_and_directory(zip_path, dir_path):
-    """Compare a ZIP archive and a directory for file names and sizes."""
-    zip_info = get_zip_file_info(zip_path)
-    dir_info = get_directory_file_info(dir_path)
-    
-    zip_files = set(zip_info.keys())
-    dir_files = set(dir_info.keys())
-    
-    # Check for differences in file names
-    only_in_zip = zip_files - dir_files
-    only_in_dir = dir_files - zip_files
-    
-    # Check for differences in file sizes.
-    # NB - MD5 check would be better.
-    size_mismatch = {file: (zip_info[file], dir_info[file]) for file in (zip_files & dir_files) if zip_info[file] != dir_info[file]}
-    
-    return {
-        'only_in_zip': only_in_zip,
-        'only_in_dir': only_in_dir,
-        'size_mismatch': size_mismatch
+_thread_buffers = threading.local()
+
+
+def _read_chunks(file_obj, chunk_size=CHUNK_SIZE):
+    """Yield views of a per-thread reused buffer filled from file_obj until EOF."""
+    buffer = getattr(_thread_buffers, 'buffer', None)
+    if buffer is None or len(buffer) != chunk_size:
+        buffer = _thread_buffers.buffer = bytearray(chunk_size)
+    view = memoryview(buffer)
+    while True:
+        n = file_obj.readinto(buffer)
+        if not n:
+            break
+        yield view[:n]
+
+
+def file_crc32(file_path, chunk_size=CHUNK_SIZE):
+    """Compute the CRC-32 of a file on disk, streaming it in chunks."""
+    crc = 0
+    with open(file_path, 'rb') as f:
+        for chunk in _read_chunks(f, chunk_size):
+            crc = zlib.crc32(chunk, crc)
+    return crc
+
+
+def file_digest(file_path, algorithm='sha256', chunk_size=CHUNK_SIZE):
+    """Compute a hashlib hex digest of a file on disk, streaming it in chunks."""
+    digest = hashlib.new(algorithm)
+    with open(file_path, 'rb') as f:
+        for chunk in _read_chunks(f, chunk_size):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def zip_entry_digest(zipf, name, algorithm='sha256', chunk_size=CHUNK_SIZE):
+    """Compute a hashlib hex digest of a ZIP member by decompressing it."""
+    digest = hashlib.new(algorithm)
+    with zipf.open(name) as f:
+        for chunk in iter(lambda: f.read(chunk_size), b''):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def hash_file(file_path, algorithm='crc32', chunk_size=CHUNK_SIZE):
+    """Return the hex digest of a file; 'crc32' or any hashlib algorithm name."""
+    with profiling.stage('hash'):
+        if algorithm == 'crc32':
+            return f"{file_crc32(file_path, chunk_size):08x}"
+        return file_digest(file_path, algorithm, chunk_size)
+
+
+def _submit_hash(pool, dir_path, root, rel_path, algorithm, chunk_size, cache, key=None):
+    """Queue a file for hashing, answering from the cache where possible.
+
+    Returns (key, future); key is the stat key to store the digest under once
+    the future completes, or None when nothing needs storing.
+    """
+    file_path = os.path.join(dir_path, rel_path)
+    if cache is not None:
+        if key is None:
+            key = stat_key(file_path)
+        digest = cache.get_digest(root, rel_path, algorithm, key)
+        if digest is not None:
+            profiling.count('hash_cache_hits')
+            future = Future()
+            future.set_result(digest)
+            return None, future
+    return key, pool.submit(hash_file, file_path, algorithm, chunk_size)
+
+
+def _hash_result(cache, root, rel_path, algorithm, key, future):
+    """Wait for a hash submitted by _submit_hash and record it in the cache."""
+    digest = future.result()
+    if cache is not None and key is not None:
+        cache.put_digest(root, rel_path, algorithm, key, digest)
+    return digest
+
+
+def _spill_run(records):
+    """Write sorted records to a temporary file in pickled blocks."""
+    profiling.count('sort_spilled_records', len(records))
+    run = tempfile.TemporaryFile()
+    for i in range(0, len(records), SPILL_BLOCK_SIZE):
+        pickle.dump(records[i:i + SPILL_BLOCK_SIZE], run, pickle.HIGHEST_PROTOCOL)
+    run.seek(0)
+    return run
+
+
+def _read_run(run):
+    """Yield the records of a run written by _spill_run."""
+    while True:
+        try:
+            block = pickle.load(run)
+        except EOFError:
+            return
+        yield from block
+
+
+def external_sort(records, buffer_size=SORT_BUFFER_SIZE):
+    """Yield records (tuples) in sorted order using bounded memory.
+
+    Up to buffer_size records are sorted in memory; beyond that, sorted runs
+    are spilled to temporary files and merged lazily with heapq.merge.
+    """
+    runs = []
+    buffer = []
+    try:
+        for record in records:
+            buffer.append(record)
+            if len(buffer) >= buffer_size:
+                buffer.sort()
+                runs.append(_spill_run(buffer))
+                buffer = []
+        buffer.sort()
+        if not runs:
+            yield from buffer
+            return
+        yield from heapq.merge(buffer, *(_read_run(run) for run in runs))
+    finally:
+        for run in runs:
+            run.close()
+
+
+def merge_by_path(left, right):
+    """Merge-join two streams of records sorted by their first field (path).
+
+    Yields (path, left_record, right_record), with None for a missing side.
+    """
+    left = iter(left)
+    right = iter(right)
+    l = next(left, None)
+    r = next(right, None)
+    while l is not None or r is not None:
+        if r is None or (l is not None and l[0] < r[0]):
+            yield l[0], l, None
+            l = next(left, None)
+        elif l is None or r[0] < l[0]:
+            yield r[0], None, r
+            r = next(right, None)
+        else:
+            yield l[0], l, r
+            l = next(left, None)
+            r = next(right, None)
+
+
+def iter_zip_entries(zip_path, cache=None, nested=False):
+    """Yield (name, size, crc) for each file entry in a ZIP archive.
+
+    With a HashCache, an unchanged archive's listing is streamed from the
+    cache without opening the archive; otherwise the entries are stored in
+    the cache as they are yielded. Either way the listing is never
+    collected, so memory stays bounded however many entries there are.
+    """
+    if cache is not None:
+        # Nested listings are cached separately from flat ones.
+        cache_path = os.path.realpath(zip_path) + (NESTED_SEPARATOR if nested else '')
+        cache_key = stat_key(zip_path)
+        entries = cache.iter_zip_listing(cache_path, cache_key)
+        if entries is not None:
+            yield from entries
+            return
+    with zipfile.ZipFile(zip_path, 'r') as zipf:
+        entries = _iter_archive(zipf, nested=nested)
+        if cache is not None:
+            entries = cache.record_zip_listing(cache_path, cache_key, entries)
+        yield from entries
+
+
+def iter_differences(zip_path, dir_path, verify=False, hash_algorithm=None, workers=None,
+                     cache=None, include=None, exclude=None, symlinks=SYMLINKS_FILES,
+                     sort_buffer_size=SORT_BUFFER_SIZE):
+    """Compare a ZIP archive and a directory, yielding differences as they are found.
+
+    Both sides are sorted by path (spilling to disk past sort_buffer_size
+    records, see external_sort) and merge-joined, so memory stays bounded
+    and differences are yielded in path order as soon as they are known.
+    Each difference is a (kind, path, zip_value, dir_value) tuple where kind
+    is one of ONLY_IN_ZIP, ONLY_IN_DIR, SIZE_MISMATCH or CONTENT_MISMATCH;
+    values are sizes, or digests for content mismatches, and None for a
+    missing side. Arguments are as for compare_zip_and_directory.
+    """
+    if not os.path.isfile(zip_path):
+        raise ZipFileNotFoundError(f"ZIP file '{zip_path}' does not exist.")
+    if not os.path.isdir(dir_path):
+        raise DirectoryNotFoundError(f"Directory '{dir_path}' does not exist")
+    return _iter_differences(zip_path, dir_path, verify or hash_algorithm is not None,
+                             hash_algorithm, workers, cache, include, exclude, symlinks,
+                             sort_buffer_size)
+
+
+def _iter_differences(zip_path, dir_path, verify, hash_algorithm, workers, cache,
+                      include, exclude, symlinks, sort_buffer_size):
+    selected = compile_filter(include, exclude)
+    zip_records = iter_zip_entries(zip_path, cache)
+    if selected is not None:
+        zip_records = (record for record in zip_records if selected(record[0]))
+    # Directory records are (rel_path, size, mtime_ns, inode) so the scan's
+    # stat doubles as the hash cache key.
+    dir_records = ((entry.rel_path,) + stat_key(entry.stat)
+                   for entry in scan_tree(dir_path, include, exclude, symlinks))
+    zip_records = profiling.timed('zip_entries', zip_records)
+    dir_records = profiling.timed('dir_entries', dir_records)
+    merged = merge_by_path(external_sort(zip_records, sort_buffer_size),
+                           external_sort(dir_records, sort_buffer_size))
+
+    # CRC-32 needs no decompression: the archive already stores it.
+    algorithm = hash_algorithm or 'crc32'
+    root = os.path.realpath(dir_path)
+    zipf = zipfile.ZipFile(zip_path, 'r') if algorithm != 'crc32' else None
+    pool = ThreadPoolExecutor(max_workers=workers or DEFAULT_WORKERS) if verify else None
+    # Differences waiting to be yielded, in path order. Content checks carry
+    # their pending hash, so output stalls only on the oldest unfinished file.
+    pending = deque()
+
+    def resolve(difference, hashed):
+        if hashed is None:
+            return difference
+        _, path, zip_crc, _ = difference
+        dir_digest = _hash_result(cache, root, path, algorithm, *hashed)
+        if zipf is not None:
+            zip_digest = zip_entry_digest(zipf, path, algorithm)
+        else:
+            zip_digest = f"{zip_crc:08x}"
+        if zip_digest != dir_digest:
+            return CONTENT_MISMATCH, path, zip_digest, dir_digest
+        return None
+
+    try:
+        for path, zip_record, dir_record in merged:
+            if dir_record is None:
+                pending.append(((ONLY_IN_ZIP, path, zip_record[1], None), None))
+            elif zip_record is None:
+                pending.append(((ONLY_IN_DIR, path, None, dir_record[1]), None))
+            elif zip_record[1] != dir_record[1]:
+                pending.append(((SIZE_MISMATCH, path, zip_record[1], dir_record[1]), None))
+            elif verify:
+                profiling.count('verified_bytes', dir_record[1])
+                hashed = _submit_hash(pool, dir_path, root, path, algorithm, CHUNK_SIZE,
+                                      cache, dir_record[1:])
+                pending.append(((CONTENT_MISMATCH, path, zip_record[2], None), hashed))
+            while pending and (pending[0][1] is None or pending[0][1][1].done()
+                               or len(pending) >= HASH_BATCH_SIZE):
+                difference = resolve(*pending.popleft())
+                if difference is not None:
+                    yield difference
+        while pending:
+            difference = resolve(*pending.popleft())
+            if difference is not None:
+                yield difference
+        if cache is not None:
+            cache.commit()
+    finally:
+        if pool is not None:
+            pool.shutdown(cancel_futures=True)
+        if zipf is not None:
+            zipf.close()
+
+
+def compare_zip_and_directory(zip_path, dir_path, verify=False, hash_algorithm=None,
+                              workers=None, cache=None, include=None, exclude=None,
+                              symlinks=SYMLINKS_FILES):
+    """Compare a ZIP archive and a directory for file names and sizes.
+
+    With verify set, files whose sizes match are also checked for content:
+    the CRC-32 stored in the archive's central directory is compared against
+    a streamed CRC-32 of the file on disk, so the archive is never
+    decompressed. Passing a hashlib algorithm name (e.g. 'sha256') as
+    hash_algorithm instead hashes both sides in full, decompressing the
+    archive members; 'crc32' there is the same as verify. Files on disk
+    are hashed by a pool of worker threads, at most HASH_BATCH_SIZE ahead
+    of the output. An optional HashCache lets repeat runs skip re-reading
+    the archive listing and unchanged files. include/exclude
+    glob patterns select which paths are compared on both sides.
+
+    The differences are collected from iter_differences; use that directly
+    to stream them instead.
+    """
+    result = {
+        ONLY_IN_ZIP: set(),
+        ONLY_IN_DIR: set(),
+        SIZE_MISMATCH: {},
+        CONTENT_MISMATCH: {}
     }
+    for kind, path, zip_value, dir_value in iter_differences(
+            zip_path, dir_path, verify, hash_algorithm, workers, cache,
+            include, exclude, symlinks):
+        if kind in (ONLY_IN_ZIP, ONLY_IN_DIR):
+            result[kind].add(path)
+        else:
+            result[kind][path] = (zip_value, dir_value)
+    return result
+
+def iter_zip_differences(first_zip, second_zip, nested=False, cache=None, include=None,
+                         exclude=None, sort_buffer_size=SORT_BUFFER_SIZE):
+    """Compare two ZIP archives, yielding differences as they are found.
+
+    Only central-directory metadata is used: entries are matched by path,
+    then compared by size and, for equal sizes, by stored CRC-32, so no
+    member is decompressed. With nested set, archives inside either archive
+    (see NESTED_ARCHIVE_EXTENSIONS) are compared entry by entry too, read
+    through seekable streams rather than extracted. Differences are
+    (kind, path, first_value, second_value) tuples in path order, with kind
+    one of ONLY_IN_FIRST, ONLY_IN_SECOND, SIZE_MISMATCH or CONTENT_MISMATCH.
+    """
+    for zip_path in (first_zip, second_zip):
+        if not os.path.isfile(zip_path):
+            raise ZipFileNotFoundError(f"ZIP file '{zip_path}' does not exist.")
+    return _iter_zip_differences(first_zip, second_zip, nested, cache, include, exclude,
+                                 sort_buffer_size)
+
+
+def _iter_zip_differences(first_zip, second_zip, nested, cache, include, exclude,
+                          sort_buffer_size):
+    selected = compile_filter(include, exclude)
+    sides = []
+    for zip_path in (first_zip, second_zip):
+        records = iter_zip_entries(zip_path, cache, nested)
+        if selected is not None:
+            records = (record for record in records if selected(record[0]))
+        sides.append(external_sort(profiling.timed('zip_entries', records), sort_buffer_size))
+
+    for path, first, second in merge_by_path(*sides):
+        if second is None:
+            yield ONLY_IN_FIRST, path, first[1], None
+        elif first is None:
+            yield ONLY_IN_SECOND, path, None, second[1]
+        elif first[1] != second[1]:
+            yield SIZE_MISMATCH, path, first[1], second[1]
+        elif first[2] != second[2]:
+            yield CONTENT_MISMATCH, path, f"{first[2]:08x}", f"{second[2]:08x}"
+
+
+def compare_zips(first_zip, second_zip, nested=False, cache=None, include=None, exclude=None):
+    """Compare two ZIP archives for file names, sizes and CRCs.
+
+    The differences are collected from iter_zip_differences.
+    """
+    result = {
+        ONLY_IN_FIRST: set(),
+        ONLY_IN_SECOND: set(),
+        SIZE_MISMATCH: {},
+        CONTENT_MISMATCH: {}
+    }
+    for kind, path, first_value, second_value in iter_zip_differences(
+            first_zip, second_zip, nested, cache, include, exclude):
+        if kind in (ONLY_IN_FIRST, ONLY_IN_SECOND):
+            result[kind].add(path)
+        else:
+            result[kind][path] = (first_value, second_value)
+    return result
 
 def print_set(title, items):
-    """Print each item in a set on a new line."""
+    """Print each item in a set on a new line, sorted."""
     print(f"\n{title}:")
     if items:
-        for item in items:
+        for item in sorted(items):
             print(f"  - {item}")
     else:
         print("  (None)")
 
 
 def print_dict(title, items):
-    """Print each key-value pair in a dictionary on a new line."""
+    """Print each key-value pair in a dictionary on a new line, sorted by key."""
     print(f"\n{title}:")
     if items:
-        for key, value in items.items():
-            print(f"  - {key}: {value}")
+        for key in sorted(items):
+            print(f"  - {key}: {items[key]}")
     else:
         print("  (None)")
 
 
-if __name__ == '__main__':
-    import sys
-    import argparse
-    parser = argparse.ArgumentParser(description='Compare a ZIP file with a directory without extracting.')
+DIFFERENCE_LABELS = {
+    ONLY_IN_ZIP: "Only in ZIP",
+    ONLY_IN_DIR: "Only in Directory",
+    SIZE_MISMATCH: "Size mismatch",
+    CONTENT_MISMATCH: "Content mismatch",
+    ONLY_IN_FIRST: "Only in first ZIP",
+    ONLY_IN_SECOND: "Only in second ZIP"
+}
+
+
+def format_difference(difference):
+    """Format a difference from iter_differences as a single line."""
+    kind, path, zip_value, dir_value = difference
+    if kind in (ONLY_IN_ZIP, ONLY_IN_DIR, ONLY_IN_FIRST, ONLY_IN_SECOND):
+        return f"{DIFFERENCE_LABELS[kind]}: {path}"
+    return f"{DIFFERENCE_LABELS[kind]}: {path}: {(zip_value, dir_value)}"
+
+
+def difference_record(difference, zip_to_zip=False):
+    """Convert a difference tuple into a JSON-serializable dict.
+
+    The two sides are keyed 'zip' and 'dir', or 'first' and 'second' for
+    differences between two ZIP files.
+    """
+    kind, path, left, right = difference
+    left_key, right_key = ('first', 'second') if zip_to_zip else ('zip', 'dir')
+    return {'kind': kind, 'path': path, left_key: left, right_key: right}
+
+
+def main(argv=None):
+    """Run zipcompare from the command line and return the exit code.
+
+    Exits with EXIT_MATCH when there are no differences, EXIT_DIFFERENCES
+    when there are any, and EXIT_ERROR when the comparison could not run.
+    With --format ndjson, one JSON record is written per difference as soon
+    as it is found, followed by a 'summary' record with counts by kind.
+    """
+    parser = argparse.ArgumentParser(description='Compare a ZIP file with a directory or another ZIP file without extracting.')
     parser.add_argument('zip_path', help='Path to the ZIP file')
-    parser.add_argument('dir_path', help='Path to the directory')
-    
-    args = parser.parse_args()
+    parser.add_argument('dir_path', help='Path to the directory, or to a second ZIP file')
+    parser.add_argument('--verify', action='store_true',
+                        help='Also compare contents using the CRC-32 stored in the ZIP '
+                             '(always done for two ZIPs)')
+    parser.add_argument('--hash', dest='hash_algorithm', metavar='ALGORITHM',
+                        help='Compare contents by fully hashing both sides (e.g. sha256); implies --verify')
+    parser.add_argument('--nested', action='store_true',
+                        help='When comparing two ZIPs, also compare archives nested inside them')
+    parser.add_argument('--include', action='append', metavar='GLOB',
+                        help='Only compare paths matching this glob (repeatable)')
+    parser.add_argument('--exclude', action='append', metavar='GLOB',
+                        help='Skip paths matching this glob (repeatable)')
+    parser.add_argument('--symlinks', choices=SYMLINK_POLICIES, default=SYMLINKS_FILES,
+                        help='How to treat symlinks in the directory (default: files)')
+    parser.add_argument('--cache', metavar='PATH',
+                        help='SQLite file caching digests and ZIP listings between runs')
+    parser.add_argument('--workers', type=int, default=None,
+                        help=f'Number of threads hashing directory files (default: {DEFAULT_WORKERS})')
+    parser.add_argument('--stream', action='store_true',
+                        help='Print each difference as soon as it is found, in path order')
+    parser.add_argument('--format', choices=('text', 'ndjson'), default='text',
+                        help='Output format; ndjson streams one JSON record per difference')
+    profiling.add_profile_argument(parser)
     
+    args = parser.parse_args(argv)
+    with profiling.profiled(args.profile):
+        return _run(args)
+
+
+def _run(args):
+    """Run the comparison for main's parsed arguments and return the exit code."""
     if not os.path.isfile(args.zip_path):
-        sys.exit(f"Error: ZIP file '{args.zip_path}' does not exist.")
+        print(f"Error: ZIP file '{args.zip_path}' does not exist.", file=sys.stderr)
+        return EXIT_ERROR
         
+    zip_to_zip = os.path.isfile(args.dir_path)
+    if not zip_to_zip and not os.path.isdir(args.dir_path):
+        print(f"Error: Directory '{args.dir_path}' does not exist.", file=sys.stderr)
+        return EXIT_ERROR
+    if zip_to_zip and args.hash_algorithm not in (None, 'crc32'):
+        # Two archives are always compared by their stored CRC-32s.
+        print(f"Error: --hash {args.hash_algorithm} is not supported when comparing two ZIP "
+              "files; their stored CRC-32s are compared.", file=sys.stderr)
+        return EXIT_ERROR
     
-    if not os.path.isdir(args.dir_path):
-        sys.exit(f"Error: Directory '{args.dir_path}' does not exist.")
-    
-    comparison_result = compare_zip_and_directory(args.zip_path, args.dir_path)
+    cache = None
+    try:
+        cache = HashCache(args.cache) if args.cache else None
+        if zip_to_zip:
+            options = dict(nested=args.nested, cache=cache, include=args.include,
+                           exclude=args.exclude)
+            iter_function, compare_function = iter_zip_differences, compare_zips
+        else:
+            options = dict(verify=args.verify, hash_algorithm=args.hash_algorithm,
+                           workers=args.workers, cache=cache, include=args.include,
+                           exclude=args.exclude, symlinks=args.symlinks)
+            iter_function, compare_function = iter_differences, compare_zip_and_directory
+        if args.format == 'ndjson':
+            counts = {}
+            for difference in iter_function(args.zip_path, args.dir_path, **options):
+                counts[difference[0]] = counts.get(difference[0], 0) + 1
+                print(json.dumps(difference_record(difference, zip_to_zip)), flush=True)
+            print(json.dumps({'kind': 'summary', 'differences': sum(counts.values()),
+                              'counts': counts}), flush=True)
+            return EXIT_DIFFERENCES if counts else EXIT_MATCH
+        if args.stream:
+            found = False
+            for difference in iter_function(args.zip_path, args.dir_path, **options):
+                found = True
+                print(format_difference(difference), flush=True)
+            return EXIT_DIFFERENCES if found else EXIT_MATCH
+        comparison_result = compare_function(args.zip_path, args.dir_path, **options)
+    except (ZipCompareError, zipfile.BadZipFile, OSError, ValueError, sqlite3.Error) as e:
+        print(f"Error: {e}", file=sys.stderr)
+        return EXIT_ERROR
+    finally:
+        if cache is not None:
+            cache.close()
     
     print("\nComparison Results:")
-    print_set("Files only in ZIP", comparison_result['only_in_zip'])
-    print_set("Files only in Directory", comparison_result['only_in_dir'])
-    print_dict("Files with size mismatch", comparison_result['size_mismatch'])
+    if zip_to_zip:
+        print_set("Files only in first ZIP", comparison_result['only_in_first'])
+        print_set("Files only in second ZIP", comparison_result['only_in_second'])
+        print_dict("Files with size mismatch", comparison_result['size_mismatch'])
+        print_dict("Files with CRC mismatch", comparison_result['content_mismatch'])
+    else:
+        print_set("Files only in ZIP", comparison_result['only_in_zip'])
+        print_set("Files only in Directory", comparison_result['only_in_dir'])
+        print_dict("Files with size mismatch", comparison_result['size_mismatch'])
+        if args.verify or args.hash_algorithm:
+            print_dict("Files with content mismatch", comparison_result['content_mismatch'])
+    return EXIT_DIFFERENCES if any(comparison_result.values()) else EXIT_MATCH
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -9,7 +9,8 @@ setup(
     ],
     entry_points={
         'console_scripts': [
-            'zipcompare=scripts.zipcompare:main'
+            'zipcompare=scripts.zipcompare:main',
+            'zipbatch=scripts.zipbatch:main'
         ],
     },
     author='Henry Stiles',
@@ -0,0 +1,230 @@
+"""A tiny in-process IMAP4rev1 server for testing the BirdAlert fetcher.
+
+It speaks just enough of the protocol for imaplib: LOGIN, SELECT/EXAMINE,
+SEARCH SINCE/ALL and FETCH over message sets (plain or UID) of INTERNALDATE,
+RFC822, BODYSTRUCTURE and BODY.PEEK[section], CLOSE and LOGOUT. Every
+command received is logged, and FETCH response bytes counted, so tests can
+check round trips and transfer size.
+"""
+import re
+import email
+import socketserver
+import threading
+import time
+from datetime import datetime
+
+FETCH_ITEM = re.compile(r'[A-Z0-9.]+(?:\[[^\]]*\])?', re.IGNORECASE)
+
+
+class FakeMessage:
+    def __init__(self, raw, internal_date, uid=None):
+        self.raw = raw
+        self.internal_date = internal_date
+        self.uid = uid
+
+
+def parse_message_set(spec, count):
+    """Return the 1-based sequence numbers named by an IMAP message set."""
+    numbers = []
+    for part in spec.split(','):
+        low, _, high = part.partition(':')
+        low = count if low == '*' else int(low)
+        high = low if not high else count if high == '*' else int(high)
+        numbers.extend(range(min(low, high), max(low, high) + 1))
+    return [n for n in numbers if 1 <= n <= count]
+
+
+def parse_uid_set(spec, uids):
+    """Return the positions in uids of the messages named by a UID set."""
+    highest = max(uids, default=0)
+    wanted = set()
+    for part in spec.split(','):
+        low, _, high = part.partition(':')
+        low = highest if low == '*' else int(low)
+        high = low if not high else highest if high == '*' else int(high)
+        wanted.update(uid for uid in uids if min(low, high) <= uid <= max(low, high))
+    return [i + 1 for i, uid in enumerate(uids) if uid in wanted]
+
+
+def _quote(value):
+    if value is None:
+        return 'NIL'
+    return '"' + str(value).replace('\\', '\\\\').replace('"', '\\"') + '"'
+
+
+def _params(pairs):
+    if not pairs:
+        return 'NIL'
+    return '(' + ' '.join(f"{_quote(key.upper())} {_quote(value)}" for key, value in pairs) + ')'
+
+
+def bodystructure(part):
+    """Return the BODYSTRUCTURE of an email.message.Message."""
+    if part.is_multipart():
+        children = ''.join(bodystructure(child) for child in part.get_payload())
+        return f"({children} {_quote(part.get_content_subtype().upper())})"
+    payload = part.get_payload().encode('utf-8')
+    encoding = part.get('Content-Transfer-Encoding', '7BIT').upper()
+    filename = part.get_filename()
+    disposition = f'("ATTACHMENT" ("FILENAME" {_quote(filename)}))' if filename else 'NIL'
+    params = _params((part.get_params() or [])[1:])
+    fields = (f"{_quote(part.get_content_maintype().upper())} "
+              f"{_quote(part.get_content_subtype().upper())} {params} "
+              f"NIL NIL {_quote(encoding)} {len(payload)}")
+    if part.get_content_maintype() == 'text':
+        fields += ' ' + str(payload.count(b'\n'))
+    return f"({fields} NIL {disposition} NIL NIL)"
+
+
+def body_section(message, section):
+    """Return the bytes of BODY[section] of an email.message.Message."""
+    fields = re.match(r'HEADER\.FIELDS \(([^)]*)\)$', section, re.IGNORECASE)
+    if fields:
+        names = {name.upper() for name in fields.group(1).split()}
+        return ''.join(f"{name}: {value}\r\n" for name, value in message.items()
+                       if name.upper() in names).encode('utf-8') + b'\r\n'
+    part = message
+    for number in section.split('.'):
+        if part.is_multipart():
+            part = part.get_payload()[int(number) - 1]
+    return part.get_payload().encode('utf-8')
+
+
+class _Handler(socketserver.StreamRequestHandler):
+    def send(self, line):
+        data = line if isinstance(line, bytes) else line.encode('utf-8')
+        self.server.fake.bytes_sent += len(data)
+        self.wfile.write(data)
+
+    def handle(self):
+        server = self.server.fake
+        self.send("* OK fake IMAP ready\r\n")
+        mailbox = None
+        while True:
+            line = self.rfile.readline()
+            if not line:
+                return
+            tag, _, rest = line.decode('utf-8').rstrip('\r\n').partition(' ')
+            command, _, args = rest.partition(' ')
+            command = command.upper()
+            server.commands.append(f"{command} {args}".strip())
+            by_uid = command == 'UID'
+            if by_uid:
+                command, _, args = args.partition(' ')
+                command = command.upper()
+
+            if command == 'CAPABILITY':
+                self.send("* CAPABILITY IMAP4rev1\r\n")
+            elif command == 'LOGIN':
+                pass
+            elif command in ('SELECT', 'EXAMINE'):
+                name = args.strip('"')
+                if name not in server.mailboxes:
+                    self.send(f"{tag} NO no such mailbox\r\n")
+                    continue
+                mailbox = server.mailboxes[name]
+                self.send(f"* {len(mailbox)} EXISTS\r\n")
+                self.send(f"* OK [UIDVALIDITY {server.uidvalidity}] UIDs valid\r\n")
+                if server.send_uidnext:
+                    uidnext = max((server.uid(mailbox, n) for n in range(1, len(mailbox) + 1)),
+                                  default=0) + 1
+                    self.send(f"* OK [UIDNEXT {uidnext}] Predicted next UID\r\n")
+            elif command == 'SEARCH':
+                if args.split()[-1].upper() == 'ALL':
+                    since = datetime.min.date()
+                else:
+                    since = datetime.strptime(args.split()[-1], "%d-%b-%Y").date()
+                found = [str(server.uid(mailbox, n) if by_uid else n)
+                         for n, message in enumerate(mailbox, start=1)
+                         if message.internal_date.date() >= since]
+                self.send("* SEARCH " + " ".join(found) + "\r\n")
+            elif command == 'FETCH':
+                time.sleep(server.delay)
+                spec, _, items = args.partition(' ')
+                items = FETCH_ITEM.findall(items)
+                if by_uid:
+                    uids = [server.uid(mailbox, n) for n in range(1, len(mailbox) + 1)]
+                    numbers = parse_uid_set(spec, uids)
+                    if 'UID' not in (item.upper() for item in items):
+                        items.insert(0, 'UID')
+                else:
+                    numbers = parse_message_set(spec, len(mailbox))
+                for n in numbers:
+                    self.send_fetch(n, mailbox[n - 1], items)
+            elif command == 'CLOSE':
+                mailbox = None
+            elif command == 'LOGOUT':
+                self.send("* BYE\r\n")
+                self.send(f"{tag} OK LOGOUT completed\r\n")
+                return
+            self.send(f"{tag} OK {command} completed\r\n")
+
+    def send_fetch(self, n, message, items):
+        parts = []
+        literals = []
+        for item in items:
+            name = item.upper()
+            if name == 'UID':
+                parts.append(f'UID {self.server.fake.uid(None, n, message)}')
+            elif name == 'INTERNALDATE':
+                date = message.internal_date.strftime("%d-%b-%Y %H:%M:%S %z")
+                parts.append(f'INTERNALDATE "{date}"')
+            elif name == 'RFC822':
+                literals.append(('RFC822', message.raw))
+            elif name == 'BODYSTRUCTURE':
+                parts.append('BODYSTRUCTURE ' + bodystructure(email.message_from_bytes(message.raw)))
+            elif name.startswith(('BODY[', 'BODY.PEEK[')):
+                section = item[item.index('[') + 1:-1]
+                literals.append((f'BODY[{section}]',
+                                 body_section(email.message_from_bytes(message.raw), section)))
+        head = ' '.join(parts)
+        if not literals:
+            self.send(f"* {n} FETCH ({head})\r\n")
+            return
+        for i, (name, data) in enumerate(literals):
+            prefix = f"* {n} FETCH ({head} " if i == 0 else " "
+            self.send(f"{prefix}{name} {{{len(data)}}}\r\n".replace("( ", "("))
+            self.send(data)
+        self.send(")\r\n")
+
+
+class FakeIMAPServer:
+    """Serve mailboxes ({name: [FakeMessage, ...]}) on a local port.
+
+    Use as a context manager; host and port are set once it is running.
+    delay makes every FETCH take that many seconds.
+    """
+
+    def __init__(self, mailboxes, uidvalidity=1, delay=0, send_uidnext=True):
+        self.mailboxes = mailboxes
+        self.uidvalidity = uidvalidity
+        # Whether SELECT reports UIDNEXT, as most servers do.
+        self.send_uidnext = send_uidnext
+        # Seconds each FETCH takes, to simulate a slow link.
+        self.delay = delay
+        self.commands = []
+        self.bytes_sent = 0
+
+    @staticmethod
+    def uid(mailbox, n, message=None):
+        """Return a message's UID, which defaults to its sequence number."""
+        message = mailbox[n - 1] if message is None else message
+        return n if message.uid is None else message.uid
+
+    def __enter__(self):
+        self._server = socketserver.ThreadingTCPServer(('127.0.0.1', 0), _Handler)
+        self._server.daemon_threads = True
+        self._server.fake = self
+        self.host, self.port = self._server.server_address
+        self._thread = threading.Thread(target=self._server.serve_forever, args=(0.05,),
+                                        daemon=True)
+        self._thread.start()
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self._server.shutdown()
+        self._server.server_close()
+
+    def count(self, command):
+        """Return how many commands starting with command were received."""
+        return sum(1 for line in self.commands if line.split(' ', 1)[0] == command)
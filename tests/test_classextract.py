@@ -1,8 +1,36 @@
 import unittest
 from unittest.mock import patch, mock_open
 from io import StringIO
+import os
+import csv
 import sys
-from scripts.classextract import extract_class_text_from_files
+import sqlite3
+import json
+import tempfile
+import zipfile
+from scripts.classextract import (
+    extract_class_text_from_files,
+    find_class_paragraphs,
+    main,
+    find_matches,
+    iter_records,
+    parse_selectors,
+    Record,
+    Selector,
+    SelectorError
+)
+from scripts.doccache import DocumentCache
+
+XHTML_CONTENT = """<?xml version="1.0" encoding="utf-8"?>
+<html xmlns="http://www.w3.org/1999/xhtml">
+<body>
+    <p class="myclass">Text with <b> bold </b>&#160;and <!-- comment --><i>italic</i>.</p>
+    <div><p class="other myclass">Second</p><p class="otherclass">Skipped</p></div>
+    <p class="myclass"></p>
+    <p class="myclass">Outer <span><p class="myclass">Inner</p></span> tail</p>
+</body>
+</html>
+"""
 
 class TestClassExtract(unittest.TestCase):
     def setUp(self):
@@ -106,5 +134,234 @@ File: mock_file2.html
             extract_class_text_from_files("myclass", ["non_existent.html"])
         self.assertEqual(sys.stdout.getvalue().strip(), expected_output.strip())
 
+    def write_temp(self, content):
+        tmp = tempfile.NamedTemporaryFile('w', suffix='.xhtml', delete=False, encoding='utf-8')
+        with tmp:
+            tmp.write(content)
+        self.addCleanup(os.remove, tmp.name)
+        return tmp.name
+
+    def test_lxml_backend_matches_bs4(self):
+        """Test both parser backends extract identical paragraphs."""
+        path = self.write_temp(XHTML_CONTENT)
+        expected = find_class_paragraphs(path, "myclass", parser="bs4")
+        self.assertEqual(expected[:2], ["Text withboldanditalic.", "Second"])
+        self.assertEqual(find_class_paragraphs(path, "myclass", parser="lxml"), expected)
+
+    def test_lxml_backend_matches_bs4_on_special_text(self):
+        """Test both backends agree on CDATA, script, style and template text."""
+        fixtures = [
+            '<p class="x">a<![CDATA[ zz ]]>b</p>',
+            '<p class="x">a<script>var x=1;</script>b</p>',
+            '<p class="x">a<style>p{}</style>b<template>t<i class="x">u</i></template>c</p>',
+            '<div class="x">a<p class="x">q<script>s</script></p><!-- c -->d</div>',
+            '<script class="x">s</script><style class="x">p{}</style>',
+        ]
+        for fixture in fixtures:
+            path = self.write_temp('<html xmlns="http://www.w3.org/1999/xhtml"><body>'
+                                   + fixture + '</body></html>')
+            selectors = parse_selectors(".x")
+            self.assertEqual(find_matches(path, selectors, "lxml"),
+                             find_matches(path, selectors, "bs4"), fixture)
+        self.assertEqual([text for _, text, _ in find_matches(path, selectors, "lxml")],
+                         ["s", "p{}"])
+
+    def test_lxml_backend_falls_back(self):
+        """Test malformed XHTML falls back to the BeautifulSoup backend."""
+        path = self.write_temp('<p class="myclass">Unclosed <br> tag</p>')
+        self.assertEqual(find_class_paragraphs(path, "myclass", parser="lxml"), ["Unclosedtag"])
+
+    def test_lxml_file_not_found(self):
+        extract_class_text_from_files("myclass", ["non_existent.html"], parser="lxml")
+        self.assertEqual(sys.stdout.getvalue().strip(), "Error: File not found - non_existent.html")
+
+    def test_parallel_jobs_keep_order(self):
+        """Test --jobs output matches serial output, in argument order."""
+        files = [self.write_temp(f'<p class="myclass">File {i}</p>') for i in range(5)]
+        files.insert(2, "non_existent.html")
+        extract_class_text_from_files("myclass", files)
+        serial = sys.stdout.getvalue()
+        sys.stdout = StringIO()
+        extract_class_text_from_files("myclass", files, jobs=2, chunk_size=2)
+        self.assertEqual(sys.stdout.getvalue(), serial)
+        self.assertIn("Error: File not found - non_existent.html", serial)
+
+    def write_epub(self):
+        path = self.write_temp('')
+        epub_path = path + '.epub'
+        self.addCleanup(os.remove, epub_path)
+        with zipfile.ZipFile(epub_path, 'w') as epub:
+            epub.writestr('mimetype', 'application/epub+zip')
+            epub.writestr('META-INF/container.xml', """<?xml version="1.0"?>
+<container version="1.0" xmlns="urn:oasis:names:tc:opendocument:xmlns:container">
+  <rootfiles><rootfile full-path="OEBPS/content.opf" media-type="application/oebps-package+xml"/></rootfiles>
+</container>""")
+            epub.writestr('OEBPS/content.opf', """<?xml version="1.0"?>
+<package xmlns="http://www.idpf.org/2007/opf" version="3.0">
+  <manifest>
+    <item id="c1" href="text/b%20chapter.xhtml" media-type="application/xhtml+xml"/>
+    <item id="c2" href="text/a.xhtml" media-type="application/xhtml+xml"/>
+    <item id="css" href="style.css" media-type="text/css"/>
+  </manifest>
+  <spine><itemref idref="c1"/><itemref idref="c2"/></spine>
+</package>""")
+            epub.writestr('OEBPS/text/b chapter.xhtml', '<html><body><p class="myclass">First</p></body></html>')
+            epub.writestr('OEBPS/text/a.xhtml', '<html><body><p class="myclass">Second</p></body></html>')
+        return epub_path
+
+    def test_epub_spine_order(self):
+        """Test EPUB documents are read in spine order without extracting."""
+        epub_path = self.write_epub()
+        for parser in ("bs4", "lxml"):
+            sys.stdout = StringIO()
+            extract_class_text_from_files("myclass", [epub_path], parser=parser)
+            lines = [line.strip() for line in sys.stdout.getvalue().splitlines() if line.strip()]
+            self.assertEqual(lines, [f"File: {epub_path}!/OEBPS/text/b chapter.xhtml",
+                                     "Paragraph 1: First",
+                                     f"File: {epub_path}!/OEBPS/text/a.xhtml",
+                                     "Paragraph 1: Second"])
+
+    def test_archives_closed_after_run(self):
+        """Test an archive's members share one open ZipFile, closed when the run ends."""
+        epub_path = self.write_epub()
+        opened = []
+        zip_file = zipfile.ZipFile
+
+        def open_zip(*args, **kwargs):
+            opened.append(zip_file(*args, **kwargs))
+            return opened[-1]
+
+        for parser in ("bs4", "lxml"):
+            opened.clear()
+            with patch("scripts.classextract.zipfile.ZipFile", side_effect=open_zip):
+                records = list(iter_records("myclass", [epub_path], parser=parser))
+            self.assertEqual([record.text for record in records], ["First", "Second"])
+            # One for the spine, one for reading the members.
+            self.assertEqual(len(opened), 2)
+            self.assertTrue(all(zipf.fp is None for zipf in opened))
+
+    def test_zip_without_opf(self):
+        """Test a plain ZIP yields its XHTML members sorted by name."""
+        zip_path = self.write_temp('') + '.zip'
+        self.addCleanup(os.remove, zip_path)
+        with zipfile.ZipFile(zip_path, 'w') as zipf:
+            zipf.writestr('b.xhtml', '<p class="myclass">B</p>')
+            zipf.writestr('a.html', '<p class="myclass">A</p>')
+            zipf.writestr('notes.txt', 'ignored')
+        extract_class_text_from_files("myclass", [zip_path], jobs=2)
+        output = sys.stdout.getvalue()
+        self.assertLess(output.index("Paragraph 1: A"), output.index("Paragraph 1: B"))
+        self.assertNotIn("notes.txt", output)
+
+    def test_missing_epub(self):
+        extract_class_text_from_files("myclass", ["missing.epub"])
+        self.assertEqual(sys.stdout.getvalue().strip(), "Error: File not found - missing.epub")
+
+    def test_parse_selectors(self):
+        self.assertEqual(parse_selectors("x05-Head-A, h2.title, .caption, div.a.b, *"), [
+            Selector("x05-Head-A", "p", ("x05-Head-A",)),
+            Selector("h2.title", "h2", ("title",)),
+            Selector(".caption", None, ("caption",)),
+            Selector("div.a.b", "div", ("a", "b")),
+            Selector("*", None, ()),
+        ])
+        with self.assertRaises(SelectorError):
+            parse_selectors("div > p.x")
+        with self.assertRaises(SelectorError):
+            parse_selectors(" , ")
+
+    def test_multiple_selectors_one_pass(self):
+        """Test several selectors are matched together and tagged, on both backends."""
+        path = self.write_temp("""<html xmlns="http://www.w3.org/1999/xhtml"><body>
+            <h2 class="title">Heading</h2>
+            <p class="body">Body text</p>
+            <p class="caption body">Caption</p>
+            <div class="a b">Both</div><div class="a">Only a</div>
+        </body></html>""")
+        selectors = parse_selectors("h2.title, p.caption, body, div.a.b")
+        expected = [("h2.title", "Heading", 2), ("body", "Body text", 3),
+                    ("p.caption", "Caption", 4), ("div.a.b", "Both", 5)]
+        self.assertEqual(find_matches(path, selectors, "bs4"), expected)
+        self.assertEqual(find_matches(path, selectors, "lxml"), expected)
+
+        extract_class_text_from_files("h2.title, p.caption", [path])
+        lines = [line.strip() for line in sys.stdout.getvalue().splitlines() if line.strip()]
+        self.assertEqual(lines[1:], ["Paragraph 1 [h2.title]: Heading",
+                                     "Paragraph 2 [p.caption]: Caption"])
+
+    def test_document_cache(self):
+        """Test cached documents answer queries for any class without parsing."""
+        path = self.write_temp(XHTML_CONTENT)
+        cache = DocumentCache(os.path.join(os.path.dirname(path), os.path.basename(path) + '.db'))
+        self.addCleanup(os.remove, cache.path)
+        self.addCleanup(cache.close)
+        for parser in ("bs4", "lxml"):
+            selectors = parse_selectors("myclass")
+            expected = find_matches(path, selectors, parser)
+            self.assertEqual(find_matches(path, selectors, parser, cache), expected)
+            with patch("scripts.classextract._parse") as mock_parse:
+                self.assertEqual(find_matches(path, selectors, parser, cache), expected)
+                self.assertEqual(find_matches(path, parse_selectors("otherclass"), parser, cache),
+                                 [("otherclass", "Skipped", 5)])
+            mock_parse.assert_not_called()
+
+        # A changed file is parsed again.
+        with open(path, 'a', encoding='utf-8') as f:
+            f.write('<!-- changed -->')
+        os.utime(path, ns=(0, 0))
+        with patch("scripts.classextract._parse", return_value=[]) as mock_parse:
+            find_matches(path, parse_selectors("myclass"), "bs4", cache)
+        mock_parse.assert_called_once()
+
+    def test_cache_hits_update_last_used(self):
+        """Test a CLI run that hits the cache records the hit, with and without --jobs."""
+        path = self.write_temp(XHTML_CONTENT)
+        cache_path = path + '.db'
+        self.addCleanup(os.remove, cache_path)
+
+        def last_used():
+            conn = sqlite3.connect(cache_path)
+            try:
+                return conn.execute("SELECT last_used FROM documents").fetchone()[0]
+            finally:
+                conn.close()
+
+        for jobs in ("1", "2"):
+            argv = ["classextract.py", "myclass", path, "--cache", cache_path, "--jobs", jobs]
+            with patch("sys.argv", argv):
+                main()
+                before = last_used()
+                main()
+            self.assertGreater(last_used(), before)
+
+    def test_structured_output(self):
+        """Test records stream as JSONL and CSV, with errors kept out of the output."""
+        path = self.write_temp(XHTML_CONTENT)
+        missing = os.path.join(os.path.dirname(path), "missing.xhtml")
+        errors = []
+        records = list(iter_records("myclass", [path, missing],
+                                    on_error=lambda f, message: errors.append(f)))
+        self.assertEqual(records, [
+            Record(path, 1, "myclass", "Text withboldanditalic.", 4),
+            Record(path, 2, "myclass", "Second", 5),
+            Record(path, 3, "myclass", "", 6),
+            Record(path, 4, "myclass", "OuterInnertail", 7),
+            Record(path, 5, "myclass", "Inner", 7),
+        ])
+        self.assertEqual(errors, [missing])
+
+        with patch("sys.stderr", new_callable=StringIO) as stderr:
+            extract_class_text_from_files("myclass", [path, missing], output_format="jsonl")
+        rows = [json.loads(line) for line in sys.stdout.getvalue().splitlines()]
+        self.assertEqual(rows, [record._asdict() for record in records])
+        self.assertIn("File not found", stderr.getvalue())
+
+        output = StringIO()
+        extract_class_text_from_files("myclass", [path], "lxml", output_format="csv",
+                                      stream=output)
+        rows = list(csv.reader(StringIO(output.getvalue())))
+        self.assertEqual(rows[0], list(Record._fields))
+        self.assertEqual(rows[1:], [[str(field) for field in record] for record in records])
+
 if __name__ == '__main__':
     unittest.main()
@@ -0,0 +1,67 @@
+import os
+import sqlite3
+import unittest
+import tempfile
+from scripts.doccache import DocumentCache
+
+
+class TestDocumentCache(unittest.TestCase):
+
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.cache_path = os.path.join(self.tmp.name, 'documents.db')
+
+    def tearDown(self):
+        self.tmp.cleanup()
+
+    def test_roundtrip(self):
+        """Test indexes persist across cache instances."""
+        index = [['p', 'myclass', 'Text'], ['h2', 'title', 'Heading']]
+        with DocumentCache(self.cache_path) as cache:
+            self.assertIsNone(cache.get('doc'))
+            cache.put('doc', index)
+        with DocumentCache(self.cache_path) as cache:
+            self.assertEqual(cache.get('doc'), index)
+
+    def test_lru_eviction(self):
+        """Test least recently used indexes are evicted past the size bound."""
+        index = [['p', 'c', os.urandom(64).hex()]]
+        with DocumentCache(self.cache_path, max_bytes=10 ** 6) as cache:
+            cache.put('probe', index)
+            entry_size = cache.total_bytes()
+        with DocumentCache(self.cache_path, max_bytes=entry_size * 2) as cache:
+            cache.put('a', index)
+            cache.put('b', index)
+            # 'probe' is oldest and 'a' was just used, so 'b' would be evicted next.
+            self.assertIsNone(cache.get('probe'))
+            self.assertIsNotNone(cache.get('a'))
+            cache.put('c', index)
+            self.assertIsNone(cache.get('b'))
+            self.assertIsNotNone(cache.get('a'))
+            self.assertIsNotNone(cache.get('c'))
+            self.assertLessEqual(cache.total_bytes(), entry_size * 2)
+
+    def test_total_and_pending_hits(self):
+        """Test the running total tracks replaces and hits are written on close."""
+        with DocumentCache(self.cache_path) as cache:
+            cache.put('a', [['p', 'c', 'short']])
+            cache.put('b', [['p', 'c', 'short']])
+            cache.put('a', [['p', 'c', os.urandom(64).hex()]])
+            self.assertEqual(cache.total_bytes(), self.sum_sizes())
+            used = self.last_used('b')
+            cache.get('b')
+            # The hit is pending, not committed.
+            self.assertEqual(self.last_used('b'), used)
+        self.assertGreater(self.last_used('b'), used)
+
+    def sum_sizes(self):
+        with sqlite3.connect(self.cache_path) as conn:
+            return conn.execute("SELECT SUM(size) FROM documents").fetchone()[0]
+
+    def last_used(self, key):
+        with sqlite3.connect(self.cache_path) as conn:
+            return conn.execute("SELECT last_used FROM documents WHERE key = ?", (key,)).fetchone()[0]
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,58 @@
+import os
+import unittest
+import tempfile
+from scripts.hashcache import HashCache, stat_key
+
+
+class TestHashCache(unittest.TestCase):
+
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.cache_path = os.path.join(self.tmp.name, 'cache.db')
+        self.file_path = os.path.join(self.tmp.name, 'file.txt')
+        with open(self.file_path, 'w') as f:
+            f.write('Hello, World!')
+
+    def tearDown(self):
+        self.tmp.cleanup()
+
+    def test_digest_roundtrip(self):
+        """Test digests persist across cache instances."""
+        key = stat_key(self.file_path)
+        with HashCache(self.cache_path) as cache:
+            cache.put_digest('/root', 'file.txt', 'crc32', key, 'deadbeef')
+        with HashCache(self.cache_path) as cache:
+            self.assertEqual(cache.get_digest('/root', 'file.txt', 'crc32', key), 'deadbeef')
+            self.assertIsNone(cache.get_digest('/root', 'file.txt', 'md5', key))
+
+    def test_stale_digest(self):
+        """Test a changed size, mtime or inode invalidates the digest."""
+        key = stat_key(self.file_path)
+        with HashCache(self.cache_path) as cache:
+            cache.put_digest('/root', 'file.txt', 'crc32', key, 'deadbeef')
+            changed = (key[0], key[1] + 1, key[2])
+            self.assertIsNone(cache.get_digest('/root', 'file.txt', 'crc32', changed))
+
+    def test_zip_listing_roundtrip(self):
+        """Test archive listings are returned only while unchanged."""
+        listing = {'file1.txt': (13, 0xdeadbeef), 'folder/file2.txt': (12, 1)}
+        with HashCache(self.cache_path) as cache:
+            cache.put_zip_listing('/a.zip', (100, 5, 7), listing)
+            self.assertEqual(cache.get_zip_listing('/a.zip', (100, 5, 7)), listing)
+            self.assertIsNone(cache.get_zip_listing('/a.zip', (101, 5, 7)))
+            self.assertIsNone(cache.get_zip_listing('/b.zip', (100, 5, 7)))
+
+    def test_zip_listing_streams(self):
+        """Test listings stream in name order and a partly recorded one is not stored."""
+        entries = [('b.txt', 2, 20), ('a.txt', 1, 10), ('c/d.txt', 3, 30)]
+        with HashCache(self.cache_path) as cache:
+            recorded = cache.record_zip_listing('/a.zip', (100, 5, 7), iter(entries))
+            self.assertEqual(next(recorded), entries[0])
+            self.assertIsNone(cache.iter_zip_listing('/a.zip', (100, 5, 7)))
+            self.assertEqual(list(cache.record_zip_listing('/a.zip', (100, 5, 7), entries)),
+                             entries)
+            self.assertEqual(list(cache.iter_zip_listing('/a.zip', (100, 5, 7))), sorted(entries))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,58 @@
+import os
+import unittest
+import tempfile
+from datetime import datetime, timedelta, timezone
+from scripts.messagestore import MessageStore
+
+
+class TestMessageStore(unittest.TestCase):
+
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.store_path = os.path.join(self.tmp.name, 'messages.db')
+        self.now = datetime(2025, 3, 12, 11, 55, tzinfo=timezone.utc)
+
+    def tearDown(self):
+        self.tmp.cleanup()
+
+    def test_roundtrip(self):
+        """Test sync state and messages persist, newest first."""
+        with MessageStore(self.store_path) as store:
+            self.assertIsNone(store.sync_state('BirdAlert'))
+            store.reset('BirdAlert', 7)
+            store.put_messages('BirdAlert', [(3, self.now - timedelta(days=2), b'old'),
+                                             (5, self.now, b'new')])
+        with MessageStore(self.store_path) as store:
+            self.assertEqual(store.sync_state('BirdAlert'), (7, 5))
+            self.assertEqual(list(store.iter_messages('BirdAlert')),
+                             [('BirdAlert', 5, self.now, b'new'),
+                              ('BirdAlert', 3, self.now - timedelta(days=2), b'old')])
+            since = self.now - timedelta(days=1)
+            self.assertEqual([m[1] for m in store.iter_messages(since=since)], [5])
+            self.assertEqual([m[1] for m in store.iter_messages(limit=1)], [5])
+
+    def test_reset_forgets_messages(self):
+        """Test a new UIDVALIDITY drops the mailbox's old messages."""
+        with MessageStore(self.store_path) as store:
+            store.reset('BirdAlert', 7)
+            store.put_messages('BirdAlert', [(5, self.now, b'new')])
+            store.reset('BirdAlert', 8)
+            self.assertEqual(store.sync_state('BirdAlert'), (8, 0))
+            self.assertEqual(list(store.iter_messages()), [])
+
+    def test_sync_state_with_last_batch(self):
+        """Test sync state given with a batch is recorded in the same transaction."""
+        with MessageStore(self.store_path) as store:
+            store.put_messages('BirdAlert', [(3, self.now, b'first')])
+            self.assertIsNone(store.sync_state('BirdAlert'))
+            store.put_messages('BirdAlert', [(5, self.now, b'last')], (7, 9))
+            self.assertEqual(store.sync_state('BirdAlert'), (7, 9))
+            store.put_messages('Empty', [], (7, 4))
+            self.assertEqual(store.sync_state('Empty'), (7, 4))
+            store.forget('BirdAlert')
+            self.assertIsNone(store.sync_state('BirdAlert'))
+            self.assertEqual(list(store.iter_messages('BirdAlert')), [])
+
+
+if __name__ == '__main__':
+    unittest.main()
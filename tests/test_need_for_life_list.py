@@ -0,0 +1,96 @@
+import time
+import unittest
+from datetime import datetime, timedelta, timezone
+from email.message import EmailMessage
+from io import StringIO
+from unittest.mock import patch
+
+from scripts.need_for_life_list import STAGES, main, run_pipeline
+from scripts.need_for_life_list_fetch import Account, Mailbox
+from scripts.need_for_life_list_parse import (
+    apply_filters,
+    county_predicate,
+    min_count_predicate,
+    parse_ebird_alert_text,
+    reported_since_predicate,
+)
+from tests.fakeimap import FakeIMAPServer, FakeMessage
+from tests.test_need_for_life_list_parse import alert_text
+
+
+def alert_messages():
+    """The test alert split into one email per record, newest email first."""
+    blocks = alert_text().split("\n\n")[1:]
+    now = datetime.now(timezone.utc)
+    messages = []
+    for n, block in enumerate(blocks):
+        msg = EmailMessage()
+        msg["From"] = "ebird-alert@example.org"
+        msg["Subject"] = f"Alert {n}"
+        msg.set_content(block + "\n")
+        messages.append(FakeMessage(msg.as_bytes(), now - timedelta(hours=len(blocks) - n)))
+    return messages
+
+
+def predicates():
+    return [county_predicate(["Larimer", "Boulder", "Adams"]), min_count_predicate(5),
+            reported_since_predicate(50)]
+
+
+class TestPipeline(unittest.TestCase):
+    def account(self, server):
+        return Account("user", "password", server.host, server.port, ssl=False)
+
+    def test_matches_fetch_then_parse(self):
+        expected_counts = [0, 0, 0]
+        expected = list(apply_filters(parse_ebird_alert_text(alert_text()), predicates(),
+                                      expected_counts))
+        with FakeIMAPServer({"BirdAlert": alert_messages()}) as server:
+            result = run_pipeline([Mailbox(self.account(server), "BirdAlert")], predicates())
+        self.assertEqual(result.emails, 5)
+        self.assertEqual(result.total, 5)
+        self.assertEqual(result.counts, expected_counts)
+        self.assertEqual(sorted(result.matches), sorted(expected))
+        self.assertEqual(list(result.timings), list(STAGES))
+        self.assertGreaterEqual(result.timings["total"], result.timings["fetch"])
+
+    def test_parsing_overlaps_fetching(self):
+        """Test fast mailboxes are parsed while a slow one is still fetching."""
+        delay = 0.2
+        found = []
+
+        def slow_match(rec):
+            time.sleep(delay)
+            found.append(rec)
+
+        labels = ["BirdAlert", "Rare", "Local"]
+        with FakeIMAPServer({label: alert_messages() for label in labels}) as fast, \
+                FakeIMAPServer({"BirdAlert": alert_messages()}, delay=4 * delay) as slow:
+            mailboxes = ([Mailbox(self.account(fast), label) for label in labels]
+                         + [Mailbox(self.account(slow), "BirdAlert")])
+            result = run_pipeline(mailboxes, predicates(), queue_size=1, on_match=slow_match)
+        self.assertEqual(result.matches, [])
+        self.assertEqual(len(found), 8)
+        # The slow mailbox's two FETCHes take 8 delays and matching takes 8
+        # more; overlapped, only its own 2 matches follow the fetch.
+        self.assertGreaterEqual(result.timings["fetch"], 8 * delay)
+        self.assertLess(result.timings["total"], 13 * delay)
+
+    def test_main(self):
+        output = StringIO()
+        with FakeIMAPServer({"BirdAlert": alert_messages()}) as server, \
+                patch("scripts.need_for_life_list.env_mailboxes",
+                      lambda labels: [Mailbox(self.account(server), label) for label in labels]), \
+                patch("sys.stdout", output), \
+                patch("sys.argv", ["need_for_life_list.py", "--threshold", "6"]):
+            main()
+        lines = output.getvalue().splitlines()
+        self.assertEqual(lines[:2], ["Emails fetched: 5", "Total records parsed: 5"])
+        self.assertEqual([line for line in lines if " x" in line],
+                         ["Eurasian Wigeon (Mareca penelope) x7",
+                          "Snow Goose (Anser caerulescens) x40"])
+        self.assertEqual(lines[-len(STAGES) - 1], "Stage timings:")
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,341 @@
+import asyncio
+import email
+import imaplib
+import os
+import sys
+import tempfile
+import time
+import unittest
+from datetime import datetime, timedelta, timezone
+from email.message import EmailMessage
+from io import StringIO
+from unittest.mock import patch
+
+from scripts.messagestore import MessageStore
+from scripts.need_for_life_list_fetch import (
+    Account,
+    Mailbox,
+    fetch_birdalert_emails,
+    fetch_internal_dates,
+    fetch_mailboxes,
+    fetch_new_messages,
+    find_text_part,
+    fetch_raw_messages,
+    get_plain_text_body,
+    iter_fetch_items,
+    iter_mailbox_emails,
+    message_set,
+    sync_birdalert_emails,
+    sync_label,
+)
+from scripts.need_for_life_list_parse import read_store_text
+from tests.fakeimap import FakeIMAPServer, FakeMessage
+
+
+def make_message(n, internal_date):
+    msg = EmailMessage()
+    msg["From"] = "ebird-alert@example.org"
+    msg["Subject"] = f"Alert {n}"
+    msg.set_content(f"Sighting {n}\n")
+    return FakeMessage(msg.as_bytes(), internal_date)
+
+
+def make_large_message(n, internal_date):
+    """An alert with an HTML alternative and an attachment, like real eBird mail."""
+    msg = EmailMessage()
+    msg["From"] = "ebird-alert@example.org"
+    msg["Subject"] = f"Alert {n} – Colorado"
+    msg["Date"] = "Wed, 12 Mar 2025 11:55:00 -0600"
+    msg["X-Padding"] = "x" * 500
+    msg.set_content(f"Sighting {n} – Snow Goose (Anser caerulescens) (40)\n", cte="quoted-printable")
+    msg.add_alternative("<html><body>" + "<p>Sighting</p>" * 500 + "</body></html>", subtype="html")
+    msg.add_attachment(bytes(range(256)) * 100, maintype="application", subtype="pdf",
+                       filename="map.pdf")
+    return FakeMessage(msg.as_bytes(), internal_date)
+
+
+def make_mailbox(count, days=5):
+    now = datetime.now(timezone.utc).replace(microsecond=0)
+    # Older messages first, spread over the last few days.
+    return [make_message(n, now - timedelta(hours=(count - n) * days * 24 // count))
+            for n in range(1, count + 1)]
+
+
+class TestMessageSet(unittest.TestCase):
+    def test_ranges(self):
+        self.assertEqual(message_set([b"1", b"2", b"3", b"5", b"7", b"8"]), "1:3,5,7:8")
+        self.assertEqual(message_set([b"9", b"4"]), "4,9")
+        self.assertEqual(message_set([b"2", b"2"]), "2")
+
+
+class TestBatchedFetch(unittest.TestCase):
+    def setUp(self):
+        self.held, sys.stdout = sys.stdout, StringIO()
+
+    def tearDown(self):
+        sys.stdout = self.held
+
+    def connect(self, server):
+        mail = imaplib.IMAP4(server.host, server.port)
+        mail.login("user", "password")
+        return mail
+
+    def test_fetch_helpers(self):
+        mailbox = make_mailbox(6)
+        with FakeIMAPServer({"BirdAlert": mailbox}) as server:
+            mail = self.connect(server)
+            mail.select("BirdAlert", readonly=True)
+            dates = fetch_internal_dates(mail, [b"1", b"2", b"3", b"6"])
+            raw = fetch_raw_messages(mail, [b"2", b"6"])
+            mail.logout()
+        self.assertEqual(dates, [(str(n).encode(), mailbox[n - 1].internal_date)
+                                 for n in (1, 2, 3, 6)])
+        self.assertEqual(raw, {b"2": mailbox[1].raw, b"6": mailbox[5].raw})
+        self.assertIn("FETCH 1:3,6 (INTERNALDATE)", server.commands)
+
+    def test_round_trips_do_not_grow_with_label_size(self):
+        """Test one FETCH for dates and one for bodies, however many messages."""
+        for count in (3, 40):
+            with FakeIMAPServer({"BirdAlert": make_mailbox(count)}) as server:
+                sys.stdout = StringIO()
+                fetch_birdalert_emails(self.connect(server))
+            self.assertEqual(server.count("FETCH"), 2)
+            output = sys.stdout.getvalue()
+            self.assertIn(f"Total messages in 'BirdAlert' (last 10 days): {count}", output)
+            self.assertIn(f"looking at {min(count, 10)} emails", output)
+            # Newest first.
+            self.assertLess(output.index(f"Subject: Alert {count}"),
+                            output.index(f"Subject: Alert {count - 1}"))
+            self.assertIn(f"Text Content:\nSighting {count}", output)
+
+    def test_missing_label(self):
+        with FakeIMAPServer({}) as server:
+            fetch_birdalert_emails(self.connect(server))
+        self.assertIn("Could not select label 'BirdAlert'", sys.stdout.getvalue())
+
+
+class TestPartialFetch(unittest.TestCase):
+    def test_parse_fetch_items(self):
+        response = [(b'1 (UID 5 BODY[HEADER.FIELDS (FROM)] {6}', b'From:\n'),
+                    (b' BODY[1.1] {3}', b'abc'), b')',
+                    b'2 (BODYSTRUCTURE (("TEXT" "PLAIN" ("CHARSET" "utf-8") NIL NIL "BASE64" 4 1)'
+                    b'("TEXT" "PLAIN" ("NAME" "a.txt") NIL NIL "7BIT" 4 1) "MIXED" ("BOUNDARY" "x")))']
+        items = list(iter_fetch_items(response))
+        self.assertEqual(items[0], (b"1", {b"UID": b"5", b"BODY[HEADER.FIELDS (FROM)]": b"From:\n",
+                                          b"BODY[1.1]": b"abc"}))
+        structure = items[1][1][b"BODYSTRUCTURE"]
+        self.assertEqual(find_text_part(structure), ("1", "utf-8", "BASE64"))
+        self.assertIsNone(find_text_part(structure[1:]))
+
+    def test_partial_fetch_matches_full_fetch(self):
+        """Test partial fetches decode the same text from a fraction of the bytes."""
+        now = datetime.now(timezone.utc)
+        mailbox = [make_large_message(n, now) for n in range(1, 4)] + [make_message(4, now)]
+        transferred = {}
+        decoded = {}
+        for partial in (False, True):
+            with FakeIMAPServer({"BirdAlert": mailbox}) as server:
+                mail = imaplib.IMAP4(server.host, server.port)
+                mail.login("user", "password")
+                mail.select("BirdAlert", readonly=True)
+                server.bytes_sent = 0
+                raw = fetch_raw_messages(mail, [b"1", b"2", b"3", b"4"], partial)
+                transferred[partial] = server.bytes_sent
+                mail.logout()
+            decoded[partial] = {}
+            for msg_id, raw_email in raw.items():
+                msg = email.message_from_bytes(raw_email)
+                decoded[partial][msg_id] = (msg["From"], msg["Subject"], get_plain_text_body(msg))
+        self.assertEqual(decoded[True], decoded[False])
+        self.assertIn("Snow Goose", decoded[True][b"2"][2])
+        self.assertLess(transferred[True] * 10, transferred[False])
+        # One FETCH for BODYSTRUCTURE, one per distinct text section.
+        self.assertEqual(server.count("FETCH"), 3)
+
+
+class TestIncrementalSync(unittest.TestCase):
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.store_path = os.path.join(self.tmp.name, "messages.db")
+
+    def tearDown(self):
+        self.tmp.cleanup()
+
+    def sync(self, server):
+        mail = imaplib.IMAP4(server.host, server.port)
+        mail.login("user", "password")
+        with MessageStore(self.store_path) as store:
+            added = sync_label(mail, store)
+            uids = [message[1] for message in store.iter_messages("BirdAlert")]
+        mail.logout()
+        return added, uids
+
+    def test_only_new_uids_are_fetched(self):
+        mailbox = make_mailbox(4)
+        for i, message in enumerate(mailbox):
+            message.uid = 100 + i
+        with FakeIMAPServer({"BirdAlert": mailbox}) as server:
+            self.assertEqual(self.sync(server), (4, [103, 102, 101, 100]))
+        self.assertIn("UID FETCH 100:103 (UID INTERNALDATE RFC822)", server.commands)
+
+        # Nothing new: one small fetch, which only returns the last message.
+        with FakeIMAPServer({"BirdAlert": mailbox}) as server:
+            self.assertEqual(self.sync(server), (0, [103, 102, 101, 100]))
+        self.assertEqual(server.count("UID"), 1)
+        self.assertIn("UID FETCH 104:* (UID INTERNALDATE RFC822)", server.commands)
+
+        mailbox.append(make_message(5, mailbox[-1].internal_date + timedelta(minutes=1)))
+        mailbox[-1].uid = 110
+        with FakeIMAPServer({"BirdAlert": mailbox}) as server:
+            self.assertEqual(self.sync(server), (1, [110, 103, 102, 101, 100]))
+
+        # A new UIDVALIDITY means the old UIDs are meaningless: start again.
+        with FakeIMAPServer({"BirdAlert": mailbox[3:]}, uidvalidity=2) as server:
+            self.assertEqual(self.sync(server), (2, [110, 103]))
+
+    def test_empty_first_window_is_not_refetched(self):
+        """Test a first sync with nothing in the window still records the highest UID."""
+        old = datetime.now(timezone.utc) - timedelta(days=30)
+        mailbox = [make_message(n, old) for n in range(1, 51)]
+        for send_uidnext in (True, False):
+            self.store_path = os.path.join(self.tmp.name, f"uidnext-{send_uidnext}.db")
+            with FakeIMAPServer({"BirdAlert": mailbox}, send_uidnext=send_uidnext) as server:
+                self.assertEqual(self.sync(server), (0, []))
+                # Without UIDNEXT, UID SEARCH ALL finds the highest UID.
+                self.assertEqual(server.count("UID"), 1 if send_uidnext else 2)
+            with FakeIMAPServer({"BirdAlert": mailbox}, send_uidnext=send_uidnext) as server:
+                self.assertEqual(self.sync(server), (0, []))
+            self.assertEqual([line for line in server.commands if line.startswith("UID")],
+                             ["UID FETCH 51:* (UID INTERNALDATE RFC822)"])
+
+    def test_failed_first_window_is_resynced(self):
+        """Test a batch failing in the first window leaves nothing that skips the window."""
+        mailbox = make_mailbox(5)
+        calls = []
+
+        def failing_fetch(*args):
+            calls.append(args)
+            if len(calls) == 2:
+                raise imaplib.IMAP4.error("connection dropped")
+            return fetch_new_messages(*args)
+
+        with FakeIMAPServer({"BirdAlert": mailbox}) as server, \
+                patch("scripts.need_for_life_list_fetch.SYNC_BATCH_SIZE", 2), \
+                patch("scripts.need_for_life_list_fetch.fetch_new_messages", failing_fetch):
+            with self.assertRaises(imaplib.IMAP4.error):
+                self.sync(server)
+        with MessageStore(self.store_path) as store:
+            self.assertIsNone(store.sync_state("BirdAlert"))
+        with FakeIMAPServer({"BirdAlert": mailbox}) as server:
+            self.assertEqual(self.sync(server), (5, [5, 4, 3, 2, 1]))
+        with FakeIMAPServer({"BirdAlert": mailbox}) as server:
+            self.assertEqual(self.sync(server), (0, [5, 4, 3, 2, 1]))
+        self.assertIn("UID FETCH 6:* (UID INTERNALDATE RFC822)", server.commands)
+
+    def test_partial_sync(self):
+        now = datetime.now(timezone.utc).replace(microsecond=0)
+        with FakeIMAPServer({"BirdAlert": [make_large_message(1, now)]}) as server:
+            mail = imaplib.IMAP4(server.host, server.port)
+            mail.login("user", "password")
+            with MessageStore(self.store_path) as store:
+                self.assertEqual(sync_label(mail, store, partial=True), 1)
+            mail.logout()
+        self.assertIn("Snow Goose (Anser caerulescens) (40)", read_store_text(self.store_path))
+
+    def test_store_feeds_offline_parsing(self):
+        held, sys.stdout = sys.stdout, StringIO()
+        try:
+            with FakeIMAPServer({"BirdAlert": make_mailbox(3)}) as server:
+                mail = imaplib.IMAP4(server.host, server.port)
+                mail.login("user", "password")
+                sync_birdalert_emails(self.store_path, mail)
+            output = sys.stdout.getvalue()
+        finally:
+            sys.stdout = held
+        self.assertIn("Fetched 3 new messages from 'BirdAlert'", output)
+        self.assertIn("Subject: Alert 3", output)
+        self.assertEqual(read_store_text(self.store_path).split(),
+                         ["Sighting", "3", "Sighting", "2", "Sighting", "1"])
+
+
+class TestConcurrentFetch(unittest.TestCase):
+    def account(self, server, user="user"):
+        return Account(user, "password", server.host, server.port, ssl=False)
+
+    def test_mailboxes_fetched_concurrently(self):
+        """Test wall time follows the slowest mailbox, with connections reused."""
+        delay = 0.4
+        with FakeIMAPServer({"BirdAlert": make_mailbox(3), "Rare": make_mailbox(2)},
+                            delay=delay) as first, \
+                FakeIMAPServer({"BirdAlert": make_mailbox(4)}, delay=delay) as second:
+            mailboxes = [Mailbox(self.account(first), "BirdAlert"),
+                         Mailbox(self.account(first), "Rare"),
+                         Mailbox(self.account(second, "other"), "BirdAlert")]
+            start = time.perf_counter()
+            messages = fetch_mailboxes(mailboxes, connections_per_account=1)
+            elapsed = time.perf_counter() - start
+        # Each mailbox makes two FETCHes; the two on the first account share
+        # one connection, so four delays run back to back there.
+        self.assertLess(elapsed, 6 * delay)
+        self.assertEqual(first.count("LOGIN"), 1)
+        self.assertEqual(sorted((m.user, m.label, m.subject) for m in messages),
+                         [("other", "BirdAlert", f"Alert {n}") for n in range(1, 5)]
+                         + [("user", "BirdAlert", f"Alert {n}") for n in range(1, 4)]
+                         + [("user", "Rare", f"Alert {n}") for n in range(1, 3)])
+
+        with FakeIMAPServer({"BirdAlert": make_mailbox(3)}, delay=delay) as server:
+            mailboxes = [Mailbox(self.account(server, f"user{n}"), "BirdAlert")
+                         for n in range(4)]
+            start = time.perf_counter()
+            messages = fetch_mailboxes(mailboxes, concurrency=4)
+            elapsed = time.perf_counter() - start
+        self.assertEqual(len(messages), 12)
+        self.assertLess(elapsed, 4 * delay)
+
+    def test_errors_and_timeouts_skip_mailbox(self):
+        errors = []
+        with FakeIMAPServer({"BirdAlert": make_mailbox(2)}) as fast, \
+                FakeIMAPServer({"BirdAlert": make_mailbox(2)}, delay=2) as slow:
+            mailboxes = [Mailbox(self.account(fast), "BirdAlert"),
+                         Mailbox(self.account(fast), "Missing"),
+                         Mailbox(self.account(slow), "BirdAlert")]
+            messages = fetch_mailboxes(mailboxes, timeout=0.5,
+                                       on_error=lambda mailbox, message: errors.append(mailbox))
+        self.assertEqual([m.subject for m in messages], ["Alert 2", "Alert 1"])
+        self.assertEqual(errors, mailboxes[1:])
+
+    def test_full_queue_pauses_fetching(self):
+        """Test a bounded queue keeps a slow consumer from letting every mailbox be fetched."""
+        async def first_then_wait(mailboxes):
+            messages = iter_mailbox_emails(mailboxes, concurrency=1, queue_size=1)
+            try:
+                first = await messages.__anext__()
+                await asyncio.sleep(0.3)
+                return first
+            finally:
+                await messages.aclose()
+
+        with FakeIMAPServer({"BirdAlert": make_mailbox(3), "Rare": make_mailbox(3)}) as server:
+            mailboxes = [Mailbox(self.account(server), label) for label in ("BirdAlert", "Rare")]
+            first = asyncio.run(first_then_wait(mailboxes))
+        self.assertEqual(first.label, "BirdAlert")
+        self.assertEqual(server.count("EXAMINE") + server.count("SELECT"), 1)
+
+    def test_decode_error_skips_mailbox(self):
+        """Test a message that cannot be decoded is reported without losing other mailboxes."""
+        bad = make_message(1, datetime.now(timezone.utc))
+        bad.raw = bad.raw.replace(b"Subject: Alert 1", b"Subject: =?x-unknown?q?Alert?=")
+        errors = []
+        with FakeIMAPServer({"Bad": [bad]}) as fast, \
+                FakeIMAPServer({"BirdAlert": make_mailbox(2)}, delay=0.3) as slow:
+            mailboxes = [Mailbox(self.account(fast), "Bad"),
+                         Mailbox(self.account(slow), "BirdAlert")]
+            messages = fetch_mailboxes(mailboxes,
+                                       on_error=lambda mailbox, message: errors.append(message))
+        self.assertEqual([m.subject for m in messages], ["Alert 2", "Alert 1"])
+        self.assertEqual(len(errors), 1)
+        self.assertIn("'Bad'", errors[0])
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,201 @@
+import os
+import re
+import tempfile
+import unittest
+from datetime import datetime, timedelta
+from io import StringIO
+from unittest.mock import patch
+
+from scripts.need_for_life_list_parse import (
+    apply_filters,
+    county_predicate,
+    filter_records_by_after_days_ago,
+    filter_records_by_county,
+    filter_records_by_species_count,
+    iter_sightings,
+    main,
+    min_count_predicate,
+    parse_ebird_alert_text,
+    parse_reported_date,
+    reported_since_predicate,
+    SightingBatch,
+)
+
+
+def reported(days_ago):
+    when = datetime.now() - timedelta(days=days_ago)
+    return f"{when:%b} {when.day}, {when:%Y %H:%M}"
+
+
+def alert_text():
+    return f"""eBird Rare Bird Alert for Colorado
+
+Snow Goose (Anser caerulescens) (40)
+- Reported {reported(3)} by Jane Doe
+- Fossil Creek Reservoir, Larimer, Colorado
+- Checklist: https://ebird.org/checklist/S1
+
+Snow Goose (Anser caerulescens) (2)
+- Reported {reported(4)} by Jane Doe
+- Union Reservoir, Weld, Colorado
+
+Tundra Swan (Cygnus columbianus) (12)
+- Reported {reported(90)} by John Roe
+- Barr Lake, Adams, Colorado
+
+Long-tailed Duck (Clangula hyemalis) (6)
+- Reported {reported(1)} by John Roe
+- Pueblo Reservoir, Pueblo, Colorado
+
+Eurasian Wigeon (Mareca penelope) (7)
+- Reported {reported(10)} by Sam Poe
+- Sawhill Ponds, Boulder, Colorado
+"""
+
+
+class TestFilters(unittest.TestCase):
+    def setUp(self):
+        self.records = parse_ebird_alert_text(alert_text())
+
+    def test_parse(self):
+        self.assertEqual([(r['species'], r['count']) for r in self.records],
+                         [("Snow Goose", 40), ("Snow Goose", 2), ("Tundra Swan", 12),
+                          ("Long-tailed Duck", 6), ("Eurasian Wigeon", 7)])
+        self.assertEqual(self.records[0]['scientific_name'], "Anser caerulescens")
+        self.assertEqual(len(self.records[0]['lines']), 3)
+
+    def test_fields_extracted_at_parse_time(self):
+        goose = self.records[0]
+        self.assertEqual((goose.location, goose.county, goose.observer, goose.checklist),
+                         ("Fossil Creek Reservoir", "Larimer", "Jane Doe",
+                          "https://ebird.org/checklist/S1"))
+        self.assertEqual(goose.reported.date(), (datetime.now() - timedelta(days=3)).date())
+        self.assertIsNone(self.records[1].checklist)
+        # Dict-style access still works.
+        self.assertEqual(goose['species'], "Snow Goose")
+        self.assertEqual(goose['lines'][1], "- Fossil Creek Reservoir, Larimer, Colorado")
+
+    def test_batch_matches_predicates(self):
+        batch = SightingBatch(self.records)
+        counties = ["Larimer", "Boulder", "Adams"]
+        mask = batch.filter(counties, 5, 50)
+        predicates = [county_predicate(counties), min_count_predicate(5),
+                      reported_since_predicate(50)]
+        self.assertEqual(batch.select(mask), list(apply_filters(self.records, predicates)))
+        self.assertEqual(batch.total_by_species(), {"Snow Goose": 42, "Tundra Swan": 12,
+                                                    "Long-tailed Duck": 6, "Eurasian Wigeon": 7})
+        self.assertEqual(batch.total_by_species(mask), {"Snow Goose": 40, "Eurasian Wigeon": 7})
+        self.assertEqual(batch.sightings_by_county(batch.county_mask(["Weld", "Larimer"])),
+                         {"Larimer": 1, "Weld": 1})
+
+    def test_parse_reported_date(self):
+        self.assertEqual(parse_reported_date("- Reported Mar 12, 2025 11:55 by Jane Doe"),
+                         datetime(2025, 3, 12, 11, 55))
+        with patch("sys.stdout", new_callable=StringIO):
+            self.assertIsNone(parse_reported_date("- Reported Foo 12, 2025 11:55"))
+            self.assertIsNone(parse_reported_date("- Seen yesterday"))
+
+    def test_single_pass_matches_chained_filters(self):
+        counties = ["Larimer", "Boulder", "Adams"]
+        chained = filter_records_by_after_days_ago(
+            filter_records_by_species_count(filter_records_by_county(self.records, counties), 5), 50)
+        predicates = [county_predicate(counties), min_count_predicate(5),
+                      reported_since_predicate(50)]
+        counts = [0, 0, 0]
+        fused = list(apply_filters(self.records, predicates, counts))
+        self.assertEqual(fused, chained)
+        self.assertEqual([r['species'] for r in fused], ["Snow Goose", "Eurasian Wigeon"])
+        self.assertEqual(counts, [3, 3, 2])
+
+    def test_county_predicate(self):
+        self.assertEqual(len(filter_records_by_county(self.records, ["Pueblo"])), 1)
+        self.assertEqual(filter_records_by_county(self.records, []), [])
+        # County names are matched literally.
+        self.assertEqual(filter_records_by_county(self.records, ["La.imer"]), [])
+
+    def test_county_match_differs_from_substring_search(self):
+        # The predicate used to search the location line for "<county>, Colorado".
+        # It now compares the parsed county field, which changes these cases.
+        def substring_match(record, county):
+            return re.search(re.escape(f"{county}, Colorado"), record.lines[1]) is not None
+
+        cases = [
+            # (location line, county, substring result, parsed-field result)
+            ("- Fossil Creek Reservoir, Larimer, Colorado", "Larimer", True, True),
+            ("- Fossil Creek Reservoir, Larimer County, Colorado", "Larimer", False, True),
+            ("- Fossil Creek Reservoir, Larimer,Colorado", "Larimer", False, True),
+            ("- Barr Lake, East Adams, Colorado", "Adams", True, False),
+            ("- Weld, Colorado Springs, Larimer, Colorado", "Weld", True, False),
+            ("- Fossil Creek Reservoir, Larimer, Wyoming", "Larimer", False, False),
+        ]
+        for line, county, old, new in cases:
+            with self.subTest(line=line):
+                (record,) = parse_ebird_alert_text(
+                    f"Snow Goose (Anser caerulescens) (40)\n- Reported {reported(3)} by Jane Doe\n{line}\n")
+                self.assertEqual(substring_match(record, county), old)
+                self.assertEqual(county_predicate([county])(record), new)
+
+    def test_iter_sightings_streams(self):
+        """Test records are yielded as each block ends, not after all input."""
+        lines = alert_text().splitlines(keepends=True)
+        consumed = []
+
+        def source():
+            for line in lines:
+                consumed.append(line)
+                yield line
+
+        sightings = iter_sightings(source())
+        first = next(sightings)
+        self.assertEqual(first.species, "Snow Goose")
+        self.assertLess(len(consumed), 10)
+        self.assertEqual([first] + list(sightings), self.records)
+
+    def test_main_stream(self):
+        output = StringIO()
+        with patch("sys.stdin", StringIO(alert_text())), patch("sys.stdout", output), \
+                patch("sys.argv", ["need_for_life_list_parse.py", "--stream"]):
+            main()
+        lines = output.getvalue().splitlines()
+        # Matches come out in input order, before the totals.
+        self.assertEqual([line for line in lines if " x" in line],
+                         ["Snow Goose (Anser caerulescens) x40",
+                          "Eurasian Wigeon (Mareca penelope) x7"])
+        self.assertLess(lines.index("Eurasian Wigeon (Mareca penelope) x7"),
+                        lines.index("Total records parsed: 5"))
+
+    def test_main(self):
+        output = StringIO()
+        with patch("sys.stdin", StringIO(alert_text())), patch("sys.stdout", output), \
+                patch("sys.argv", ["need_for_life_list_parse.py", "--threshold", "6"]):
+            main()
+        lines = output.getvalue().splitlines()
+        self.assertEqual(lines[:2], ["Total records parsed: 5", "Filtered by counties: 4 records."])
+        self.assertIn("Filtered by species count (>=6 sightings): 3 records.", lines)
+        self.assertIn("Filtered by date: 2 records.", lines)
+        species = [line for line in lines if " x" in line]
+        self.assertEqual(species, ["Eurasian Wigeon (Mareca penelope) x7",
+                                   "Snow Goose (Anser caerulescens) x40"])
+
+    def run_main(self, *argv):
+        output = StringIO()
+        with patch("sys.stdin", StringIO(alert_text())), patch("sys.stdout", output), \
+                patch("sys.argv", ["need_for_life_list_parse.py", *argv]):
+            main()
+        return output.getvalue().splitlines()
+
+    def test_ingest_and_query_database(self):
+        with tempfile.TemporaryDirectory() as tmp:
+            db_path = os.path.join(tmp, "sightings.db")
+            self.assertIn("New sightings stored: 5 (0 duplicates).",
+                          self.run_main("--db", db_path, "--ingest"))
+            self.assertIn("New sightings stored: 0 (5 duplicates).",
+                          self.run_main("--db", db_path, "--ingest"))
+            lines = self.run_main("--db", db_path, "--threshold", "6")
+        self.assertEqual(lines[0], f"Matching sightings in {db_path}: 2 records.")
+        self.assertEqual([line for line in lines if " x" in line],
+                         [line for line in self.run_main("--threshold", "6") if " x" in line])
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,107 @@
+import os
+import json
+import pstats
+import zipfile
+import tempfile
+import threading
+import unittest
+from io import StringIO
+from contextlib import redirect_stdout
+from unittest.mock import patch
+from scripts import profiling
+from scripts.need_for_life_list_parse import main as parse_main
+from scripts.zipcompare import main as zipcompare_main, EXIT_MATCH
+from tests.test_need_for_life_list_parse import alert_text
+
+
+class TestProfiling(unittest.TestCase):
+
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.report_path = os.path.join(self.tmp.name, 'report.json')
+
+    def tearDown(self):
+        self.tmp.cleanup()
+
+    def read_report(self):
+        with open(self.report_path, 'r', encoding='utf-8') as f:
+            return json.load(f)
+
+    def test_disabled_is_a_no_op(self):
+        items = [1, 2, 3]
+        self.assertIsNone(profiling.active())
+        self.assertIs(profiling.timed('items', items), items)
+        with profiling.stage('work'):
+            profiling.count('things')
+        with profiling.profiled(None) as profiler:
+            self.assertIsNone(profiler)
+            self.assertIsNone(profiling.active())
+
+    def test_stages_and_counters(self):
+        with profiling.profiled(self.report_path) as profiler:
+            self.assertIs(profiling.active(), profiler)
+            with profiling.stage('outer'):
+                for _ in range(3):
+                    with profiling.stage('inner'):
+                        profiling.count('bytes', 10)
+            self.assertEqual(list(profiling.timed('items', iter('abcd'))), list('abcd'))
+            threads = [threading.Thread(target=profiling.count, args=('threads',))
+                       for _ in range(4)]
+            for thread in threads:
+                thread.start()
+            for thread in threads:
+                thread.join()
+        self.assertIsNone(profiling.active())
+        report = self.read_report()
+        self.assertEqual(report['version'], profiling.REPORT_VERSION)
+        self.assertEqual({name: stage['calls'] for name, stage in report['stages'].items()},
+                         {'outer': 1, 'inner': 3, 'items': 1})
+        # Stage times are inclusive of nested stages.
+        self.assertGreaterEqual(report['stages']['outer']['seconds'],
+                                report['stages']['inner']['seconds'])
+        self.assertEqual(report['counters'], {'bytes': 30, 'items': 4, 'threads': 4})
+
+    def test_report_written_on_exit(self):
+        with self.assertRaises(SystemExit):
+            with profiling.profiled(self.report_path):
+                with profiling.stage('work'):
+                    raise SystemExit(1)
+        self.assertIn('work', self.read_report()['stages'])
+
+    def test_cprofile_dump(self):
+        path = os.path.join(self.tmp.name, 'run.prof')
+        with profiling.profiled(path):
+            sorted(range(1000), key=lambda n: -n)
+        self.assertGreater(pstats.Stats(path).total_calls, 0)
+
+    def test_zipcompare_profile(self):
+        zip_path = os.path.join(self.tmp.name, 'tree.zip')
+        dir_path = os.path.join(self.tmp.name, 'tree')
+        os.makedirs(dir_path)
+        with zipfile.ZipFile(zip_path, 'w') as zipf:
+            for name in ('a.txt', 'b.txt'):
+                zipf.writestr(name, 'Hello, World!')
+                with open(os.path.join(dir_path, name), 'w') as f:
+                    f.write('Hello, World!')
+        with redirect_stdout(StringIO()):
+            code = zipcompare_main([zip_path, dir_path, '--verify', '--profile', self.report_path])
+        self.assertEqual(code, EXIT_MATCH)
+        report = self.read_report()
+        self.assertTrue({'zip_entries', 'dir_entries', 'hash'} <= set(report['stages']))
+        self.assertEqual(report['stages']['hash']['calls'], 2)
+        self.assertEqual(report['counters']['dir_entries'], 2)
+        self.assertEqual(report['counters']['verified_bytes'], 26)
+
+    def test_parse_profile(self):
+        argv = ['need_for_life_list_parse.py', '--profile', self.report_path]
+        with patch('sys.stdin', StringIO(alert_text())), patch('sys.argv', argv), \
+                redirect_stdout(StringIO()):
+            parse_main()
+        report = self.read_report()
+        self.assertEqual(report['counters']['sightings'], 5)
+        self.assertEqual(report['counters']['matches'], 2)
+        self.assertIn('sort', report['stages'])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,71 @@
+import os
+import unittest
+import tempfile
+from scripts.scanner import (
+    scan_tree,
+    compile_filter,
+    ScannerError,
+    SYMLINKS_FOLLOW,
+    SYMLINKS_SKIP
+)
+
+
+class TestScanner(unittest.TestCase):
+
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.root = self.tmp.name
+        os.makedirs(os.path.join(self.root, 'folder', 'sub'))
+        os.makedirs(os.path.join(self.root, 'build'))
+        for rel_path, content in [('file1.txt', 'Hello, World!'),
+                                  ('folder/file2.txt', 'Another file'),
+                                  ('folder/sub/data.bin', 'xyz'),
+                                  ('build/out.txt', 'built')]:
+            with open(os.path.join(self.root, rel_path), 'w') as f:
+                f.write(content)
+
+    def tearDown(self):
+        self.tmp.cleanup()
+
+    def scan(self, **kwargs):
+        return {e.rel_path: e.stat.st_size for e in scan_tree(self.root, **kwargs)}
+
+    def test_scan_all_files(self):
+        """Test every file is found with its size and a '/'-separated path."""
+        self.assertEqual(self.scan(), {'file1.txt': 13, 'folder/file2.txt': 12,
+                                       'folder/sub/data.bin': 3, 'build/out.txt': 5})
+
+    def test_include_exclude(self):
+        """Test glob filters, including pruning of excluded directories."""
+        self.assertEqual(set(self.scan(include=['*.txt'], exclude=['build'])),
+                         {'file1.txt', 'folder/file2.txt'})
+        self.assertEqual(set(self.scan(exclude=['folder/sub'])),
+                         {'file1.txt', 'folder/file2.txt', 'build/out.txt'})
+
+    def test_compile_filter(self):
+        self.assertIsNone(compile_filter())
+        selected = compile_filter(include=['folder/*'], exclude=['*.bin'])
+        self.assertTrue(selected('folder/file2.txt'))
+        self.assertFalse(selected('folder/sub/data.bin'))
+        self.assertFalse(selected('file1.txt'))
+
+    @unittest.skipUnless(hasattr(os, 'symlink'), 'symlinks not supported')
+    def test_symlink_policies(self):
+        """Test file/dir symlinks under each policy, including a cycle."""
+        os.symlink(os.path.join(self.root, 'file1.txt'), os.path.join(self.root, 'link.txt'))
+        os.symlink(os.path.join(self.root, 'folder'), os.path.join(self.root, 'folder', 'sub', 'loop'))
+        default = self.scan()
+        self.assertIn('link.txt', default)
+        self.assertNotIn('folder/sub/loop/file2.txt', default)
+        self.assertNotIn('link.txt', self.scan(symlinks=SYMLINKS_SKIP))
+        followed = self.scan(symlinks=SYMLINKS_FOLLOW)
+        self.assertIn('link.txt', followed)
+        self.assertEqual(len(followed), 5)
+
+    def test_unknown_policy(self):
+        with self.assertRaises(ScannerError):
+            list(scan_tree(self.root, symlinks='sometimes'))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,72 @@
+import os
+import time
+import unittest
+import tempfile
+from datetime import datetime, timedelta
+from scripts.need_for_life_list_parse import Sighting, make_sighting
+from scripts.sightingstore import SightingStore
+
+
+def sighting(species, county, days_ago, count=10, checklist="S1", now=datetime(2025, 3, 12, 12, 0)):
+    reported = now - timedelta(days=days_ago)
+    lines = [f"- Reported {reported:%b} {reported.day}, {reported:%Y %H:%M} by Jane Doe",
+             f"- Some Pond, {county}, Colorado",
+             f"- Checklist: https://ebird.org/checklist/{checklist}"]
+    return make_sighting(species, "Genus species", count, lines)
+
+
+class TestSightingStore(unittest.TestCase):
+
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.db_path = os.path.join(self.tmp.name, 'sightings.db')
+        self.now = datetime(2025, 3, 12, 12, 0)
+
+    def tearDown(self):
+        self.tmp.cleanup()
+
+    def test_roundtrip_and_dedup(self):
+        """Test repeated sightings are stored once and read back unchanged."""
+        goose = sighting("Snow Goose", "Larimer", 3)
+        with SightingStore(self.db_path) as store:
+            self.assertEqual(store.add([goose, sighting("Snow Goose", "Larimer", 3)]), 1)
+            # Another checklist for the same bird is a separate sighting.
+            self.assertEqual(store.add([goose, sighting("Snow Goose", "Larimer", 3, checklist="S2")]), 1)
+        with SightingStore(self.db_path) as store:
+            self.assertEqual(len(store), 2)
+            self.assertEqual(Sighting._make(next(store.query())), goose)
+
+    def test_missing_fields_still_dedup(self):
+        bare = make_sighting("Snow Goose", "Anser caerulescens", 3, [])
+        with SightingStore(self.db_path) as store:
+            self.assertEqual(store.add([bare, bare]), 1)
+            self.assertEqual(Sighting._make(next(store.query())), bare)
+
+    def test_query(self):
+        with SightingStore(self.db_path) as store:
+            store.add([sighting("Tundra Swan", "Adams", 1, count=2, checklist="S1"),
+                       sighting("Snow Goose", "Larimer", 3, checklist="S2"),
+                       sighting("Eurasian Wigeon", "Boulder", 80, checklist="S3"),
+                       sighting("Cackling Goose", "Pueblo", 1, checklist="S4")])
+            since = self.now - timedelta(days=50)
+            found = [row[0] for row in store.query(["Adams", "Larimer", "Boulder"], 5, since)]
+            self.assertEqual(found, ["Snow Goose"])
+            self.assertEqual([row[0] for row in store.query(min_count=5)],
+                             ["Cackling Goose", "Eurasian Wigeon", "Snow Goose"])
+
+    def test_query_is_fast_over_years(self):
+        counties = ["Larimer", "Boulder", "Adams", "Weld", "Pueblo", "Mesa", "Otero", "Baca"]
+        with SightingStore(self.db_path) as store:
+            store.add(sighting(f"Species {i % 300}", counties[i % len(counties)], i % 1000,
+                               count=i % 20, checklist=f"S{i}")
+                      for i in range(20000))
+            start = time.perf_counter()
+            found = list(store.query(["Larimer", "Boulder"], 15, self.now - timedelta(days=50)))
+            elapsed = time.perf_counter() - start
+        self.assertTrue(found)
+        self.assertTrue(all(row[6] in ("Larimer", "Boulder") and row[2] >= 15 for row in found))
+        self.assertLess(elapsed, 0.5)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,91 @@
+import os
+import json
+import zipfile
+import unittest
+import tempfile
+from io import StringIO
+from contextlib import redirect_stdout
+from scripts.zipbatch import main, read_manifest, run_batch, ManifestError
+from scripts.zipcompare import EXIT_ERROR
+
+
+class TestZipBatch(unittest.TestCase):
+
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.root = self.tmp.name
+        os.makedirs(os.path.join(self.root, 'dir'))
+        with open(os.path.join(self.root, 'dir', 'file1.txt'), 'w') as f:
+            f.write('Hello, World!')
+        with zipfile.ZipFile(os.path.join(self.root, 'match.zip'), 'w') as zipf:
+            zipf.writestr('file1.txt', 'Hello, World!')
+        with zipfile.ZipFile(os.path.join(self.root, 'differ.zip'), 'w') as zipf:
+            zipf.writestr('file1.txt', 'Hello, World?')
+            zipf.writestr('extra.txt', 'extra')
+
+    def tearDown(self):
+        self.tmp.cleanup()
+
+    def write(self, name, content):
+        path = os.path.join(self.root, name)
+        with open(path, 'w') as f:
+            f.write(content)
+        return path
+
+    def test_read_csv_manifest(self):
+        """Test CSV manifests resolve paths against the manifest directory."""
+        manifest = self.write('pairs.csv', 'zip,dir\nmatch.zip,dir\n')
+        self.assertEqual(read_manifest(manifest),
+                         [(os.path.join(self.root, 'match.zip'), os.path.join(self.root, 'dir'))])
+
+    def test_read_jsonl_manifest(self):
+        manifest = self.write('pairs.jsonl', '{"zip": "match.zip", "dir": "dir"}\n\n')
+        self.assertEqual(len(read_manifest(manifest)), 1)
+
+    def test_bad_manifest(self):
+        manifest = self.write('pairs.csv', 'archive,folder\nmatch.zip,dir\n')
+        with self.assertRaises(ManifestError):
+            read_manifest(manifest)
+        with self.assertRaises(ManifestError):
+            read_manifest(os.path.join(self.root, 'missing.csv'))
+
+    def test_bad_rows_are_pair_errors(self):
+        """Test rows missing a path are reported as errors while other pairs still run."""
+        manifest = self.write('pairs.csv', 'zip,dir\nmatch.zip,dir\nmatch.zip\n,dir\n')
+        self.assertEqual(read_manifest(manifest)[1:],
+                         [(os.path.join(self.root, 'match.zip'), None),
+                          (None, os.path.join(self.root, 'dir'))])
+        jsonl = self.write('pairs.jsonl', '{"zip": "match.zip", "dir": "dir"}\n{"zip": 1}\n[]\n')
+        output = os.path.join(self.root, 'report.json')
+        for path in (manifest, jsonl):
+            with redirect_stdout(StringIO()):
+                self.assertEqual(main([path, '--jobs', '1', '-o', output]), EXIT_ERROR)
+            with open(output, encoding='utf-8') as f:
+                report = json.load(f)
+            self.assertEqual([entry['status'] for entry in report['pairs']],
+                             ['match', 'error', 'error'])
+
+    def test_run_batch(self):
+        """Test a batch across a process pool with a shared cache."""
+        manifest = self.write('pairs.jsonl', '\n'.join(json.dumps(pair) for pair in [
+            {'zip': 'match.zip', 'dir': 'dir'},
+            {'zip': 'differ.zip', 'dir': 'dir'},
+            {'zip': 'missing.zip', 'dir': 'dir'},
+        ]))
+        report = run_batch(read_manifest(manifest), jobs=2, verify=True,
+                           cache_path=os.path.join(self.root, 'cache.db'))
+        self.assertEqual(report['summary']['match'], 1)
+        self.assertEqual(report['summary']['differ'], 1)
+        self.assertEqual(report['summary']['error'], 1)
+        match, differ, missing = report['pairs']
+        self.assertEqual(match['status'], 'match')
+        self.assertEqual(differ['differences']['only_in_zip'], ['extra.txt'])
+        self.assertEqual(list(differ['differences']['content_mismatch']), ['file1.txt'])
+        self.assertIn('error', missing)
+        self.assertTrue(all('seconds' in entry for entry in report['pairs']))
+        # The report must be JSON-serializable as written by main().
+        json.dumps(report)
+
+
+if __name__ == '__main__':
+    unittest.main()
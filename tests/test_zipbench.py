@@ -0,0 +1,63 @@
+import os
+import json
+import unittest
+import tempfile
+from scripts.zipbench import (compare_results, file_sizes, generate_tree, peak_alloc_bytes,
+                              run_benchmark)
+
+
+class TestZipBench(unittest.TestCase):
+
+    def test_file_sizes(self):
+        self.assertEqual(file_sizes(3, 'fixed', 10), [10, 10, 10])
+        self.assertEqual(file_sizes(50, 'lognormal', seed=1), file_sizes(50, 'lognormal', seed=1))
+        with self.assertRaises(ValueError):
+            file_sizes(1, 'bimodal')
+
+    def test_generate_tree(self):
+        with tempfile.TemporaryDirectory() as tmp:
+            count, total = generate_tree(tmp, files=20, distribution='fixed', mean_size=5, depth=2)
+            on_disk = [os.path.join(d, f) for d, _, names in os.walk(tmp) for f in names]
+            self.assertEqual((count, total), (20, 100))
+            self.assertEqual(len(on_disk), 20)
+
+    def test_run_benchmark(self):
+        """Test a tiny benchmark run produces JSON-serializable stage results."""
+        with tempfile.TemporaryDirectory() as tmp:
+            results = run_benchmark(tmp, files=10, mean_size=100, repeat=1, compression='stored')
+        json.dumps(results)
+        self.assertEqual(results['dataset']['files'], 10)
+        self.assertEqual(set(results['results']), {'get_zip_file_info', 'get_directory_file_info',
+                                                   'compare_zip_and_directory'})
+        for result in results['results'].values():
+            self.assertGreater(result['seconds'], 0)
+            self.assertGreater(result['peak_alloc_bytes'], 0)
+
+    def test_peak_alloc_is_per_stage(self):
+        """Test a stage's peak allocation doesn't carry over from a bigger earlier stage."""
+        big = peak_alloc_bytes(lambda: bytearray(10 ** 7))
+        small = peak_alloc_bytes(lambda: bytearray(10 ** 4))
+        self.assertGreater(big, 10 ** 7)
+        self.assertLess(small, 10 ** 6)
+
+    def test_fresh_dataset_and_compression(self):
+        """Test reruns in one workdir don't reuse old files and compression has an effect."""
+        with tempfile.TemporaryDirectory() as tmp:
+            options = dict(files=10, distribution='fixed', mean_size=4096, repeat=1)
+            first = run_benchmark(tmp, seed=1, **options)
+            second = run_benchmark(tmp, seed=2, **options)
+            stored = run_benchmark(tmp, compression='stored', **options)
+        self.assertEqual(second['dataset']['files'], 10)
+        self.assertEqual(second['dataset']['bytes'], first['dataset']['bytes'])
+        self.assertLess(first['dataset']['archive_bytes'], 0.75 * first['dataset']['bytes'])
+        self.assertGreater(stored['dataset']['archive_bytes'], first['dataset']['bytes'])
+
+    def test_compare_results(self):
+        baseline = {'results': {'a': {'seconds': 1.0}, 'b': {'seconds': 1.0}}}
+        current = {'results': {'a': {'seconds': 1.05}, 'b': {'seconds': 2.0}, 'c': {'seconds': 1.0}}}
+        comparison = {stage: slower for stage, _, _, _, slower in compare_results(baseline, current)}
+        self.assertEqual(comparison, {'a': False, 'b': True})
+
+
+if __name__ == '__main__':
+    unittest.main()
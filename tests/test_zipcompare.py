@@ -1,8 +1,24 @@
 import unittest
 import zipfile
 import os
+import json
+import tempfile
+from io import BytesIO, StringIO
+from contextlib import redirect_stdout, redirect_stderr
+from unittest.mock import patch
+from scripts.hashcache import HashCache
 from scripts.zipcompare import (
+    main,
+    EXIT_MATCH,
+    EXIT_DIFFERENCES,
+    EXIT_ERROR,
     compare_zip_and_directory,
+    compare_zips,
+    get_zip_file_info,
+    iter_zip_differences,
+    external_sort,
+    iter_differences,
+    merge_by_path,
     ZipFileNotFoundError,
     DirectoryNotFoundError
 )
@@ -16,6 +32,7 @@ class TestZipCompare(unittest.TestCase):
         cls.test_dir = 'test_dir'
         cls.mismatch_zip = 'mismatch_zip.zip'
         cls.empty_zip = 'empty_zip.zip'
+        cls.same_size_zip = 'same_size_zip.zip'
         os.makedirs(cls.test_dir, exist_ok=True)
         
         # Create matching ZIP and directory
@@ -34,6 +51,11 @@ class TestZipCompare(unittest.TestCase):
             zipf.writestr('file1.txt', 'Different content')
             zipf.writestr('folder/file2.txt', 'Another file')
         
+        # Create ZIP whose file1.txt has the same size but different content
+        with zipfile.ZipFile(cls.same_size_zip, 'w') as zipf:
+            zipf.writestr('file1.txt', 'Hello, World?')
+            zipf.writestr('folder/file2.txt', 'Another file')
+        
         # Create an empty ZIP
         with zipfile.ZipFile(cls.empty_zip, 'w') as zipf:
             pass
@@ -44,6 +66,7 @@ class TestZipCompare(unittest.TestCase):
         os.remove(cls.test_zip)
         os.remove(cls.mismatch_zip)
         os.remove(cls.empty_zip)
+        os.remove(cls.same_size_zip)
         for root, dirs, files in os.walk(cls.test_dir, topdown=False):
             for name in files:
                 os.remove(os.path.join(root, name))
@@ -65,6 +88,159 @@ class TestZipCompare(unittest.TestCase):
         self.assertEqual(result['only_in_zip'], set())
         self.assertEqual(result['only_in_dir'], set())
 
+    def test_same_size_not_verified(self):
+        """Test same-size content changes go unnoticed without verify."""
+        result = compare_zip_and_directory(self.same_size_zip, self.test_dir)
+        self.assertEqual(result['size_mismatch'], {})
+        self.assertEqual(result['content_mismatch'], {})
+
+    def test_verify_crc_mismatch(self):
+        """Test CRC verification catches same-size content changes."""
+        result = compare_zip_and_directory(self.same_size_zip, self.test_dir, verify=True)
+        self.assertEqual(result['size_mismatch'], {})
+        self.assertEqual(set(result['content_mismatch']), {'file1.txt'})
+
+    def test_verify_crc_match(self):
+        """Test CRC verification of a matching ZIP and directory."""
+        result = compare_zip_and_directory(self.test_zip, self.test_dir, verify=True)
+        self.assertEqual(result['content_mismatch'], {})
+
+    def test_verify_full_hash(self):
+        """Test full hashing catches same-size content changes."""
+        result = compare_zip_and_directory(self.same_size_zip, self.test_dir, hash_algorithm='sha256')
+        self.assertEqual(set(result['content_mismatch']), {'file1.txt'})
+        result = compare_zip_and_directory(self.test_zip, self.test_dir, hash_algorithm='sha256')
+        self.assertEqual(result['content_mismatch'], {})
+
+    def test_hash_crc32_uses_stored_crc(self):
+        """Test --hash crc32 compares against the CRC-32 stored in the ZIP."""
+        code, output = self.run_main(self.same_size_zip, self.test_dir, '--hash', 'crc32')
+        self.assertEqual(code, EXIT_DIFFERENCES)
+        self.assertIn('file1.txt', output)
+        with patch('scripts.zipcompare.zip_entry_digest') as mock_digest:
+            code, _ = self.run_main(self.test_zip, self.test_dir, '--hash', 'crc32')
+        self.assertEqual(code, EXIT_MATCH)
+        mock_digest.assert_not_called()
+
+    def test_verify_with_workers(self):
+        """Test CRC verification with an explicit worker count."""
+        result = compare_zip_and_directory(self.same_size_zip, self.test_dir, verify=True, workers=2)
+        self.assertEqual(set(result['content_mismatch']), {'file1.txt'})
+
+    def test_verify_with_cache(self):
+        """Test a second cached run reuses digests instead of rehashing."""
+        with tempfile.TemporaryDirectory() as tmp:
+            with HashCache(os.path.join(tmp, 'cache.db')) as cache:
+                first = compare_zip_and_directory(self.same_size_zip, self.test_dir,
+                                                  verify=True, cache=cache)
+                with patch('scripts.zipcompare.hash_file') as mock_hash:
+                    second = compare_zip_and_directory(self.same_size_zip, self.test_dir,
+                                                       verify=True, cache=cache)
+                mock_hash.assert_not_called()
+        self.assertEqual(first, second)
+        self.assertEqual(set(second['content_mismatch']), {'file1.txt'})
+
+    def test_include_exclude(self):
+        """Test glob filters apply to both the ZIP and the directory."""
+        with tempfile.TemporaryDirectory() as tmp:
+            zip_path = os.path.join(tmp, 'tree.zip')
+            dir_path = os.path.join(tmp, 'tree')
+            names = ['keep.txt', 'folder/b.txt', 'folder/sub/c.txt', 'other/folder/d.txt']
+            with zipfile.ZipFile(zip_path, 'w') as zipf:
+                for name in names:
+                    zipf.writestr(name, name)
+                    os.makedirs(os.path.dirname(os.path.join(dir_path, name)), exist_ok=True)
+                    with open(os.path.join(dir_path, name), 'w') as f:
+                        f.write(name)
+            # Only the directory side holds extra files under excluded directories.
+            with open(os.path.join(dir_path, 'folder', 'sub', 'extra.txt'), 'w') as f:
+                f.write('extra')
+            for exclude in (['folder'], ['*folder'], ['folder/sub']):
+                result = compare_zip_and_directory(zip_path, dir_path, exclude=exclude)
+                self.assertFalse(any(result.values()), exclude)
+            result = compare_zip_and_directory(zip_path, dir_path, exclude=['other'])
+            self.assertEqual(result['only_in_dir'], {'folder/sub/extra.txt'})
+            self.assertEqual(result['only_in_zip'], set())
+        result = compare_zip_and_directory(self.mismatch_zip, self.test_dir, include=['folder/*'])
+        self.assertEqual(result['size_mismatch'], {})
+
+    def test_external_sort_spills(self):
+        """Test sorting with a buffer smaller than the input."""
+        records = [(f"file{i % 7}-{i}", i) for i in range(50)]
+        self.assertEqual(list(external_sort(records, buffer_size=4)), sorted(records))
+
+    def test_merge_by_path(self):
+        left = [('a', 1), ('c', 3)]
+        right = [('b', 2), ('c', 4)]
+        self.assertEqual(list(merge_by_path(left, right)),
+                         [('a', ('a', 1), None), ('b', None, ('b', 2)), ('c', ('c', 3), ('c', 4))])
+
+    def test_iter_differences_streaming(self):
+        """Test streamed differences come out in path order."""
+        differences = list(iter_differences(self.empty_zip, self.test_dir, sort_buffer_size=1))
+        self.assertEqual(differences, [('only_in_dir', 'file1.txt', None, 13),
+                                       ('only_in_dir', 'folder/file2.txt', None, 12)])
+        differences = list(iter_differences(self.same_size_zip, self.test_dir, verify=True,
+                                            sort_buffer_size=1))
+        self.assertEqual([d[:2] for d in differences], [('content_mismatch', 'file1.txt')])
+
+    def test_iter_differences_missing_inputs(self):
+        """Test missing inputs are reported before iteration starts."""
+        with self.assertRaises(ZipFileNotFoundError):
+            iter_differences('non_existent.zip', self.test_dir)
+        with self.assertRaises(DirectoryNotFoundError):
+            iter_differences(self.test_zip, 'non_existent_dir')
+
+    def run_main(self, *argv):
+        out = StringIO()
+        with redirect_stdout(out), redirect_stderr(StringIO()):
+            code = main(list(argv))
+        return code, out.getvalue()
+
+    def test_exit_codes(self):
+        self.assertEqual(self.run_main(self.test_zip, self.test_dir)[0], EXIT_MATCH)
+        self.assertEqual(self.run_main(self.mismatch_zip, self.test_dir)[0], EXIT_DIFFERENCES)
+        self.assertEqual(self.run_main('non_existent.zip', self.test_dir)[0], EXIT_ERROR)
+        self.assertEqual(self.run_main(self.test_zip, 'non_existent_dir')[0], EXIT_ERROR)
+
+    def test_cached_listing_skips_archive(self):
+        """Test a cached ZIP listing is streamed without opening the archive again."""
+        with tempfile.TemporaryDirectory() as tmp:
+            with HashCache(os.path.join(tmp, 'cache.db')) as cache:
+                first = list(iter_differences(self.mismatch_zip, self.test_dir, cache=cache))
+                with patch('scripts.zipcompare.zipfile.ZipFile') as mock_zip:
+                    second = list(iter_differences(self.mismatch_zip, self.test_dir, cache=cache))
+                mock_zip.assert_not_called()
+        self.assertTrue(first)
+        self.assertEqual(second, first)
+
+    def test_corrupt_cache_is_an_error(self):
+        """Test an unreadable --cache file exits with EXIT_ERROR, not a traceback."""
+        with tempfile.TemporaryDirectory() as tmp:
+            cache_path = os.path.join(tmp, 'cache.db')
+            with open(cache_path, 'wb') as f:
+                f.write(b'not a sqlite database' * 100)
+            err = StringIO()
+            with redirect_stdout(StringIO()), redirect_stderr(err):
+                code = main([self.test_zip, self.test_dir, '--cache', cache_path])
+        self.assertEqual(code, EXIT_ERROR)
+        self.assertTrue(err.getvalue().startswith('Error: '))
+
+    def test_ndjson_output(self):
+        """Test NDJSON output has one record per difference then a summary."""
+        code, out = self.run_main('--format', 'ndjson', '--verify', self.same_size_zip, self.test_dir)
+        records = [json.loads(line) for line in out.splitlines()]
+        self.assertEqual(code, EXIT_DIFFERENCES)
+        self.assertEqual(records[0]['kind'], 'content_mismatch')
+        self.assertEqual(records[0]['path'], 'file1.txt')
+        self.assertNotEqual(records[0]['zip'], records[0]['dir'])
+        self.assertEqual(records[-1], {'kind': 'summary', 'differences': 1,
+                                       'counts': {'content_mismatch': 1}})
+
+    def test_text_output_sorted(self):
+        code, out = self.run_main(self.empty_zip, self.test_dir)
+        self.assertLess(out.index('file1.txt'), out.index('folder/file2.txt'))
+
     def test_empty_zip(self):
         """Test comparison with an empty ZIP file."""
         result = compare_zip_and_directory(self.empty_zip, self.test_dir)
@@ -81,5 +257,79 @@ class TestZipCompare(unittest.TestCase):
             compare_zip_and_directory(self.test_zip, 'non_existent_dir')
 
 
+def make_jar(files):
+    """Return the bytes of a small archive holding files."""
+    buffer = BytesIO()
+    with zipfile.ZipFile(buffer, 'w', zipfile.ZIP_DEFLATED) as jar:
+        for name, content in files.items():
+            jar.writestr(name, content)
+    return buffer.getvalue()
+
+
+class TestZipToZip(unittest.TestCase):
+
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.first = os.path.join(self.tmp.name, 'first.zip')
+        self.second = os.path.join(self.tmp.name, 'second.zip')
+        jar_a = make_jar({'a/A.class': 'AAAA', 'b/B.class': 'BBBB'})
+        jar_b = make_jar({'a/A.class': 'AAAX', 'c/C.class': 'CCCC'})
+        for path, jar, readme in [(self.first, jar_a, 'readme'), (self.second, jar_b, 'README')]:
+            with zipfile.ZipFile(path, 'w') as zipf:
+                zipf.writestr('readme.txt', readme)
+                zipf.writestr('lib/stored.jar', jar, compress_type=zipfile.ZIP_STORED)
+                zipf.writestr('lib/deflated.jar', jar, compress_type=zipfile.ZIP_DEFLATED)
+                zipf.writestr('same.txt', 'same')
+            if path == self.first:
+                with zipfile.ZipFile(path, 'a') as zipf:
+                    zipf.writestr('only_first.txt', 'x')
+
+    def tearDown(self):
+        self.tmp.cleanup()
+
+    def test_compare_zips(self):
+        """Test two archives are compared by name, size and stored CRC."""
+        result = compare_zips(self.first, self.second)
+        self.assertEqual(result['only_in_first'], {'only_first.txt'})
+        self.assertEqual(result['only_in_second'], set())
+        self.assertIn('readme.txt', result['content_mismatch'])
+        self.assertNotIn('same.txt', result['content_mismatch'])
+
+    def test_nested_listing(self):
+        """Test stored and deflated nested archives are both listed."""
+        info = get_zip_file_info(self.first, nested=True)
+        self.assertEqual(info['lib/stored.jar!/a/A.class'], 4)
+        self.assertEqual(info['lib/deflated.jar!/b/B.class'], 4)
+        self.assertNotIn('lib/stored.jar!/a/A.class', get_zip_file_info(self.first))
+
+    def test_compare_nested(self):
+        """Test differences inside nested archives are reported."""
+        result = compare_zips(self.first, self.second, nested=True)
+        for jar in ('lib/stored.jar', 'lib/deflated.jar'):
+            self.assertIn(jar + '!/b/B.class', result['only_in_first'])
+            self.assertIn(jar + '!/c/C.class', result['only_in_second'])
+            self.assertIn(jar + '!/a/A.class', result['content_mismatch'])
+
+    def test_iter_zip_differences_order(self):
+        differences = list(iter_zip_differences(self.first, self.second, sort_buffer_size=1))
+        paths = [d[1] for d in differences]
+        self.assertEqual(paths, sorted(paths))
+
+    def test_missing_zip_file(self):
+        with self.assertRaises(ZipFileNotFoundError):
+            compare_zips(self.first, 'non_existent.zip')
+
+    def test_hash_rejected(self):
+        """Test --hash other than crc32 is an error rather than ignored."""
+        err = StringIO()
+        with redirect_stdout(StringIO()), redirect_stderr(err):
+            code = main([self.first, self.second, '--hash', 'sha256'])
+        self.assertEqual(code, EXIT_ERROR)
+        self.assertIn('--hash sha256', err.getvalue())
+        with redirect_stdout(StringIO()):
+            code = main([self.first, self.second, '--verify', '--hash', 'crc32'])
+        self.assertEqual(code, EXIT_DIFFERENCES)
+
+
 if __name__ == '__main__':
     unittest.main()